@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Warehouse Management System - Library',
-    'version': '19.0.1.0.0',
+    'version': '19.0.1.1.0',
     'category': 'Inventory',
     'summary': 'Sistema de gestión de almacén automatizado para biblioteca con integración PLC',
     'description': """
@@ -26,10 +26,24 @@
     'data': [
         'security/ir.model.access.csv',
         'data/middleware_config_data.xml',
+        'data/wms_operation_cron.xml',
+        'data/wms_box_import_cron.xml',
+        'data/wms_rack_occupancy_data.xml',
+        'data/wms_slotting_cron.xml',
+        'data/wms_box_move_history_cron.xml',
+        'data/wms_metric_cron.xml',
         'views/product_box_views.xml',
         'views/stock_location_views.xml',
         'views/box_movement_wizard_views.xml',
+        'views/rack_layout_wizard_views.xml',
         'views/middleware_config_views.xml',
+        'views/wms_operation_views.xml',
+        'views/wms_box_import_views.xml',
+        'views/wms_rack_occupancy_views.xml',
+        'views/wms_slotting_views.xml',
+        'views/wms_column_lock_views.xml',
+        'views/wms_request_views.xml',
+        'views/wms_box_move_history_views.xml',
         'views/menu_views.xml',
     ],
     'installable': True,
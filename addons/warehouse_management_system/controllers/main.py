@@ -1,11 +1,148 @@
 # -*- coding: utf-8 -*-
+import csv
+import hashlib
+import hmac
+import io
 import json
 import logging
-from odoo import http
-from odoo.http import request, Response
+import time
+from odoo import api, fields, http
+from odoo.http import content_disposition, request, Response
+from psycopg2 import OperationalError
+
+from ..models.product_box import LOOKUP_BOX_FIELDS, OUTSIDE_EXPORT_COLUMNS
+from ..models.stock_location import LOOKUP_SLOT_FIELDS
 
 _logger = logging.getLogger(__name__)
 
+# Elementos máximos por petición en las consultas de solo lectura
+LOOKUP_MAX_ITEMS = 500
+
+
+def _jsonrpc_response(request_id, result, status=200):
+    """Respuesta JSON-RPC para el middleware"""
+    return Response(
+        json.dumps({"jsonrpc": "2.0", "id": request_id, "result": result}),
+        content_type='application/json',
+        status=status
+    )
+
+
+def _record_callback_metrics(steps, elapsed, endpoint, failed=False):
+    """Métricas de un callback del middleware: tiempo de proceso y pasos por tipo y estado"""
+    Metric = request.env['wms.metric'].sudo()
+    Metric._wms_observe('wms_callback_seconds', elapsed, {'endpoint': endpoint})
+    for step in steps:
+        labels = {'operation_type': step.get('operation_type') or 'unknown'}
+        status = 'error' if failed else step.get('status') or 'unknown'
+        Metric._wms_inc('wms_callback_steps_total', dict(labels, status=status))
+        if status != 'completed':
+            Metric._wms_inc('wms_errors_total', dict(labels, stage='callback'))
+
+
+def _lookup_params():
+    """Parámetros de una consulta: query string (GET) o cuerpo JSON (POST)"""
+    if request.httprequest.method == 'POST':
+        params = json.loads(request.httprequest.get_data() or b'{}')
+        if not isinstance(params, dict):
+            raise ValueError('The request body must be a JSON object')
+        return params
+    return request.httprequest.args.to_dict()
+
+
+def _split(value):
+    """Lista desde un array JSON o una cadena separada por comas"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return list(value)
+
+
+def _lookup_fields(params, allowed):
+    """Campos pedidos (proyección); por defecto todos los disponibles"""
+    field_names = [str(name) for name in _split(params.get('fields'))] or list(allowed)
+    unknown = [name for name in field_names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return field_names
+
+
+def _lookup_coords(value):
+    """Coordenadas desde [[x, y, z], ...] o "x,y,z;x,y,z" """
+    if isinstance(value, str):
+        value = [part.split(',') for part in value.split(';') if part.strip()]
+    coords = [tuple(int(coord) for coord in item) for item in value or []]
+    if any(len(coord) != 3 for coord in coords):
+        raise ValueError('Coordinates must be x,y,z triples')
+    return coords
+
+
+def _lookup_response(endpoint, build, version=None):
+    """
+    Respuesta JSON compacta con ETag (304 si el cliente ya tiene esa versión)
+
+    Args:
+        endpoint: nombre de la ruta (métricas)
+        build: función que resuelve la consulta
+        version: versión del estado y de la consulta si se conoce sin
+                 resolverla (rejillas); si no, el ETag sale del contenido
+    """
+    start = time.perf_counter()
+    body = None
+    if version is None:
+        body = json.dumps(build(), separators=(',', ':'))
+        etag = hashlib.sha1(body.encode()).hexdigest()
+    else:
+        etag = hashlib.sha1(json.dumps(version).encode()).hexdigest()
+    headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache')]
+    if request.httprequest.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(
+            body if body is not None else json.dumps(build(), separators=(',', ':')),
+            content_type='application/json',
+            headers=headers,
+        )
+    request.env['wms.metric'].sudo()._wms_observe(
+        'wms_lookup_seconds', time.perf_counter() - start,
+        {'endpoint': endpoint, 'status': response.status_code},
+    )
+    return response
+
+
+def _lookup_error(message):
+    return Response(json.dumps({'error': message}), content_type='application/json', status=400)
+
+
+def _outside_export_stream(registry, uid, context, export_format):
+    """
+    Generador de la exportación de cajas fuera del almacén
+
+    Usa un cursor propio (el de la petición se cierra al devolver la
+    respuesta) y convierte un bloque cada vez.
+    """
+    with registry.cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(OUTSIDE_EXPORT_COLUMNS)
+            for rows in env['product.box']._wms_outside_chunks():
+                writer.writerows(rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+        else:
+            for rows in env['product.box']._wms_outside_chunks():
+                yield ''.join(
+                    json.dumps(dict(zip(OUTSIDE_EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n'
+                    for row in rows
+                ).encode()
+
+
 class WarehouseAPI(http.Controller):
     
     @http.route('/api/wms/operation/complete', type='http', auth='public', methods=['POST'], csrf=False)
@@ -31,6 +168,8 @@ class WarehouseAPI(http.Controller):
             "id": null
         }
         """
+        start = time.perf_counter()
+        data = {}
         try:
             # Leer el body del request
             body = request.httprequest.get_data(as_text=True)
@@ -41,192 +180,214 @@ class WarehouseAPI(http.Controller):
             
             _logger.info(f"📥 Callback recibido del middleware: {json.dumps(data, indent=2)}")
             
-            operation_id = data.get('operation_id')
-            operation_type = data.get('operation_type')
-            box_id = data.get('box_id')
-            status = data.get('status')
-            new_location = data.get('new_location', {})
-            
-            # Validar datos requeridos
-            if not all([operation_id, operation_type, box_id, status]):
-                result = {
-                    'success': False,
-                    'error': 'Faltan campos requeridos'
-                }
-                return Response(
-                    json.dumps({"jsonrpc": "2.0", "id": data_wrapper.get('id'), "result": result}),
-                    content_type='application/json'
-                )
-            
-            # Buscar la caja
-            box = request.env['product.box'].sudo().search([
-                ('location_identification', '=', box_id)
-            ], limit=1)
-            
-            if not box:
-                _logger.error(f"❌ Caja no encontrada: {box_id}")
-                result = {
-                    'success': False,
-                    'error': f'Caja no encontrada: {box_id}'
-                }
-                return Response(
-                    json.dumps({"jsonrpc": "2.0", "id": data_wrapper.get('id'), "result": result}),
-                    content_type='application/json'
-                )
-            
-            # Guardar ubicación original para historial
-            source_location_id = box.parent_location.id if box.parent_location else False
-            
-            # Actualizar según el tipo de operación
-            if status == 'completed':
-                if operation_type in ['put_in', 'place']:
-                    # === PUT IN: Mover caja al rack ===
-                    x, y, z = new_location.get('x'), new_location.get('y'), new_location.get('z')
-                    
-                    _logger.info(f"🔍 Buscando ubicación en ({x},{y},{z})")
-                    
-                    # Buscar la ubicación física en el rack
-                    target_location = request.env['stock.location'].sudo().search([
-                        ('pos_x', '=', x),
-                        ('pos_y', '=', y),
-                        ('pos_z', '=', z),
-                        ('is_box', '=', True),
-                        ('is_rack', '=', True)
-                    ], limit=1)
-                    
-                    if target_location:
-                        box.sudo().write({
-                            'parent_location': target_location.id,
-                            'rack_location': target_location.id,
-                            'pos_x': x,
-                            'pos_y': y,
-                            'pos_z': z,
-                            'state': 'inlocation'
-                        })
-                        _logger.info(f"✅ PUT_IN: Caja {box_id} → {target_location.name} ({x},{y},{z})")
-                    else:
-                        _logger.warning(f"⚠️ Ubicación no encontrada para ({x},{y},{z}), actualizando solo coordenadas")
-                        box.sudo().write({
-                            'pos_x': x,
-                            'pos_y': y,
-                            'pos_z': z,
-                            'state': 'inlocation'
-                        })
-                
-                elif operation_type in ['picking', 'deliver']:
-                    # === PICKING: Mover caja a Puerta y RESETEAR coordenadas a (0,0,0) ===
-                    puerta = request.env['stock.location'].sudo().search([
-                        ('name', '=', 'Puerta'),
-                        ('is_box', '=', True)
-                    ], limit=1)
-                    
-                    if puerta:
-                        box.sudo().write({
-                            'parent_location': puerta.id,
-                            'pos_x': 0,
-                            'pos_y': 0,
-                            'pos_z': 0,
-                            'state': 'outlocation'
-                        })
-                        _logger.info(f"✅ PICKING: Caja {box_id} → Puerta (0,0,0)")
-                    else:
-                        _logger.error("❌ Ubicación 'Puerta' no encontrada")
-                
-                elif operation_type == 'move_to_dummy':
-                    # === MOVE TO DUMMY: Mover caja bloqueante a área temporal ===
-                    x, y, z = new_location.get('x'), new_location.get('y'), new_location.get('z')
-                    
-                    # Buscar posición libre en dummy con esas coordenadas
-                    dummy_location = request.env['stock.location'].sudo().search([
-                        ('pos_x', '=', x),
-                        ('pos_y', '=', y),
-                        ('pos_z', '=', z),
-                        ('is_dummy', '=', True),
-                        ('is_box', '=', True)
-                    ], limit=1)
-                    
-                    if dummy_location:
-                        box.sudo().write({
-                            'parent_location': dummy_location.id,
-                            'pos_x': x,
-                            'pos_y': y,
-                            'pos_z': z,
-                            'state': 'outlocation'
-                        })
-                        _logger.info(f"✅ DUMMY: Caja {box_id} → {dummy_location.name} ({x},{y},{z})")
-                    else:
-                        # Si no encuentra la posición exacta, usar primera dummy libre
-                        dummy_any = request.env['stock.location'].sudo().search([
-                            ('is_dummy', '=', True),
-                            ('is_box', '=', True)
-                        ], limit=1)
-                        
-                        if dummy_any:
-                            box.sudo().write({
-                                'parent_location': dummy_any.id,
-                                'pos_x': dummy_any.pos_x,
-                                'pos_y': dummy_any.pos_y,
-                                'pos_z': dummy_any.pos_z,
-                                'state': 'outlocation'
-                            })
-                            _logger.info(f"✅ DUMMY (fallback): Caja {box_id} → {dummy_any.name} ({dummy_any.pos_x},{dummy_any.pos_y},{dummy_any.pos_z})")
-                        else:
-                            _logger.error("❌ No se encontró ubicación Dummy disponible")
-                
-                # Registrar movimiento en historial
-                try:
-                    request.env['product.box.line'].sudo().create({
-                        'box_id': box.id,
-                        'source_location_id': source_location_id,
-                        'destination_location_id': box.parent_location.id if box.parent_location else False,
-                    })
-                    _logger.info(f"📝 Historial registrado para caja {box_id}")
-                except Exception as hist_error:
-                    _logger.warning(f"⚠️ No se pudo registrar historial: {hist_error}")
-                
-                # Re-leer la caja para obtener datos actualizados
-                box = request.env['product.box'].sudo().search([
-                    ('location_identification', '=', box_id)
-                ], limit=1)
-                
-                result = {
-                    'success': True,
-                    'message': f'Caja {box_id} actualizada correctamente',
-                    'box_state': {
-                        'current_location': box.parent_location.name if box.parent_location else 'N/A',
-                        'coordinates': f"({box.pos_x},{box.pos_y},{box.pos_z})",
-                        'state': box.state
-                    }
-                }
-                
-                return Response(
-                    json.dumps({"jsonrpc": "2.0", "id": data_wrapper.get('id'), "result": result}),
-                    content_type='application/json'
-                )
-            
-            else:
-                _logger.error(f"❌ Operación falló: {operation_id}")
-                result = {
-                    'success': False,
-                    'error': f'Operación en estado: {status}'
-                }
-                return Response(
-                    json.dumps({"jsonrpc": "2.0", "id": data_wrapper.get('id'), "result": result}),
-                    content_type='application/json'
-                )
+            # Si falla se deshace todo el callback: el middleware lo reintenta completo
+            # Las ubicaciones ocupadas se comprueban aquí y no en el commit: el error llega al middleware
+            with request.env.cr.savepoint():
+                Box = request.env['product.box'].sudo()
+                result = Box._apply_operation_callbacks([data])[0]
+                Box._wms_check_unique_slots()
+            _record_callback_metrics([data], time.perf_counter() - start, 'single')
+            return _jsonrpc_response(data_wrapper.get('id'), result)
         
+        except OperationalError:
+            # Conflicto de concurrencia: Odoo reintenta la petición
+            raise
         except Exception as e:
             _logger.error(f"❌ Error en callback: {str(e)}", exc_info=True)
+            _record_callback_metrics([data], time.perf_counter() - start, 'single', failed=True)
+            result = {
+                'success': False,
+                'error': str(e)
+            }
+            return _jsonrpc_response(None, result, status=500)
+
+    @http.route('/api/wms/operation/complete_batch', type='http', auth='public', methods=['POST'], csrf=False)
+    def operation_complete_batch(self, **kwargs):
+        """
+        Endpoint para notificar varios pasos completados en una sola petición
+
+        Payload esperado (JSON-RPC):
+        {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {
+                "steps": [
+                    {
+                        "operation_id": "PICKING-29-20260131-075555",
+                        "operation_type": "move_to_dummy",
+                        "step": 1,
+                        "box_id": "QBE12026000012",
+                        "status": "completed",
+                        "new_location": {"x": 0, "y": 1, "z": 1}
+                    },
+                    ...
+                ]
+            },
+            "id": null
+        }
+
+        Devuelve un resultado por paso (mismo orden) y el rendimiento en pasos/segundo.
+        """
+        start = time.perf_counter()
+        steps = []
+        try:
+            body = request.httprequest.get_data(as_text=True)
+            data_wrapper = json.loads(body)
+            steps = data_wrapper.get('params', {}).get('steps') or []
+
+            _logger.info(f"📥 Callback por lotes recibido del middleware: {len(steps)} pasos")
+
+            # Si falla se deshace el lote entero: ningún paso queda aplicado sin
+            # registrar en el ledger, así el reintento del middleware no duplica nada
+            with request.env.cr.savepoint():
+                Box = request.env['product.box'].sudo()
+                step_results = Box._apply_operation_callbacks(steps)
+                Box._wms_check_unique_slots()
+            for step, step_result in zip(steps, step_results):
+                step_result['box_id'] = step.get('box_id')
+                step_result['step'] = step.get('step')
+
+            elapsed = time.perf_counter() - start
+            steps_per_second = round(len(steps) / elapsed, 1) if elapsed > 0 else None
+            _logger.info(f"✅ Lote de {len(steps)} pasos aplicado en {elapsed * 1000:.1f} ms ({steps_per_second} pasos/s)")
+            _record_callback_metrics(steps, elapsed, 'batch')
+
+            result = {
+                'success': all(step_result['success'] for step_result in step_results),
+                'processed': len(steps),
+                'results': step_results,
+                'steps_per_second': steps_per_second,
+            }
+            return _jsonrpc_response(data_wrapper.get('id'), result)
+
+        except OperationalError:
+            raise
+        except Exception as e:
+            _logger.error(f"❌ Error en callback por lotes: {str(e)}", exc_info=True)
+            _record_callback_metrics(steps or [{}], time.perf_counter() - start, 'batch', failed=True)
             result = {
                 'success': False,
                 'error': str(e)
             }
-            return Response(
-                json.dumps({"jsonrpc": "2.0", "id": None, "result": result}),
-                content_type='application/json',
-                status=500
-            )
+            return _jsonrpc_response(None, result, status=500)
     
+    @http.route('/api/wms/occupancy', type='http', auth='user', methods=['GET'])
+    def occupancy(self, rack_ids=None, zone_type=None, **kwargs):
+        """
+        Resumen de ocupación por rack y zona dummy (una fila por contenedor)
+
+        Parámetros opcionales: rack_ids=1,2,3 y zone_type=rack|dummy
+        """
+        domain = []
+        if rack_ids:
+            domain.append(('rack_id', 'in', [int(rack_id) for rack_id in rack_ids.split(',') if rack_id.strip()]))
+        if zone_type:
+            domain.append(('zone_type', '=', zone_type))
+        records = request.env['wms.rack.occupancy'].search(domain)
+        return Response(
+            json.dumps({'racks': records._wms_export()}),
+            content_type='application/json'
+        )
+
+    @http.route('/api/wms/boxes/lookup', type='http', auth='user', methods=['GET', 'POST'], csrf=False)
+    def boxes_lookup(self, **kwargs):
+        """
+        Resolver varias cajas por identificador (solo lectura, sin efectos)
+
+        GET ?ids=A,B&fields=state,pos_x o POST {"ids": [...], "fields": [...]}
+        Respuesta: {"fields": [...], "rows": [[...] o null]} en el orden de ids
+        (una consulta indexada; el ETag sale del contenido)
+        """
+        try:
+            params = _lookup_params()
+            identifiers = [str(identifier) for identifier in _split(params.get('ids'))]
+            field_names = _lookup_fields(params, LOOKUP_BOX_FIELDS)
+        except (ValueError, TypeError) as e:
+            return _lookup_error(str(e))
+        if len(identifiers) > LOOKUP_MAX_ITEMS:
+            return _lookup_error(f'At most {LOOKUP_MAX_ITEMS} ids per request')
+
+        Box = request.env['product.box']
+        return _lookup_response(
+            'boxes', lambda: {'fields': field_names, 'rows': Box._wms_lookup_boxes(identifiers, field_names)},
+        )
+
+    @http.route('/api/wms/locations/lookup', type='http', auth='user', methods=['GET', 'POST'], csrf=False)
+    def locations_lookup(self, **kwargs):
+        """
+        Resolver varias coordenadas de un rack (solo lectura, desde la rejilla)
+
+        GET ?rack_id=7&coords=1,2,1;1,3,1&fields=box,state o
+        POST {"rack_id": 7, "coords": [[1, 2, 1], ...], "fields": [...]}
+        Respuesta: {"fields": [...], "rows": [[...] o null]} en el orden de coords
+        """
+        try:
+            params = _lookup_params()
+            rack_id = int(params.get('rack_id') or 0)
+            coords = _lookup_coords(params.get('coords'))
+            field_names = _lookup_fields(params, LOOKUP_SLOT_FIELDS)
+        except (ValueError, TypeError) as e:
+            return _lookup_error(str(e))
+        if not rack_id:
+            return _lookup_error('rack_id is required')
+        if len(coords) > LOOKUP_MAX_ITEMS:
+            return _lookup_error(f'At most {LOOKUP_MAX_ITEMS} coordinates per request')
+
+        # La rejilla del rack cambia de versión con cada movimiento: el ETag no necesita resolver nada
+        Location = request.env['stock.location']
+        # Con cambios pendientes de publicar la versión no identifica el estado: ETag por contenido
+        grid_version = Location._wms_grid_versions().get(rack_id, 0)
+        return _lookup_response(
+            'locations',
+            lambda: {'fields': field_names, 'rows': Location._wms_lookup_slots(rack_id, coords, field_names)},
+            version=['locations', rack_id, grid_version, coords, field_names] if grid_version >= 0 else None,
+        )
+
+    @http.route('/api/wms/boxes/outside/export', type='http', auth='user', methods=['GET'])
+    def outside_export(self, format='csv', **kwargs):
+        """
+        Exportación en streaming de las cajas fuera del almacén (CSV o NDJSON)
+
+        Las cajas se leen en bloques de OUTSIDE_EXPORT_CHUNK: la memoria del
+        worker no depende del número de cajas.
+        """
+        if format not in ('csv', 'ndjson'):
+            return _lookup_error('format must be csv or ndjson')
+        env = request.env
+        env['product.box'].check_access('read')
+
+        timestamp = fields.Datetime.now().strftime('%Y%m%d-%H%M%S')
+        content_type = 'text/csv; charset=utf-8' if format == 'csv' else 'application/x-ndjson'
+        return Response(
+            _outside_export_stream(env.registry, env.uid, dict(env.context), format),
+            headers=[
+                ('Content-Type', content_type),
+                ('Content-Disposition', content_disposition(f'boxes_outside_{timestamp}.{format}')),
+                ('Cache-Control', 'no-store'),
+            ],
+            direct_passthrough=True,
+        )
+
+    @http.route('/api/wms/metrics', type='http', auth='public', methods=['GET'], csrf=False)
+    def metrics(self, **kwargs):
+        """
+        Métricas del WMS en formato de texto de Prometheus (agregadas de todos los workers)
+
+        Exige la cabecera Authorization: Bearer <token> con el parámetro de
+        sistema wms.metrics_token; sin el parámetro el endpoint no está
+        publicado (404).
+        """
+        token = request.env['ir.config_parameter'].sudo().get_param('wms.metrics_token')
+        if not token:
+            return Response('Not Found', status=404, content_type='text/plain')
+        authorization = request.httprequest.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            return Response('Unauthorized', status=401, content_type='text/plain')
+        return Response(
+            request.env['wms.metric'].sudo()._wms_render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
     @http.route('/api/wms/health', type='http', auth='public', methods=['GET', 'POST'], csrf=False)
     def health_check(self):
         """Health check endpoint"""
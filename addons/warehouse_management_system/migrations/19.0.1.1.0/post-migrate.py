@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+Marcar como puerta (is_door) la ubicación 'Puerta' que antes se buscaba por nombre
+"""
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    cr.execute("""
+        UPDATE stock_location
+           SET is_door = true
+         WHERE is_box AND name = 'Puerta' AND NOT COALESCE(is_door, false)
+    """)
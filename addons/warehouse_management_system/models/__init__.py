@@ -4,5 +4,15 @@ from . import stock_location
 from . import product_box
 from . import product_box_key
 from . import box_movement_wizard
+from . import rack_layout_wizard
 from . import middleware_config
 from . import display_dialog_box
+from . import wms_operation
+from . import wms_box_import
+from . import wms_rack_occupancy
+from . import wms_slotting
+from . import wms_metric
+from . import wms_column_lock
+from . import wms_request
+from . import wms_grid_change
+from . import wms_box_move_history
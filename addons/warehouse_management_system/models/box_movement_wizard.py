@@ -15,6 +15,12 @@ class BoxMovementWizard(models.TransientModel):
     x_coordinate = fields.Integer(string="X Coordinate")
     y_coordinate = fields.Integer(string="Y Coordinate")
     z_coordinate = fields.Integer(string="Z Coordinate")
+    assignment_strategy = fields.Selection([
+        ("rack", "By Rack"),
+        ("depth", "Fill Depth First"),
+        ("door", "Nearest to Door"),
+    ], string="Assignment Strategy", default="rack", required=True,
+       help="Orden en que se ocupan las ubicaciones libres al auto-asignar cajas")
 
     def action_picking(self):
         """Ejecutar operación de picking"""
@@ -33,48 +39,13 @@ class BoxMovementWizard(models.TransientModel):
         Ejecutar operación de clean-up
         Reorganiza todas las cajas desde dummy a sus ubicaciones
         """
-        # Buscar cajas en cualquier ubicación dummy
-        out_location_boxes = self.env["product.box"].search([
-            ("state", "=", "outlocation"),
-            ("parent_location.is_dummy", "=", True)
-        ], order="pos_y desc", limit=20)
-        
-        if not out_location_boxes:
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _('No Clean-up Needed'),
-                    'message': _('No boxes found in dummy location.'),
-                    'type': 'info',
-                }
-            }
-        
-        # Usar el método de clean_up de la primera caja encontrada
-        return out_location_boxes[0].action_clean_up()
+        return self.env["product.box"].action_clean_up()
 
     def action_box_naming(self):
         """
         Asignar automáticamente cajas a ubicaciones vacías
         """
-        empty_boxes = self.env["product.box"].search([("parent_location", "=", False)])
-        assigned_count = 0
-        
-        for box in empty_boxes:
-            location = self.env["stock.location"].search([
-                ("is_box", "=", True),
-                ("box_id", "=", False)
-            ], limit=1)
-            
-            if location:
-                box.write({
-                    "parent_location": location.id,
-                    "pos_x": location.pos_x,
-                    "pos_y": location.pos_y,
-                    "pos_z": location.pos_z,
-                })
-                location.write({"box_id": box.id})
-                assigned_count += 1
+        assigned_count = self.env["product.box"]._wms_assign_rack_locations(self.assignment_strategy)
         
         return {
             'type': 'ir.actions.client',
@@ -94,27 +65,35 @@ class BoxMovementWizard(models.TransientModel):
         if not self.rack_id:
             raise UserError(_('Please select a rack first.'))
         
-        # MÉTODO 1: Buscar por coordenadas y parent_location
+        # MÉTODO 1: Buscar por coordenadas en la rejilla de ocupación del rack
         # Primero buscamos la ubicación específica que coincide con las coordenadas
-        specific_location = self.env["stock.location"].search([
-            ("is_box", "=", True),
-            ("pos_x", "=", self.x_coordinate),
-            ("pos_y", "=", self.y_coordinate),
-            ("pos_z", "=", self.z_coordinate),
-            ("location_id", "child_of", self.rack_id.id)
-        ], limit=1)
+        Location = self.env["stock.location"]
+        grid = Location._wms_grid(self.rack_id.id)
+        specific_location = Location.browse(grid.slot_at(self.x_coordinate, self.y_coordinate, self.z_coordinate))
+
+        if not specific_location:
+            # Racks con sub-niveles: las ubicaciones no cuelgan directamente del rack
+            specific_location = Location.search([
+                ("is_box", "=", True),
+                ("pos_x", "=", self.x_coordinate),
+                ("pos_y", "=", self.y_coordinate),
+                ("pos_z", "=", self.z_coordinate),
+                ("location_id", "child_of", self.rack_id.id)
+            ], limit=1)
         
         if not specific_location:
             raise UserError(_(
                 'No location found at coordinates:\nX=%d, Y=%d, Z=%d\nin rack %s'
             ) % (self.x_coordinate, self.y_coordinate, self.z_coordinate, self.rack_id.name))
         
-        # Ahora buscamos la caja en esa ubicación
-        box = self.env["product.box"].search([
-            "|",
-            ("rack_location", "=", specific_location.id),
-            ("parent_location", "=", specific_location.id)
-        ], limit=1)
+        # Ahora buscamos la caja en esa ubicación (la rejilla conoce las cajas presentes)
+        box = self.env["product.box"].browse(grid.boxes_at(specific_location.id)[:1])
+        if not box:
+            box = self.env["product.box"].search([
+                "|",
+                ("rack_location", "=", specific_location.id),
+                ("parent_location", "=", specific_location.id)
+            ], limit=1)
         
         # MÉTODO 2 (alternativo): Buscar directamente por coordenadas
         # Este método es más simple y directo
@@ -205,13 +184,16 @@ class BoxMovementWizard(models.TransientModel):
 
     def action_outside_warehouse(self):
         """
-        Mostrar cajas que están fuera del almacén
+        Informe de cajas fuera del almacén
+
+        Lista agrupada por ubicación y estado: el cliente pide los recuentos
+        con read_group y el detalle de cada grupo paginado, así no se cargan
+        todas las cajas (ver también la exportación en streaming)
         """
-        boxes = self.env["product.box"].search([
-            ("parent_location.usage", "!=", "internal")
-        ])
-        
-        if not boxes:
+        Box = self.env["product.box"]
+        summary = Box._wms_outside_summary()
+
+        if not summary:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -222,19 +204,24 @@ class BoxMovementWizard(models.TransientModel):
                 }
             }
         
-        box_list = "\n".join([
-            "- %s (X:%d, Y:%d, Z:%d)" % (box.location_identification, box.pos_x, box.pos_y, box.pos_z) 
-            for box in boxes
-        ])
-        message_text = _("These boxes are out of warehouse:\n\n%s") % box_list
-        
+        total = sum(count for _location, _state, count in summary)
+        locations = {location for location, _state, _count in summary}
         return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _('Boxes Outside Warehouse'),
-                'message': message_text,
-                'type': 'warning',
-                'sticky': True,
-            }
+            'type': 'ir.actions.act_window',
+            'name': _('Boxes Outside Warehouse: %d in %d locations') % (total, len(locations)),
+            'res_model': 'product.box',
+            'view_mode': 'list,form',
+            'views': [(self.env.ref('warehouse_management_system.view_product_box_outside_tree').id, 'list'),
+                      (False, 'form')],
+            'domain': Box._wms_outside_domain(),
+            'context': {'group_by': ['parent_location', 'state'], 'create': False},
+            'target': 'current',
+        }
+
+    def action_export_outside(self):
+        """Descargar las cajas fuera del almacén en CSV (exportación en streaming)"""
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/api/wms/boxes/outside/export?format=csv',
+            'target': 'download',
         }
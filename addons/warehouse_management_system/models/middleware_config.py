@@ -1,12 +1,33 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
+from odoo.tools import ormcache
 from odoo.exceptions import UserError
 import json
 import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
 
 _logger = logging.getLogger(__name__)
 
+# Sesiones HTTP reutilizables por worker: {(dbname, config_id): ((url, api_key), session)}
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# Conexiones keep-alive por configuración (hilos concurrentes del mismo worker)
+POOL_MAXSIZE = 4
+# Respuestas que indican que el middleware no procesó la operación
+RETRYABLE_STATUS = {429, 502, 503, 504}
+# Backoff exponencial con jitter completo (segundos)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+# Fallos seguidos a partir de los que un middleware se considera caído
+HEALTH_DOWN_FAILURES = 3
+
 class MiddlewareConfig(models.Model):
     """
     Configuración de conexión con el Middleware
@@ -27,15 +48,94 @@ class MiddlewareConfig(models.Model):
         help='Clave de autenticación para el middleware (opcional)'
     )
     active = fields.Boolean(string='Active', default=True)
+    rack_ids = fields.Many2many(
+        'stock.location',
+        'middleware_config_rack_rel',
+        'config_id',
+        'rack_id',
+        string='Racks',
+        domain=[('is_rack', '=', True)],
+        help='Racks cuyo PLC atiende este middleware. Las operaciones se envían al middleware '
+             'del rack de la caja objetivo; una configuración sin racks atiende al resto'
+    )
     timeout = fields.Integer(string='Timeout (seconds)', default=30)
-    retry_count = fields.Integer(string='Retry Count', default=3)
+    retry_count = fields.Integer(
+        string='Retry Count',
+        default=3,
+        help='Reintentos ante errores de conexión o 429/502/503/504 (backoff exponencial con jitter)'
+    )
+    cleanup_max_steps = fields.Integer(
+        string='Clean-up Steps per Operation',
+        default=40,
+        help='Los clean-up más largos se reparten en varias operaciones (columnas completas)'
+    )
+    low_priority_max_wait = fields.Integer(
+        string='Low Priority Max Wait (minutes)',
+        default=15,
+        help='Las operaciones de prioridad baja (clean-up, slotting) esperan a que no haya '
+             'pickings o put-ins en curso, como máximo estos minutos'
+    )
+    column_lock_mode = fields.Selection([
+        ('wait', 'Wait'),
+        ('fail', 'Fail Fast'),
+    ], string='Busy Column', default='wait', required=True,
+       help='Qué hacer al planificar sobre una columna bloqueada por otra operación en curso: '
+            'esperar a que termine (como mucho Column Lock Timeout) o avisar inmediatamente')
+    column_lock_timeout = fields.Integer(
+        string='Column Lock Timeout (seconds)',
+        default=30,
+        help='Espera máxima por una columna bloqueada en modo Wait'
+    )
+    schedule_window = fields.Integer(
+        string='Scheduling Window (seconds)',
+        default=5,
+        help='Los pickings y put-ins esperan como mucho estos segundos para planificarse juntos: '
+             'por prioridad y SLA, y los de una misma columna en una sola operación. '
+             '0 = planificar cada petición inmediatamente'
+    )
+    schedule_sla = fields.Integer(
+        string='Request SLA (minutes)',
+        default=10,
+        help='Las peticiones que superan este tiempo sin planificar pasan por delante como prioridad alta'
+    )
     last_connection_test = fields.Datetime(string='Last Connection Test')
     connection_status = fields.Selection([
         ('not_tested', 'Not Tested'),
         ('success', 'Connected'),
         ('failed', 'Connection Failed')
     ], string='Connection Status', default='not_tested', readonly=True)
+    health_status = fields.Selection([
+        ('unknown', 'Unknown'),
+        ('healthy', 'Healthy'),
+        ('degraded', 'Degraded'),
+        ('down', 'Down'),
+    ], string='Health', default='unknown', readonly=True,
+       help='Estado según los últimos envíos del dispatcher a este middleware')
+    consecutive_failures = fields.Integer(string='Consecutive Failures', readonly=True)
+    last_success_date = fields.Datetime(string='Last Successful Send', readonly=True)
+    last_failure_date = fields.Datetime(string='Last Failed Send', readonly=True)
+    last_send_error = fields.Text(string='Last Send Error', readonly=True)
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'middleware_url', 'api_key', 'active'}.intersection(vals):
+            self._close_sessions()
+        if 'active' in vals or 'rack_ids' in vals:
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        self._close_sessions()
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
     @api.constrains('middleware_url')
     def _check_middleware_url(self):
         """Validar formato de URL"""
@@ -45,6 +145,20 @@ class MiddlewareConfig(models.Model):
                         record.middleware_url.startswith('https://')):
                     raise UserError(_('Middleware URL must start with http:// or https://'))
     
+    @api.constrains('rack_ids', 'active')
+    def _check_rack_ids(self):
+        """Cada rack se atiende desde un único middleware activo"""
+        for record in self.filtered(lambda r: r.active and r.rack_ids):
+            other = self.search([
+                ('id', '!=', record.id),
+                ('active', '=', True),
+                ('rack_ids', 'in', record.rack_ids.ids),
+            ], limit=1)
+            if other:
+                shared = record.rack_ids & other.rack_ids
+                raise UserError(_('Racks %s are already bound to middleware %s.') % (
+                    ', '.join(shared.mapped('display_name')), other.name))
+
     def test_connection(self):
         """
         Probar conexión con el middleware
@@ -95,10 +209,50 @@ class MiddlewareConfig(models.Model):
                 }
             }
     
+    def _get_session(self):
+        """
+        Sesión HTTP keep-alive de este worker para la configuración
+
+        Se reconstruye si cambian la URL o la API key (también desde otro worker).
+        """
+        self.ensure_one()
+        key = (self.env.cr.dbname, self.id)
+        fingerprint = (self.middleware_url, self.api_key or '')
+
+        with _SESSIONS_LOCK:
+            entry = _SESSIONS.get(key)
+            if entry and entry[0] == fingerprint:
+                return entry[1]
+            if entry:
+                entry[1].close()
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            if self.api_key:
+                session.headers['Authorization'] = f'Bearer {self.api_key}'
+
+            _SESSIONS[key] = (fingerprint, session)
+            return session
+
+    def _close_sessions(self):
+        """Cerrar las sesiones HTTP de estas configuraciones en este worker"""
+        with _SESSIONS_LOCK:
+            for config in self:
+                entry = _SESSIONS.pop((self.env.cr.dbname, config.id), None)
+                if entry:
+                    entry[1].close()
+
     def _send_to_middleware(self, endpoint, data):
         """
-        Enviar datos al middleware usando Odoo's HTTP client
+        Enviar datos al middleware reutilizando la conexión del worker
         
+        Reintenta hasta retry_count veces con backoff exponencial y jitter, solo
+        ante errores de conexión o respuestas 429/502/503/504 (la operación no
+        llegó a procesarse). El resto de errores se devuelve inmediatamente.
+
         Args:
             endpoint: endpoint del API (ej: '/api/v1/operations')
             data: diccionario con los datos a enviar
@@ -110,46 +264,94 @@ class MiddlewareConfig(models.Model):
         
         # Construir URL completa
         url = self.middleware_url.rstrip('/') + endpoint
-        
-        # Preparar headers
-        headers = {
-            'Content-Type': 'application/json',
-        }
-        
-        if self.api_key:
-            headers['Authorization'] = f'Bearer {self.api_key}'
-        
-        # Odoo SaaS permite hacer requests externos usando su cliente HTTP interno
-        # Usamos el método estándar de Odoo para hacer requests
-        try:
-            # En Odoo SaaS, usamos las herramientas internas de HTTP
-            import requests  # Odoo SaaS tiene requests disponible internamente
-            
-            response = requests.post(
-                url,
-                json=data,
-                headers=headers,
-                timeout=self.timeout
+        session = self._get_session()
+        body = json.dumps(data)
+        attempts = max(self.retry_count, 0) + 1
+
+        for attempt in range(attempts):
+            retryable = False
+            try:
+                response = session.post(url, data=body, timeout=self.timeout)
+                retryable = response.status_code in RETRYABLE_STATUS
+                response.raise_for_status()
+
+                _logger.info(f"Successfully sent operation to middleware: {data.get('operation_id')}")
+
+                return response.json()
+
+            except requests.ConnectionError as e:
+                # Incluye ConnectTimeout: la petición no llegó al middleware
+                error = e
+                retryable = True
+            except Exception as e:
+                error = e
+
+            if not retryable or attempt == attempts - 1:
+                break
+
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            _logger.warning(
+                f"Middleware no disponible ({error}), reintento {attempt + 1}/{attempts - 1} en {delay:.2f}s"
             )
-            
-            response.raise_for_status()
-            
-            _logger.info(f"Successfully sent operation to middleware: {data.get('operation_id')}")
-            
-            return response.json()
-            
-        except Exception as e:
-            _logger.error(f"Failed to send to middleware: {str(e)}")
-            raise UserError(_(
-                'Failed to communicate with middleware:\n'
-                'URL: %s\n'
-                'Error: %s'
-            ) % (url, str(e)))
+            time.sleep(delay)
+
+        _logger.error(f"Failed to send to middleware: {str(error)}")
+        raise UserError(_(
+            'Failed to communicate with middleware:\n'
+            'URL: %s\n'
+            'Error: %s'
+        ) % (url, str(error)))
     
+    def _record_health(self, error=None):
+        """
+        Actualizar el estado de salud tras un envío del dispatcher
+
+        Args:
+            error: excepción del envío (None si fue bien)
+        """
+        self.ensure_one()
+        now = fields.Datetime.now()
+        if error is None:
+            if self.health_status != 'healthy' or self.consecutive_failures:
+                self.sudo().write({'health_status': 'healthy', 'consecutive_failures': 0, 'last_success_date': now})
+            elif not self.last_success_date or (now - self.last_success_date).total_seconds() > 60:
+                self.sudo().write({'last_success_date': now})
+            return
+        failures = self.consecutive_failures + 1
+        self.sudo().write({
+            'health_status': 'down' if failures >= HEALTH_DOWN_FAILURES else 'degraded',
+            'consecutive_failures': failures,
+            'last_failure_date': now,
+            'last_send_error': str(error),
+        })
+        if failures == HEALTH_DOWN_FAILURES:
+            _logger.error(f"Middleware {self.name} caído tras {failures} envíos fallidos: {error}")
+
     @api.model
-    def get_active_config(self):
-        """Obtener la configuración activa del middleware"""
-        config = self.search([('active', '=', True)], limit=1)
+    @ormcache()
+    def _rack_routes(self):
+        """
+        Rutas de los racks (en caché hasta que cambie alguna configuración)
+
+        Returns:
+            tuple: ({rack_id: config_id}, id de la configuración por defecto)
+        """
+        configs = self.sudo().search([('active', '=', True)])
+        routes = {rack.id: config.id for config in configs for rack in config.rack_ids}
+        default = next((config.id for config in configs if not config.rack_ids), configs[:1].id)
+        return routes, default
+
+    @api.model
+    def get_active_config(self, rack_id=None):
+        """
+        Obtener la configuración del middleware que atiende un rack
+
+        Args:
+            rack_id: id del rack (None = configuración por defecto: la primera
+                     activa sin racks asignados, o la primera activa)
+        """
+        routes, default = self._rack_routes()
+        config = self.browse(routes.get(rack_id, default)).exists()
         if not config:
             raise UserError(_(
                 'No active middleware configuration found.\n'
@@ -167,3 +369,22 @@ class MiddlewareConfig(models.Model):
         """
         self.ensure_one()
         return self._send_to_middleware('/api/v1/operations', operation_data)
+
+    def queue_operation(self, operation_data, box=None, columns=None, idempotency_key=None):
+        """
+        Encolar operación en el outbox; el dispatcher la envía tras el commit
+
+        Args:
+            operation_data: diccionario con los datos de la operación
+            box: caja objetivo (opcional)
+            columns: columnas (rack, X, Z) bloqueadas para la operación
+                     (por defecto las bloqueadas al planificarla)
+            idempotency_key: clave del llamante para no duplicar la operación (opcional)
+
+        Returns:
+            wms.operation: operación encolada
+        """
+        self.ensure_one()
+        return self.env['wms.operation']._enqueue(
+            self, operation_data, box=box, columns=columns, idempotency_key=idempotency_key,
+        )
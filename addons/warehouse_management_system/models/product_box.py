@@ -2,11 +2,28 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
 import datetime
 import logging
+from psycopg2 import OperationalError
+
+from ..tools.box_assignment import assign_boxes
+from .wms_operation import CALLBACK_ACTIONS
 
 _logger = logging.getLogger(__name__)
 
+# Campos que se pueden pedir en las consultas de cajas (API de solo lectura)
+LOOKUP_BOX_FIELDS = (
+    'id', 'location_identification', 'state', 'pos_x', 'pos_y', 'pos_z',
+    'parent_location', 'rack_location', 'key',
+)
+# Columnas de la exportación de cajas fuera del almacén
+OUTSIDE_EXPORT_COLUMNS = (
+    'id', 'location_identification', 'state', 'pos_x', 'pos_y', 'pos_z', 'location', 'location_usage',
+)
+# Cajas leídas por consulta al exportar (memoria constante)
+OUTSIDE_EXPORT_CHUNK = 1000
+
 class ProductBox(models.Model):
     """
     Modelo principal de Cajas (Unidades de Almacenamiento)
@@ -60,38 +77,172 @@ class ProductBox(models.Model):
         ("inlocation", "In Assigned Location"),
         ("outlocation", "Out of Location")
     ], string="State", default="inlocation")
+    in_rack_slot = fields.Boolean(
+        string="In Rack Slot",
+        compute="_compute_in_rack_slot",
+        store=True,
+        help="La ubicación actual es una posición de rack (soporte de la restricción de unicidad)"
+    )
+
+    # Índices: columna (X, Z) ordenada por profundidad y cajas por ubicación
+    _wms_column_idx = models.Index("(pos_x, pos_z, pos_y) WHERE state = 'inlocation'")
+    _wms_parent_location_idx = models.Index("(parent_location, state)")
+    _wms_rack_location_idx = models.Index("(rack_location) WHERE rack_location IS NOT NULL")
+    # Una sola caja en su sitio por posición de rack. Diferida al commit: los
+    # callbacks y el slotting vacían y ocupan posiciones dentro de la misma
+    # transacción y el orden de los UPDATE del flush no está garantizado.
+    _wms_occupied_slot_excl = models.Constraint(
+        "EXCLUDE USING btree (parent_location WITH =) WHERE (state = 'inlocation' AND in_rack_slot) "
+        "DEFERRABLE INITIALLY DEFERRED",
+        'No puede haber dos cajas en la misma posición del rack.',
+    )
+
+    @api.depends('parent_location.is_box', 'parent_location.is_rack')
+    def _compute_in_rack_slot(self):
+        """Ubicación actual en una posición de rack"""
+        for box in self:
+            box.in_rack_slot = bool(box.parent_location.is_box and box.parent_location.is_rack)
 
     # ========== VALIDACIONES ==========
     
     @api.constrains('parent_location')
     def _check_parent_location_required(self):
         """Validar que toda caja tenga una ubicación actual"""
-        for box in self:
-            if not box.parent_location:
-                raise ValidationError(_(
-                    'Current Location es obligatorio para todas las cajas.\n'
-                    'Por favor asigne una ubicación (ej: Puerta) antes de guardar.'
-                ))
+        if self.filtered(lambda box: not box.parent_location):
+            raise ValidationError(_(
+                'Current Location es obligatorio para todas las cajas.\n'
+                'Por favor asigne una ubicación (ej: la puerta) antes de guardar.'
+            ))
 
-    @api.constrains('parent_location')
+    @api.constrains('parent_location', 'state')
     def _check_unique_box_per_location(self):
-        """Validar que no haya 2 cajas en la misma posición del rack"""
-        for box in self:
-            if box.parent_location and box.parent_location.is_box and box.parent_location.is_rack:
-                # Buscar otras cajas en la misma ubicación
-                existing = self.search([
-                    ('id', '!=', box.id),
-                    ('parent_location', '=', box.parent_location.id),
-                    ('state', '=', 'inlocation')
-                ])
-                if existing:
-                    raise ValidationError(_(
-                        'La ubicación %s ya está ocupada por la caja %s.\n'
-                        'No puede haber dos cajas en la misma posición del rack.'
-                    ) % (box.parent_location.name, existing[0].location_identification))
-    
+        """
+        Validar que no haya 2 cajas en la misma posición del rack
+
+        La comprobación se aplaza al precommit (_wms_check_unique_slots) sobre
+        todas las cajas escritas en la transacción, así dos cajas pueden
+        intercambiar su ubicación en escrituras sucesivas; la restricción
+        diferida _wms_occupied_slot_excl lo garantiza además en la base de datos.
+        Los callbacks del middleware la ejecutan antes, al final de su
+        savepoint, para devolver el error en su respuesta.
+        """
+        data = self.env.cr.precommit.data
+        if 'wms.box.slot_check' not in data:
+            data['wms.box.slot_check'] = set()
+            self.env.cr.precommit.add(self.env['product.box'].sudo()._wms_check_unique_slots)
+        data['wms.box.slot_check'].update(self.ids)
+
+    @api.model
+    def _wms_check_unique_slots(self):
+        """
+        Precommit: comprobar las ubicaciones de rack de las cajas escritas
+
+        Una consulta para todas las cajas (incluidos los choques entre ellas).
+        """
+        box_ids = self.env.cr.precommit.data.pop('wms.box.slot_check', None)
+        if not box_ids:
+            return
+        self.flush_model(['parent_location', 'state'])
+        self.env['stock.location'].flush_model(['is_box', 'is_rack', 'name'])
+        self.env.cr.execute(SQL("""
+            SELECT slot.name, other.location_identification
+              FROM product_box box
+              JOIN stock_location slot ON slot.id = box.parent_location
+              JOIN product_box other ON other.parent_location = box.parent_location
+                                    AND other.id != box.id
+                                    AND other.state = 'inlocation'
+             WHERE box.id IN %s AND box.state = 'inlocation' AND slot.is_box AND slot.is_rack
+             ORDER BY box.id, other.id
+             LIMIT 1
+        """, tuple(box_ids)))
+        conflict = self.env.cr.fetchone()
+        if conflict:
+            raise ValidationError(_(
+                'La ubicación %s ya está ocupada por la caja %s.\n'
+                'No puede haber dos cajas en la misma posición del rack.'
+            ) % conflict)
+
     # ========== FIN VALIDACIONES ==========
 
+    # ========== CONSULTAS ==========
+
+    @api.model
+    def _wms_outside_domain(self):
+        """Cajas fuera del almacén: su ubicación actual no es interna"""
+        return [('parent_location', '!=', False), ('parent_location.usage', '!=', 'internal')]
+
+    @api.model
+    def _wms_outside_summary(self):
+        """
+        Recuento de cajas fuera del almacén por ubicación y estado (read_group)
+
+        Returns:
+            list: [(stock.location, state, count)]
+        """
+        return self._read_group(self._wms_outside_domain(), ['parent_location', 'state'], ['__count'])
+
+    @api.model
+    def _wms_outside_chunks(self, chunk_size=OUTSIDE_EXPORT_CHUNK):
+        """
+        Leer las cajas fuera del almacén en bloques de tamaño fijo
+
+        Paginación por id (keyset): cada bloque es una consulta indexada y
+        solo hay un bloque en memoria, así el consumo no depende del número
+        de cajas.
+
+        Yields:
+            list: filas con los valores de OUTSIDE_EXPORT_COLUMNS
+        """
+        self.check_access('read')
+        self.env['stock.location'].check_access('read')
+        self.flush_model(['parent_location', 'state', 'location_identification', 'pos_x', 'pos_y', 'pos_z'])
+        last_id = 0
+        while True:
+            self.env.cr.execute(SQL("""
+                SELECT box.id, box.location_identification, box.state, box.pos_x, box.pos_y, box.pos_z,
+                       location.complete_name, location.usage
+                  FROM product_box box
+                  JOIN stock_location location ON location.id = box.parent_location
+                 WHERE location.usage != 'internal' AND box.id > %s
+                 ORDER BY box.id
+                 LIMIT %s
+            """, last_id, chunk_size))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    @api.model
+    def _wms_lookup_boxes(self, identifiers, field_names):
+        """
+        Resolver identificadores de caja en una sola consulta (API de solo lectura)
+
+        Args:
+            identifiers: lista de location_identification
+            field_names: campos a devolver (de LOOKUP_BOX_FIELDS); los
+                         many2one se devuelven como id
+
+        Returns:
+            list: por identificador, valores en el orden de field_names (None si no existe)
+        """
+        unknown = set(field_names) - set(LOOKUP_BOX_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos no disponibles: {sorted(unknown)}")
+        self.check_access('read')
+        if not identifiers:
+            return []
+        self.flush_model(['location_identification', *(name for name in field_names if name != 'id')])
+        self.env.cr.execute(SQL(
+            "SELECT location_identification, %s FROM product_box WHERE location_identification IN %s",
+            SQL(", ").join(SQL.identifier(name) for name in field_names),
+            tuple(identifiers),
+        ))
+        found = {row[0]: list(row[1:]) for row in self.env.cr.fetchall()}
+        return [found.get(identifier) for identifier in identifiers]
+
     @api.model_create_multi
     def create(self, vals_list):
         """
@@ -114,23 +265,202 @@ class ProductBox(models.Model):
             
             # AUTO-ASIGNAR PUERTA si no tiene parent_location
             if not vals.get('parent_location'):
-                puerta = self.env['stock.location'].search([
-                    ('name', '=', 'Puerta'),
-                    ('is_box', '=', True)
-                ], limit=1)
+                Location = self.env['stock.location']
+                warehouse_id = Location.browse(vals.get('rack_location')).warehouse_id.id
+                puerta = Location._wms_door_location(warehouse_id)
                 
                 if puerta:
                     vals['parent_location'] = puerta.id
-                    _logger.info(f"Auto-asignada ubicación 'Puerta' a caja {vals.get('location_identification')}")
+                    _logger.info(f"Auto-asignada ubicación '{puerta.name}' a caja {vals.get('location_identification')}")
                 else:
                     raise UserError(_(
-                        'No se encontró la ubicación "Puerta".\n'
-                        'Por favor cree la ubicación Puerta o asigne manualmente una ubicación a la caja.'
+                        'No se encontró la ubicación de puerta.\n'
+                        'Por favor marque una ubicación como puerta (Is Door) o asigne manualmente una ubicación a la caja.'
                     ))
 
         records = super(ProductBox, self).create(vals_list)
+        records._wms_grid_sync()
         return records
 
+    def write(self, vals):
+        """Mantener la rejilla de ocupación al mover cajas"""
+        if 'parent_location' not in vals and 'state' not in vals:
+            return super().write(vals)
+
+        previous_locations = self.parent_location
+        res = super().write(vals)
+        self._wms_grid_sync(previous_locations)
+        if 'parent_location' in vals:
+            self._release_dummy_reservations()
+        return res
+
+    def _release_dummy_reservations(self):
+        """Liberar las ubicaciones dummy reservadas que estas cajas ya no ocupan"""
+        Location = self.env['stock.location']
+        reservations = Location._wms_dummy_reservations(self.ids)
+        released = [
+            location_id for location_id, box_id in reservations.items()
+            if self.browse(box_id).parent_location.id != location_id
+        ]
+        if released:
+            Location.browse(released).write({'box_id': False})
+
+    def unlink(self):
+        racks = self.parent_location.filtered('is_box').location_id
+        box_ids = self.ids
+        res = super().unlink()
+        if racks:
+            def apply(grid):
+                for box_id in box_ids:
+                    grid.remove_box(box_id)
+            self.env['stock.location']._wms_grid_touch(racks.ids, apply)
+        return res
+
+    def _wms_grid_sync(self, previous_locations=None):
+        """
+        Reflejar en la rejilla de ocupación la posición actual de estas cajas
+
+        Args:
+            previous_locations: ubicaciones que ocupaban antes del cambio
+        """
+        slots = self.parent_location
+        if previous_locations:
+            slots |= previous_locations
+        racks = slots.filtered('is_box').location_id
+        if not racks:
+            return
+
+        positions = [(box.id, box.parent_location.id, box.state) for box in self]
+
+        def apply(grid):
+            for box_id, location_id, state in positions:
+                grid.place_box(box_id, location_id, state)
+
+        self.env['stock.location']._wms_grid_touch(racks.ids, apply)
+
+    @api.model
+    def _wms_assign_rack_locations(self, strategy='rack', batch_size=5000):
+        """
+        Asignar ubicación de rack a todas las cajas que no la tienen
+
+        Una consulta para las cajas, otra para las ubicaciones libres y
+        escrituras por lotes (UPDATE ... FROM VALUES). Las cajas que ya están
+        en una ubicación de rack libre se quedan con ella; el resto se
+        empareja según la estrategia (ver tools/box_assignment.py).
+
+        Args:
+            strategy: 'rack', 'depth' o 'door'
+            batch_size: filas por UPDATE
+
+        Returns:
+            int: número de cajas asignadas
+        """
+        self.check_access('write')
+        Location = self.env['stock.location']
+        Location.check_access('write')
+        self.flush_model(['parent_location', 'rack_location', 'state'])
+        Location.flush_model(['location_id', 'is_box', 'is_rack', 'active', 'box_id',
+                              'pos_x', 'pos_y', 'pos_z'])
+
+        cr = self.env.cr
+        cr.execute(SQL("""
+            SELECT box.id, box.parent_location, box.state,
+                   CASE WHEN slot.is_box AND slot.is_rack AND slot.box_id IS NULL
+                         AND NOT EXISTS (SELECT 1 FROM product_box other WHERE other.rack_location = slot.id)
+                        THEN slot.id END
+              FROM product_box box
+              LEFT JOIN stock_location slot ON slot.id = box.parent_location
+             WHERE box.rack_location IS NULL
+             ORDER BY box.location_identification, box.id
+        """))
+        boxes = cr.fetchall()
+        if not boxes:
+            return 0
+
+        cr.execute(SQL("""
+            SELECT slot.id, slot.location_id, slot.pos_x, slot.pos_y, slot.pos_z
+              FROM stock_location slot
+             WHERE slot.is_box AND slot.is_rack AND slot.active AND slot.box_id IS NULL
+               AND NOT EXISTS (SELECT 1 FROM product_box box WHERE box.parent_location = slot.id)
+               AND NOT EXISTS (SELECT 1 FROM product_box box WHERE box.rack_location = slot.id)
+        """))
+        slots = {row[0]: row for row in cr.fetchall()}
+
+        # Cajas ya colocadas en una ubicación de rack sin asignar: se quedan donde están
+        in_place = {}
+        taken = set()
+        pending = []
+        for box_id, _parent_id, _state, location_id in boxes:
+            if location_id and location_id not in taken:
+                in_place[box_id] = location_id
+                taken.add(location_id)
+            else:
+                pending.append(box_id)
+        pairs = list(in_place.items()) + assign_boxes(
+            pending,
+            [(location_id, rack_id, (x, y, z)) for location_id, rack_id, x, y, z in slots.values()],
+            strategy,
+        )
+        if not pairs:
+            return 0
+
+        coords = {}
+        if in_place:
+            cr.execute(SQL(
+                "SELECT id, location_id, pos_x, pos_y, pos_z FROM stock_location WHERE id IN %s",
+                tuple(taken),
+            ))
+            coords = {row[0]: row for row in cr.fetchall()}
+        coords.update(slots)
+
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            values = SQL(", ").join(
+                SQL("(%s, %s, %s, %s, %s)", box_id, location_id, *coords[location_id][2:])
+                for box_id, location_id in chunk
+            )
+            cr.execute(SQL("""
+                UPDATE product_box box
+                   SET rack_location = v.slot_id,
+                       parent_location = COALESCE(box.parent_location, v.slot_id),
+                       in_rack_slot = box.in_rack_slot OR box.parent_location IS NULL,
+                       pos_x = v.x::int4, pos_y = v.y::int4, pos_z = v.z::int4,
+                       write_uid = %s, write_date = (now() at time zone 'UTC')
+                  FROM (VALUES %s) AS v(box_id, slot_id, x, y, z)
+                 WHERE box.id = v.box_id
+            """, self.env.uid, values))
+            cr.execute(SQL("""
+                UPDATE stock_location slot
+                   SET box_id = v.box_id,
+                       write_uid = %s, write_date = (now() at time zone 'UTC')
+                  FROM (VALUES %s) AS v(box_id, slot_id, x, y, z)
+                 WHERE slot.id = v.slot_id
+            """, self.env.uid, values))
+
+        box_ids = [box_id for box_id, _location_id in pairs]
+        self.browse(box_ids).invalidate_recordset(
+            ['rack_location', 'parent_location', 'in_rack_slot', 'pos_x', 'pos_y', 'pos_z',
+             'write_uid', 'write_date'])
+        Location.browse([location_id for _box_id, location_id in pairs]).invalidate_recordset(
+            ['box_id', 'write_uid', 'write_date'])
+
+        # Rejillas: asignación de cada ubicación y cajas sin ubicación actual que pasan a ocuparla
+        unplaced = {box_id: state for box_id, parent_id, state, _location_id in boxes if not parent_id}
+        arrived = {
+            box_id: (location_id, unplaced[box_id])
+            for box_id, location_id in pairs if box_id in unplaced
+        }
+
+        def apply(grid):
+            for box_id, location_id in pairs:
+                grid.set_assigned(location_id, box_id)
+                if box_id in arrived:
+                    grid.place_box(box_id, *arrived[box_id])
+
+        Location._wms_grid_touch({coords[location_id][1] for _box_id, location_id in pairs}, apply)
+        _logger.info(f"Asignadas {len(pairs)} cajas a ubicaciones de rack (estrategia {strategy})")
+        return len(pairs)
+
     def _calculate_blocking_boxes(self):
         """
         Calcular qué cajas están bloqueando el acceso a esta caja
@@ -141,35 +471,30 @@ class ProductBox(models.Model):
         """
         self.ensure_one()
 
-        blocking_boxes = self.search([
-            ('pos_y', '<', self.pos_y),
-            ('pos_x', '=', self.pos_x),
-            ('pos_z', '=', self.pos_z),
-            ('parent_location.location_id', '=', self.parent_location.location_id.id),
-            ('state', '=', 'inlocation')
-        ], order="pos_y asc")
+        grid = self.env['stock.location']._wms_grid(self.parent_location.location_id.id)
+        blockers = grid.blockers(self.pos_x, self.pos_z, self.pos_y)
+        return self.browse([box_id for _y, _location_id, box_id in blockers])
 
-        return blocking_boxes
-
-    def _prepare_operation_data(self, operation_type, target_location=None):
+    def _prepare_operation_data(self, operation_type, target_location=None, priority='normal'):
         """
         Preparar datos para enviar al middleware
 
         Args:
             operation_type: 'picking', 'put_in', 'clean_up'
             target_location: ubicación destino (opcional)
+            priority: 'high', 'normal' o 'low'
         """
         self.ensure_one()
 
         # Generar ID único de operación
-        operation_id = f"{operation_type.upper()}-{self.id}-{fields.Datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        operation_id = self.env['wms.operation']._new_operation_id(operation_type.upper(), self.id)
 
         # Datos base de la operación
         operation_data = {
             "operation_id": operation_id,
             "operation_type": operation_type,
             "timestamp": fields.Datetime.now().isoformat(),
-            "priority": "normal",
+            "priority": priority,
             "target_box": {
                 "id": self.location_identification,
                 "odoo_id": self.id,
@@ -203,32 +528,109 @@ class ProductBox(models.Model):
     def _build_picking_sequence(self):
         """
         Construir secuencia de movimientos para picking
+
+        Acepta varias cajas: las que comparten columna (rack, X, Z) se recorren
+        de delante hacia atrás, de modo que cada caja bloqueante se mueve a
+        dummy una sola vez aunque bloquee a varias cajas objetivo.
         """
-        self.ensure_one()
-        blocking_boxes = self._calculate_blocking_boxes()
-        dummy_location = self.env['stock.location'].get_dummy_location()
+        if not self:
+            return []
+
+        allocator, dummy_location = self._dummy_planning()
 
-        if not dummy_location:
+        if allocator is None and not dummy_location:
             raise UserError(_('No dummy location configured. Please create one first.'))
 
+        # Agrupar cajas objetivo por columna
+        columns = {}
+        for box in self:
+            rack_id = box.parent_location.location_id.id
+            columns.setdefault((rack_id, box.pos_x, box.pos_z), []).append(box)
+
+        # Ninguna otra operación puede planificarse sobre estas columnas hasta que termine esta
+        self.env['wms.column.lock']._wms_acquire(columns)
+
         sequence = []
         step = 1
 
-        # Primero mover las cajas bloqueantes a dummy
-        for box in blocking_boxes:
-            sequence.append({
-                "step": step,
-                "action": "move_to_dummy",
-                "box_id": box.location_identification,
-                "box_odoo_id": box.id,
-                "from": {"x": box.pos_x, "y": box.pos_y, "z": box.pos_z},
-                "to": {"x": dummy_location.pos_x or 0, "y": dummy_location.pos_y or 0, "z": dummy_location.pos_z or 0},
-                "description": f"Move box {box.location_identification} to dummy rack"
-            })
-            step += 1
+        for (rack_id, pos_x, pos_z), targets in columns.items():
+            grid = self.env['stock.location']._wms_grid(rack_id)
+            target_ids = {box.id for box in targets}
+            deepest = max(box.pos_y for box in targets)
 
-        # Luego mover la caja objetivo a posición de entrega
-        sequence.append({
+            # Cajas de la columna por delante de la caja objetivo más profunda
+            in_front = [box_id for _y, _location_id, box_id in grid.blockers(pos_x, pos_z, deepest)]
+            delivered = set()
+
+            for box in self.browse(in_front):
+                if box.id in target_ids:
+                    sequence.append(box._picking_deliver_step(step))
+                    delivered.add(box.id)
+                else:
+                    # Primero mover las cajas bloqueantes a dummy
+                    sequence.append(box._move_to_dummy_step(
+                        step, allocator, dummy_location,
+                        f"Move box {box.location_identification} to dummy rack"
+                    ))
+                step += 1
+
+            # Luego mover las cajas objetivo restantes a posición de entrega
+            for box in sorted(targets, key=lambda b: (b.pos_y, b.id)):
+                if box.id not in delivered:
+                    sequence.append(box._picking_deliver_step(step))
+                    step += 1
+
+        if allocator is not None:
+            self.env['stock.location']._wms_reserve_dummy_slots(allocator.allocations)
+
+        return sequence
+
+    def _dummy_planning(self):
+        """
+        Preparar el reparto de ubicaciones dummy de un plan
+
+        Returns:
+            tuple: (DummyAllocator o None, ubicación dummy clásica)
+            Sin ubicaciones dummy is_box se usa la coordenada de get_dummy_location()
+        """
+        Location = self.env['stock.location']
+        allocator = Location._wms_dummy_allocator()
+        dummy_location = Location.browse() if allocator is not None else Location.get_dummy_location()
+        return allocator, dummy_location
+
+    def _move_to_dummy_step(self, step, allocator, dummy_location, description):
+        """
+        Paso de movimiento de una caja bloqueante a una ubicación dummy libre,
+        la más cercana a su columna de origen
+        """
+        self.ensure_one()
+        if allocator is not None:
+            allocated = allocator.allocate((self.pos_x, self.pos_y, self.pos_z), self.id)
+            if not allocated:
+                raise UserError(_(
+                    'Dummy area is full: no free dummy location for box %s.\n'
+                    'Please run a clean-up first.'
+                ) % self.location_identification)
+            location_id, (x, y, z) = allocated
+        else:
+            location_id = dummy_location.id
+            x, y, z = dummy_location.pos_x or 0, dummy_location.pos_y or 0, dummy_location.pos_z or 0
+
+        return {
+            "step": step,
+            "action": "move_to_dummy",
+            "box_id": self.location_identification,
+            "box_odoo_id": self.id,
+            "from": {"x": self.pos_x, "y": self.pos_y, "z": self.pos_z},
+            "to": {"x": x, "y": y, "z": z},
+            "to_location_odoo_id": location_id,
+            "description": description
+        }
+
+    def _picking_deliver_step(self, step):
+        """Paso de entrega de la caja a la posición central"""
+        self.ensure_one()
+        return {
             "step": step,
             "action": "deliver",
             "box_id": self.location_identification,
@@ -236,41 +638,33 @@ class ProductBox(models.Model):
             "from": {"x": self.pos_x, "y": self.pos_y, "z": self.pos_z},
             "to": {"x": 0, "y": 0, "z": 0},
             "description": f"Deliver box {self.location_identification} to central position"
-        })
-
-        return sequence
+        }
 
     def _build_put_in_sequence(self, target_location):
         """
         Construir secuencia de movimientos para put-in
         """
         self.ensure_one()
+        self.env['wms.column.lock']._wms_acquire([
+            (target_location.location_id.id, target_location.pos_x, target_location.pos_z)
+        ])
 
         # Buscar cajas que bloquean la ubicación objetivo
-        blocking_boxes = self.search([
-            ('pos_y', '<', target_location.pos_y),
-            ('pos_x', '=', target_location.pos_x),
-            ('pos_z', '=', target_location.pos_z),
-            ('parent_location.location_id', '=', target_location.location_id.id),
-            ('state', '=', 'inlocation')
-        ], order="pos_y asc")
+        grid = self.env['stock.location']._wms_grid(target_location.location_id.id)
+        blockers = grid.blockers(target_location.pos_x, target_location.pos_z, target_location.pos_y)
+        blocking_boxes = self.browse([box_id for _y, _location_id, box_id in blockers])
 
-        dummy_location = self.env['stock.location'].get_dummy_location()
+        allocator, dummy_location = self._dummy_planning()
 
         sequence = []
         step = 1
 
         # Mover cajas bloqueantes a dummy
         for box in blocking_boxes:
-            sequence.append({
-                "step": step,
-                "action": "move_to_dummy",
-                "box_id": box.location_identification,
-                "box_odoo_id": box.id,
-                "from": {"x": box.pos_x, "y": box.pos_y, "z": box.pos_z},
-                "to": {"x": dummy_location.pos_x or 0, "y": dummy_location.pos_y or 0, "z": dummy_location.pos_z or 0},
-                "description": f"Move box {box.location_identification} to dummy"
-            })
+            sequence.append(box._move_to_dummy_step(
+                step, allocator, dummy_location,
+                f"Move box {box.location_identification} to dummy"
+            ))
             step += 1
 
         # Colocar la caja en su ubicación
@@ -284,193 +678,363 @@ class ProductBox(models.Model):
             "description": f"Place box {self.location_identification} in target location"
         })
 
+        if allocator is not None:
+            self.env['stock.location']._wms_reserve_dummy_slots(allocator.allocations)
+
+        return sequence
+
+    @api.model
+    def _build_relocation_sequence(self, rack_id, pos_x, pos_z, targets):
+        """
+        Construir secuencia para reordenar las cajas de una columna (slotting)
+
+        Todas las cajas de la columna hasta la profundidad afectada salen a
+        dummy de delante hacia atrás y vuelven de atrás hacia delante, cada una
+        a su nueva ubicación (o a la suya si no cambia).
+
+        Args:
+            rack_id: contenedor de la columna
+            pos_x, pos_z: columna
+            targets: {box_id: stock.location} nueva ubicación de las cajas que cambian
+
+        Returns:
+            list: pasos de la secuencia
+        """
+        grid = self.env['stock.location']._wms_grid(rack_id)
+        deepest = max(
+            [target.pos_y for target in targets.values()]
+            + [self.browse(box_id).pos_y for box_id in targets]
+        )
+        in_front = grid.blockers(pos_x, pos_z, deepest + 1)
+        allocator, dummy_location = self._dummy_planning()
+
+        sequence = []
+        parked = []
+        step = 1
+        for _y, location_id, box_id in in_front:
+            box = self.browse(box_id)
+            move = box._move_to_dummy_step(
+                step, allocator, dummy_location,
+                f"Move box {box.location_identification} to dummy for relocation"
+            )
+            sequence.append(move)
+            target = targets.get(box_id) or self.env['stock.location'].browse(location_id)
+            parked.append((box, move['to'], target))
+            step += 1
+
+        for box, dummy_pos, target in sorted(parked, key=lambda item: -item[2].pos_y):
+            sequence.append({
+                "step": step,
+                "action": "place",
+                "box_id": box.location_identification,
+                "box_odoo_id": box.id,
+                "from": dict(dummy_pos),
+                "to": {"x": target.pos_x, "y": target.pos_y, "z": target.pos_z},
+                "description": f"Place box {box.location_identification} in {target.name}"
+            })
+            step += 1
+
+        if allocator is not None:
+            self.env['stock.location']._wms_reserve_dummy_slots(allocator.allocations)
+
         return sequence
 
-    def action_move(self):
+    def action_move(self, priority='normal'):
         """
         Acción de PICKING - Extraer caja del almacén
         Adaptado para SaaS: envía operación al middleware en lugar de IoT Box
+        Con ventana de planificación la petición se agrupa con las demás (wms.request)
         """
         self.ensure_one()
 
         try:
-            # Obtener configuración del middleware
-            middleware = self.env['middleware.config'].get_active_config()
+            # Obtener configuración del middleware del rack de la caja
+            middleware = self.env['middleware.config'].get_active_config(self.parent_location.location_id.id)
+
+            if middleware.schedule_window > 0:
+                request = self.env['wms.request']._wms_submit(self, 'picking', priority)
+                _logger.info(f"Picking request scheduled: {request.ids}")
+                return self._scheduled_notification(_('Picking'), middleware)
 
             # Preparar datos de la operación
-            operation_data = self._prepare_operation_data('picking')
+            operation_data = self._prepare_operation_data('picking', priority=priority)
 
-            # Enviar al middleware
-            response = middleware.send_operation(operation_data)
+            # Encolar para el middleware (se envía en segundo plano tras el commit)
+            middleware.queue_operation(operation_data, box=self)
 
-            # Registrar operación enviada
-            _logger.info(f"Picking operation sent: {operation_data['operation_id']}")
+            # Registrar operación encolada
+            _logger.info(f"Picking operation queued: {operation_data['operation_id']}")
 
             # Mostrar mensaje al usuario
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
-                    'title': _('Operation Sent'),
-                    'message': _('Picking operation sent to middleware.\nOperation ID: %s') % operation_data['operation_id'],
+                    'title': _('Operation Queued'),
+                    'message': _('Picking operation queued for the middleware.\nOperation ID: %s') % operation_data['operation_id'],
                     'type': 'success',
                     'sticky': False,
                 }
             }
 
+        except OperationalError:
+            # Conflicto de concurrencia (columna liberada durante la espera): Odoo reintenta la petición
+            raise
         except Exception as e:
             _logger.error(f"Failed to send picking operation: {str(e)}")
             raise UserError(_(
                 'Failed to send picking operation to middleware:\n%s'
             ) % str(e))
 
-    def action_put_in_target(self):
+    def action_put_in_target(self, priority='normal'):
         """
         Acción de PUT-IN - Almacenar caja en rack
         """
         self.ensure_one()
 
         try:
-            middleware = self.env['middleware.config'].get_active_config()
-            operation_data = self._prepare_operation_data('put_in')
-            response = middleware.send_operation(operation_data)
+            middleware = self.env['middleware.config'].get_active_config(self.rack_location.location_id.id)
 
-            _logger.info(f"Put-in operation sent: {operation_data['operation_id']}")
+            if middleware.schedule_window > 0:
+                request = self.env['wms.request']._wms_submit(self, 'put_in', priority)
+                _logger.info(f"Put-in request scheduled: {request.ids}")
+                return self._scheduled_notification(_('Put-in'), middleware)
+
+            operation_data = self._prepare_operation_data('put_in', priority=priority)
+            middleware.queue_operation(operation_data, box=self)
+
+            _logger.info(f"Put-in operation queued: {operation_data['operation_id']}")
 
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
-                    'title': _('Operation Sent'),
-                    'message': _('Put-in operation sent to middleware.\nOperation ID: %s') % operation_data['operation_id'],
+                    'title': _('Operation Queued'),
+                    'message': _('Put-in operation queued for the middleware.\nOperation ID: %s') % operation_data['operation_id'],
                     'type': 'success',
                     'sticky': False,
                 }
             }
 
+        except OperationalError:
+            raise
         except Exception as e:
             _logger.error(f"Failed to send put-in operation: {str(e)}")
             raise UserError(_('Failed to send put-in operation:\n%s') % str(e))
 
+    def _scheduled_notification(self, label, middleware):
+        """Aviso de petición registrada en el planificador"""
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Request Scheduled'),
+                'message': _('%s request scheduled for box %s.\nIt will be sent within %d seconds, '
+                             'grouped with other pending requests.') % (
+                    label, self.location_identification, middleware.schedule_window),
+                'type': 'success',
+                'sticky': False,
+            }
+        }
+
     def action_clean_up(self):
         """
         Acción de CLEAN-UP - Reorganizar cajas desde dummy a sus ubicaciones originales
-        Busca cajas en CUALQUIER ubicación dummy (Dummy-01, Dummy-02, etc.)
-        Usa rack_location para saber dónde devolver cada caja
+        Planifica todas las cajas de las zonas dummy (ver _plan_clean_up)
         """
-        self.ensure_one()
-
         try:
-            middleware = self.env['middleware.config'].get_active_config()
-
-            # Buscar cajas en cualquier ubicación dummy (is_dummy=True)
-            boxes_in_dummy = self.search([
-                ('parent_location.is_dummy', '=', True),
-                ('state', '=', 'outlocation')
-            ], order='pos_y desc', limit=20)
-
-            if not boxes_in_dummy:
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('No Clean-up Needed'),
-                        'message': _('No boxes found in dummy location.'),
-                        'type': 'info',
-                        'sticky': False,
-                    }
+            operations = self._plan_clean_up()
+        except (UserError, OperationalError):
+            raise
+        except Exception as e:
+            _logger.error(f"Failed to send clean-up operation: {str(e)}")
+            raise UserError(_('Failed to send clean-up operation:\n%s') % str(e))
+
+        if not operations:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('No Clean-up Needed'),
+                    'message': _('No boxes found in dummy location.'),
+                    'type': 'info',
+                    'sticky': False,
                 }
+            }
 
-            # Construir lista de cajas a devolver
-            # current_pos = coordenadas actuales en dummy (pos_x, pos_y, pos_z)
-            # target_pos  = coordenadas originales del rack (rack_location)
-            boxes_to_return = []
-            for box in boxes_in_dummy:
-                if not box.rack_location:
-                    _logger.warning(f"Caja {box.location_identification} no tiene rack_location, se omite del clean-up")
-                    continue
-                
-                boxes_to_return.append({
-                    "box_id": box.location_identification,
-                    "box_odoo_id": box.id,
-                    "current_pos": {
-                        "x": box.pos_x,
-                        "y": box.pos_y,
-                        "z": box.pos_z
-                    },
-                    "target_pos": {
-                        "x": box.rack_location.pos_x,
-                        "y": box.rack_location.pos_y,
-                        "z": box.rack_location.pos_z
-                    }
-                })
+        returned = sum(
+            1 for operation in operations for step in operation.step_ids
+            if step.action == 'place'
+        )
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Clean-up Started'),
+                'message': _('%d clean-up operations queued.\n%d boxes will be returned to their locations.') % (
+                    len(operations), returned),
+                'type': 'success',
+                'sticky': False,
+            }
+        }
 
-            if not boxes_to_return:
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'title': _('No Clean-up Needed'),
-                        'message': _('No boxes with valid rack locations found.'),
-                        'type': 'warning',
-                        'sticky': False,
-                    }
-                }
+    @api.model
+    def _plan_clean_up(self, zone_ids=None):
+        """
+        Planificar la devolución a su ubicación de las cajas en zonas dummy
+
+        Las cajas se agrupan por columna de destino y se colocan de la más
+        profunda a la más delantera, así ninguna devolución bloquea a otra. Si
+        una caja del rack ocupa el camino, sale a dummy y vuelve a su sitio en
+        la misma secuencia. Las columnas se reparten en operaciones de prioridad
+        baja de hasta cleanup_max_steps pasos; las cajas con pasos pendientes en
+        otra operación se dejan para la siguiente planificación.
 
-            # Construir secuencia de movimientos para el middleware
-            sequence = []
-            step = 1
-            for box_data in boxes_to_return:
-                sequence.append({
-                    "step": step,
+        Args:
+            zone_ids: zonas dummy a vaciar (None = todas)
+
+        Returns:
+            wms.operation: operaciones encoladas
+        """
+        Location = self.env['stock.location']
+        Config = self.env['middleware.config']
+
+        busy = {step.box_id.id for step in self.env['wms.operation.step'].search_fetch([
+            ('state', '=', 'pending'),
+            ('operation_id.state', 'in', ('queued', 'sent')),
+            ('box_id', '!=', False),
+        ], ['box_id'])}
+
+        domain = [
+            ('parent_location.is_dummy', '=', True),
+            ('state', '=', 'outlocation'),
+            ('rack_location', '!=', False),
+        ]
+        if zone_ids:
+            domain.append(('parent_location.location_id', 'in', list(zone_ids)))
+        boxes = self.search(domain).filtered(lambda box: box.id not in busy)
+
+        columns = {}
+        for box in boxes:
+            target = box.rack_location
+            columns.setdefault((target.location_id.id, target.pos_x, target.pos_z), []).append(box)
+
+        # Las columnas con pickings o put-ins esperando al planificador tienen preferencia
+        awaited = self.env['wms.request']._wms_awaited_columns()
+
+        candidates = {}
+        for (rack_id, pos_x, pos_z), returning in columns.items():
+            if (rack_id, pos_x, pos_z) in awaited:
+                continue
+            grid = Location._wms_grid(rack_id)
+            returning = [
+                box for box in returning
+                if not grid.boxes_at(box.rack_location.id)
+                or set(grid.boxes_at(box.rack_location.id)) == {box.id}
+            ]
+            if not returning:
+                continue
+            deepest = max(box.rack_location.pos_y for box in returning)
+            in_front = grid.blockers(pos_x, pos_z, deepest)
+            if any(box_id in busy for _y, _location_id, box_id in in_front):
+                # Columna con un picking en curso: se devuelve en la siguiente planificación
+                continue
+            candidates[(rack_id, pos_x, pos_z)] = (returning, in_front)
+
+        # Las columnas bloqueadas por otra operación también se dejan para la siguiente planificación
+        locked = self.env['wms.column.lock']._wms_acquire(candidates, mode='skip')
+
+        allocator, dummy_location = self._dummy_planning()
+        column_plans = []
+        for key, (returning, in_front) in candidates.items():
+            if key not in locked:
+                continue
+            column = []
+            places = [(box, {"x": box.pos_x, "y": box.pos_y, "z": box.pos_z}, box.rack_location)
+                      for box in returning]
+            for _y, location_id, box_id in in_front:
+                blocker = self.browse(box_id)
+                move = blocker._move_to_dummy_step(
+                    0, allocator, dummy_location,
+                    f"Move box {blocker.location_identification} to dummy"
+                )
+                column.append(move)
+                places.append((blocker, move['to'], Location.browse(location_id)))
+
+            for box, source, target in sorted(places, key=lambda item: (-item[2].pos_y, item[0].id)):
+                column.append({
+                    "step": 0,
                     "action": "place",
-                    "box_id": box_data["box_id"],
-                    "box_odoo_id": box_data["box_odoo_id"],
-                    "from": box_data["current_pos"],
-                    "to": box_data["target_pos"],
-                    "description": f"Return box {box_data['box_id']} from dummy to rack"
+                    "box_id": box.location_identification,
+                    "box_odoo_id": box.id,
+                    "from": dict(source),
+                    "to": {"x": target.pos_x, "y": target.pos_y, "z": target.pos_z},
+                    "description": f"Return box {box.location_identification} from dummy to rack"
                 })
-                step += 1
-
+            column_plans.append((key, column))
+
+        if allocator is not None:
+            Location._wms_reserve_dummy_slots(allocator.allocations)
+
+        # Repartir columnas completas en operaciones de hasta cleanup_max_steps pasos,
+        # cada una para el middleware del rack de sus columnas
+        chunks = []
+        open_chunks = {}
+        for key, column in column_plans:
+            middleware = Config.get_active_config(key[0])
+            index = open_chunks.get(middleware.id)
+            if index is not None and len(chunks[index][2]) + len(column) <= middleware.cleanup_max_steps:
+                chunks[index][1].append(key)
+                chunks[index][2].extend(column)
+            else:
+                open_chunks[middleware.id] = len(chunks)
+                chunks.append((middleware, [key], list(column)))
+
+        operations = self.env['wms.operation']
+        for index, (middleware, keys, sequence) in enumerate(chunks, 1):
+            for step, move in enumerate(sequence, 1):
+                move['step'] = step
+            first = self.browse(sequence[0]['box_odoo_id'])
             operation_data = {
-                "operation_id": f"CLEANUP-{fields.Datetime.now().strftime('%Y%m%d-%H%M%S')}",
+                "operation_id": self.env['wms.operation']._new_operation_id('CLEANUP', first.id, index),
                 "operation_type": "clean_up",
                 "timestamp": fields.Datetime.now().isoformat(),
                 "priority": "low",
                 "target_box": {
-                    "id": boxes_to_return[0]["box_id"],
-                    "current_pos": boxes_to_return[0]["current_pos"],
-                    "target_pos": boxes_to_return[0]["target_pos"]
+                    "id": first.location_identification,
+                    "current_pos": sequence[0]["from"],
+                    "target_pos": sequence[0]["to"],
                 },
-                "sequence": sequence
+                "sequence": sequence,
             }
+            operations |= middleware.queue_operation(operation_data, box=first, columns=keys)
 
-            response = middleware.send_operation(operation_data)
-
-            _logger.info(f"Clean-up operation sent: {operation_data['operation_id']} - {len(boxes_to_return)} cajas")
-
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _('Clean-up Started'),
-                    'message': _('Clean-up operation sent.\n%d boxes will be returned to their locations.') % len(boxes_to_return),
-                    'type': 'success',
-                    'sticky': False,
-                }
-            }
+        if operations:
+            _logger.info(
+                f"Clean-up planificado: {len(operations)} operaciones, "
+                f"{sum(len(sequence) for _middleware, _keys, sequence in chunks)} pasos"
+            )
+        return operations
 
-        except Exception as e:
-            _logger.error(f"Failed to send clean-up operation: {str(e)}")
-            raise UserError(_('Failed to send clean-up operation:\n%s') % str(e))
+    @api.model
+    def _cron_clean_up(self):
+        """Clean-up automático de las zonas dummy que superan su límite (limit)"""
+        zones = self.env['wms.rack.occupancy'].search([('zone_type', '=', 'dummy'), ('over_limit', '=', True)])
+        if not zones:
+            return
+        try:
+            self._plan_clean_up(zones.rack_id.ids)
+        except UserError as e:
+            _logger.warning(f"Clean-up automático no planificado: {e}")
 
     @api.model
-    def api_picking(self, location_identification):
+    def api_picking(self, location_identification, priority='normal'):
         """
         API endpoint para picking (llamado desde middleware u otros sistemas)
 
         Args:
             location_identification: ID de la caja
+            priority: 'high', 'normal' o 'low'
 
         Returns:
             dict: resultado de la operación
@@ -482,10 +1046,143 @@ class ProductBox(models.Model):
             ret['error'] = f'Identificador erróneo: *{location_identification}*'
             return ret
 
-        return product_box.action_move()
+        return product_box.action_move(priority)
+
+    @api.model
+    def api_picking_batch(self, location_identifications, priority='normal'):
+        """
+        API endpoint para picking de varias cajas en una sola operación
+
+        Con ventana de planificación las cajas pasan al planificador, que las
+        agrupa por columna con el resto de peticiones (resultado "request_id"
+        en lugar de "step").
+
+        Las cajas de racks atendidos por middlewares distintos se reparten en
+        una operación por middleware ("operation_ids"); la ventana de
+        planificación es la de cada middleware. Cada middleware se procesa en
+        su propio savepoint: si falla, solo sus cajas llevan el error.
+
+        Args:
+            location_identifications: lista de IDs de caja
+            priority: 'high', 'normal' o 'low'
+
+        Returns:
+            dict: resultado global y resultado por caja
+        """
+        ret = {"error": "OK", "operation_id": False, "results": []}
+        location_identifications = list(dict.fromkeys(location_identifications or []))
+
+        boxes = self.search([("location_identification", "in", location_identifications)])
+        boxes_by_ident = {box.location_identification: box for box in boxes}
+
+        results = {}
+        to_pick = self.browse()
+        for ident in location_identifications:
+            box = boxes_by_ident.get(ident)
+            if not box:
+                results[ident] = {"box_id": ident, "error": f'Identificador erróneo: *{ident}*'}
+            elif box.state != 'inlocation':
+                results[ident] = {"box_id": ident, "error": 'La caja no está en su ubicación'}
+            else:
+                to_pick |= box
+
+        # Una operación por middleware (pasillo) con las cajas de sus racks
+        Config = self.env['middleware.config']
+        by_config = {}
+        for box in to_pick:
+            config = Config.get_active_config(box.parent_location.location_id.id)
+            by_config[config] = by_config.get(config, self.browse()) | box
+
+        ret['operation_ids'] = []
+        for config, config_boxes in by_config.items():
+            # Cada middleware en su savepoint: un fallo no deja a medias los demás
+            try:
+                with self.env.cr.savepoint():
+                    operation_id, config_results = config_boxes._picking_batch_for_config(config, priority)
+            except OperationalError:
+                raise
+            except Exception as e:
+                _logger.error(f"Failed to send batch picking operation ({config.name}): {str(e)}")
+                ret['error'] = str(e)
+                for box in config_boxes:
+                    results[box.location_identification] = {
+                        "box_id": box.location_identification,
+                        "error": str(e),
+                    }
+                continue
+            results.update(config_results)
+            if operation_id:
+                ret['operation_ids'].append(operation_id)
+        ret['operation_id'] = ret['operation_ids'][0] if ret['operation_ids'] else False
+
+        ret['results'] = [results[ident] for ident in location_identifications]
+        return ret
+
+    def _picking_batch_for_config(self, config, priority):
+        """
+        Picking de las cajas de un middleware: al planificador si tiene
+        ventana de planificación, si no una operación con todas ellas
+
+        Args:
+            config: middleware.config de las cajas
+            priority: 'high', 'normal' o 'low'
+
+        Returns:
+            tuple: (id de la operación o False, resultado por identificador de caja)
+        """
+        if config.schedule_window > 0:
+            requests = self.env['wms.request']._wms_submit(self, 'picking', priority)
+            return False, {
+                request.box_id.location_identification: {
+                    "box_id": request.box_id.location_identification,
+                    "error": "OK",
+                    "request_id": request.id,
+                }
+                for request in requests
+            }
+
+        operation_data = self._prepare_batch_picking_data(priority)
+        config.queue_operation(operation_data, box=self[:1])
+        _logger.info(f"Batch picking operation queued: {operation_data['operation_id']} - {len(self)} cajas")
+
+        deliver_steps = {
+            step['box_id']: step['step']
+            for step in operation_data['sequence'] if step['action'] == 'deliver'
+        }
+        return operation_data['operation_id'], {
+            box.location_identification: {
+                "box_id": box.location_identification,
+                "error": "OK",
+                "operation_id": operation_data['operation_id'],
+                "step": deliver_steps.get(box.location_identification),
+            }
+            for box in self
+        }
+
+    def _prepare_batch_picking_data(self, priority='normal'):
+        """
+        Preparar una única operación de picking para varias cajas
+        """
+        target_boxes = [{
+            "id": box.location_identification,
+            "odoo_id": box.id,
+            "current_pos": {"x": box.pos_x, "y": box.pos_y, "z": box.pos_z},
+            "target_pos": {"x": 0, "y": 0, "z": 0},
+        } for box in self]
+
+        return {
+            "operation_id": self.env['wms.operation']._new_operation_id('PICKING_BATCH', self[:1].id),
+            "operation_type": "picking",
+            "timestamp": fields.Datetime.now().isoformat(),
+            "priority": priority,
+            # target_box se mantiene por compatibilidad con el middleware
+            "target_box": target_boxes[0],
+            "target_boxes": target_boxes,
+            "sequence": self._build_picking_sequence(),
+        }
 
     @api.model
-    def api_putin(self, location_identification):
+    def api_putin(self, location_identification, priority='normal'):
         """API endpoint para put-in"""
         ret = {"error": "OK"}
         product_box = self.search([("location_identification", "=", location_identification)])
@@ -494,7 +1191,7 @@ class ProductBox(models.Model):
             ret['error'] = 'Identificador erróneo'
             return ret
 
-        return product_box.action_put_in_target()
+        return product_box.action_put_in_target(priority)
 
     @api.model
     def api_clean_up(self, location_identification):
@@ -508,10 +1205,212 @@ class ProductBox(models.Model):
 
         return product_box.action_clean_up()
 
+    @api.model
+    def _apply_operation_callbacks(self, steps):
+        """
+        Aplicar los pasos completados que notifica el middleware
+
+        Resuelve todas las cajas con una sola búsqueda y las coordenadas con la
+        rejilla de ocupación; cada caja se escribe una vez con su estado final
+        (agrupando cajas con los mismos valores) y el historial se inserta en bloque.
+        Los pasos ya registrados como completados (reintentos del middleware) se
+        confirman sin volver a aplicarse.
+
+        Args:
+            steps: lista de dicts con operation_id, operation_type, box_id,
+                   status y new_location {x, y, z}
+
+        Returns:
+            list: resultado de cada paso, en el mismo orden
+        """
+        Location = self.env['stock.location']
+        Step = self.env['wms.operation.step']
+        ledger_steps = Step._match_callbacks(steps)
+        identifiers = list({step.get('box_id') for step in steps if step.get('box_id')})
+        boxes = {box.location_identification: box for box in self.search([
+            ('location_identification', 'in', identifiers)
+        ])}
+
+        positions = {}      # box.id -> posición actual tras los pasos ya aplicados
+        pending = {}        # box.id -> valores a escribir
+        history = []
+        taken_dummy = set()
+        outcomes = []
+        completed_steps = Step.browse()
+        failed_steps = Step.browse()
+        unregistered = []
+        unregistered_keys = set()
+
+        for step, ledger_step in zip(steps, ledger_steps):
+            operation_id = step.get('operation_id')
+            operation_type = step.get('operation_type')
+            box_ident = step.get('box_id')
+            status = step.get('status')
+            new_location = step.get('new_location') or {}
+
+            # Validar datos requeridos
+            if not all([operation_id, operation_type, box_ident, status]):
+                outcomes.append({'success': False, 'error': 'Faltan campos requeridos'})
+                continue
+
+            box = boxes.get(box_ident)
+            if not box:
+                _logger.error(f"❌ Caja no encontrada: {box_ident}")
+                outcomes.append({'success': False, 'error': f'Caja no encontrada: {box_ident}'})
+                continue
+
+            if status != 'completed':
+                _logger.error(f"❌ Operación falló: {operation_id}")
+                failed_steps |= ledger_step
+                outcomes.append({'success': False, 'error': f'Operación en estado: {status}'})
+                continue
+
+            callback_key = (
+                operation_id, step.get('step') or box_ident,
+                CALLBACK_ACTIONS.get(operation_type, operation_type),
+            )
+            if (ledger_step and (ledger_step.state == 'done' or ledger_step in completed_steps)) \
+                    or (not ledger_step and callback_key in unregistered_keys):
+                # Callback repetido: confirmar sin volver a mover la caja
+                _logger.info(f"🔁 Callback duplicado ignorado: {operation_id} paso {ledger_step.step} ({box_ident})")
+                outcomes.append({
+                    'success': True,
+                    'duplicate': True,
+                    'message': f'Paso ya aplicado para la caja {box_ident}',
+                })
+                continue
+
+            position = positions.setdefault(box.id, {
+                'parent_location': box.parent_location.id,
+                'pos_x': box.pos_x,
+                'pos_y': box.pos_y,
+                'pos_z': box.pos_z,
+                'state': box.state,
+            })
+            # Guardar ubicación original para historial
+            source_location_id = position['parent_location']
+            x, y, z = new_location.get('x'), new_location.get('y'), new_location.get('z')
+            vals = {}
+
+            if operation_type in ['put_in', 'place']:
+                # === PUT IN: Mover caja al rack ===
+                target_location = Location._wms_find_slot(x, y, z, is_rack=True)
+                if target_location:
+                    vals = {'parent_location': target_location.id, 'rack_location': target_location.id}
+                    _logger.info(f"✅ PUT_IN: Caja {box_ident} → {target_location.name} ({x},{y},{z})")
+                else:
+                    _logger.warning(f"⚠️ Ubicación no encontrada para ({x},{y},{z}), actualizando solo coordenadas")
+                vals.update({'pos_x': x, 'pos_y': y, 'pos_z': z, 'state': 'inlocation'})
+
+            elif operation_type in ['picking', 'deliver']:
+                # === PICKING: Mover caja a Puerta y RESETEAR coordenadas a (0,0,0) ===
+                door = Location._wms_door_location(Location.browse(position['parent_location']).warehouse_id.id)
+                if door:
+                    vals = {'parent_location': door.id, 'pos_x': 0, 'pos_y': 0, 'pos_z': 0, 'state': 'outlocation'}
+                    _logger.info(f"✅ PICKING: Caja {box_ident} → Puerta (0,0,0)")
+                else:
+                    _logger.error("❌ Ubicación de puerta (is_door) no encontrada")
+
+            elif operation_type == 'move_to_dummy':
+                # === MOVE TO DUMMY: Mover caja bloqueante a área temporal ===
+                dummy_location = Location._wms_dummy_slot_for_box(box.id, x, y, z)
+                if not dummy_location:
+                    # Si no encuentra la posición exacta, usar primera dummy libre
+                    dummy_location = Location._wms_first_dummy_slot(exclude=taken_dummy)
+                    x, y, z = dummy_location.pos_x, dummy_location.pos_y, dummy_location.pos_z
+                if dummy_location:
+                    taken_dummy.add(dummy_location.id)
+                    vals = {'parent_location': dummy_location.id, 'pos_x': x, 'pos_y': y, 'pos_z': z,
+                            'state': 'outlocation'}
+                    _logger.info(f"✅ DUMMY: Caja {box_ident} → {dummy_location.name} ({x},{y},{z})")
+                else:
+                    _logger.error("❌ No se encontró ubicación Dummy disponible")
+
+            position.update({key: value for key, value in vals.items() if key in position})
+            pending.setdefault(box.id, {}).update(vals)
+            history.append({
+                'box_id': box.id,
+                'source_location_id': source_location_id or False,
+                'destination_location_id': position['parent_location'] or False,
+            })
+            outcomes.append((box_ident, dict(position)))
+            if ledger_step:
+                completed_steps |= ledger_step
+            else:
+                unregistered.append((step, box))
+                unregistered_keys.add(callback_key)
+
+        # Escribir el estado final de cada caja, agrupando valores idénticos
+        groups = {}
+        for box_id, vals in pending.items():
+            groups.setdefault(tuple(sorted(vals.items())), []).append(box_id)
+        for vals, box_ids in groups.items():
+            self.browse(box_ids).write(dict(vals))
+
+        # Registrar movimientos en historial
+        if history:
+            try:
+                with self.env.cr.savepoint():
+                    self.env['product.box.line'].create(history)
+                _logger.info(f"📝 Historial registrado: {len(history)} movimientos")
+            except Exception as hist_error:
+                _logger.warning(f"⚠️ No se pudo registrar historial: {hist_error}")
+
+        # Registrar los pasos en el ledger de operaciones
+        now = fields.Datetime.now()
+        if completed_steps:
+            completed_steps.write({'state': 'done', 'completed_date': now})
+        if failed_steps:
+            failed_steps.write({'state': 'failed', 'completed_date': now})
+            failed_steps.operation_id.write({'state': 'failed', 'last_error': 'Paso fallido en el middleware'})
+        if unregistered:
+            # Callbacks de operaciones sin registro: se guardan para detectar sus reintentos
+            operations = self.env['wms.operation'].search([
+                ('operation_id', 'in', list({step['operation_id'] for step, _box in unregistered}))
+            ])
+            operation_by_ref = {operation.operation_id: operation.id for operation in operations}
+            completed_steps |= Step.create([{
+                'operation_id': operation_by_ref.get(step['operation_id'], False),
+                'operation_ref': step['operation_id'],
+                'step': step.get('step') or False,
+                'action': CALLBACK_ACTIONS.get(step['operation_type'], step['operation_type']),
+                'box_ident': step['box_id'],
+                'box_id': box.id,
+                'state': 'done',
+                'completed_date': now,
+            } for step, box in unregistered])
+        completed_steps.operation_id._check_completion()
+
+        locations = Location.browse({
+            outcome[1]['parent_location'] for outcome in outcomes
+            if isinstance(outcome, tuple) and outcome[1]['parent_location']
+        })
+        names = {location.id: location.name for location in locations}
+
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, dict):
+                results.append(outcome)
+                continue
+            box_ident, position = outcome
+            results.append({
+                'success': True,
+                'message': f'Caja {box_ident} actualizada correctamente',
+                'box_state': {
+                    'current_location': names.get(position['parent_location'], 'N/A'),
+                    'coordinates': f"({position['pos_x']},{position['pos_y']},{position['pos_z']})",
+                    'state': position['state']
+                }
+            })
+        return results
+
 
 class ProductBoxLine(models.Model):
     """
     Líneas de historial de movimientos de cajas
+
+    Se agregan por día en wms.box.move.daily y pasado el horizonte configurado
+    se mueven a wms.box.move.archive.
     """
     _name = 'product.box.line'
     _description = 'Product Box Movement Line'
@@ -521,3 +1420,7 @@ class ProductBoxLine(models.Model):
     source_location_id = fields.Many2one('stock.location', string='From Location')
     destination_location_id = fields.Many2one('stock.location', string='To Location')
     create_date = fields.Datetime(string='Movement Date', readonly=True)
+
+    # Historial de una caja (pestaña Movement History) en el orden de la vista
+    _box_date_idx = models.Index("(box_id, create_date DESC)")
+    _create_date_idx = models.Index("(create_date)")
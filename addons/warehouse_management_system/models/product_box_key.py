@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+import datetime
 
 class ProductBoxKey(models.Model):
     """
@@ -34,3 +37,50 @@ class ProductBoxKey(models.Model):
         # Crear los registros
         records = super(ProductBoxKey, self).create(vals_list)
         return records
+
+    def _reserve_identifiers(self, count):
+        """
+        Reservar de una vez un bloque de identificadores de caja para esta key
+
+        Equivale a llamar count veces a next_by_code('pbk.' + key), pero con una
+        sola consulta: nextval sobre la secuencia de PostgreSQL (implementación
+        estándar) o un único UPDATE de number_next (sin huecos).
+
+        Args:
+            count: número de identificadores
+
+        Returns:
+            list: identificadores (key + año + número de secuencia)
+        """
+        self.ensure_one()
+        if count <= 0:
+            return []
+
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', 'pbk.' + self.key),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            raise UserError(_('No sequence found for box key %s.') % self.key)
+
+        prefix = self.key + datetime.date.today().strftime('%Y')
+        if sequence.use_date_range:
+            return [prefix + sequence._next() for _i in range(count)]
+
+        cr = self.env.cr
+        if sequence.implementation == 'standard':
+            cr.execute(SQL(
+                "SELECT nextval(%s) FROM generate_series(1, %s)", f'ir_sequence_{sequence.id:03d}', count
+            ))
+            numbers = [row[0] for row in cr.fetchall()]
+        else:
+            cr.execute(SQL("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + number_increment * %s
+                 WHERE id = %s
+             RETURNING number_next - number_increment * %s, number_increment
+            """, count, sequence.id, count))
+            start, step = cr.fetchone()
+            numbers = range(start, start + step * count, step)
+            sequence.invalidate_recordset(['number_next'])
+        return [prefix + sequence.get_next_char(number) for number in numbers]
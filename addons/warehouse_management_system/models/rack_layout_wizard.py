@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from .stock_location import DEFAULT_SLOT_NAME
+
+
+class RackLayoutWizard(models.TransientModel):
+    """
+    Wizard para generar la rejilla de ubicaciones de un rack
+    """
+    _name = "rack.layout.wizard"
+    _description = "Rack Layout Generator"
+
+    rack_id = fields.Many2one(
+        "stock.location",
+        string="Rack",
+        required=True,
+        domain=['|', ('is_rack', '=', True), ('is_dummy', '=', True), ('is_box', '=', False)]
+    )
+    slot_type = fields.Selection([
+        ("rack", "Rack Slots"),
+        ("dummy", "Dummy Slots"),
+    ], string="Slot Type", default="rack", required=True)
+    size_x = fields.Integer(string="Columns (X)", default=40, required=True)
+    size_y = fields.Integer(string="Depth (Y)", default=6, required=True)
+    size_z = fields.Integer(string="Levels (Z)", default=12, required=True)
+    start_x = fields.Integer(string="First X", default=1)
+    start_y = fields.Integer(string="First Y", default=1)
+    start_z = fields.Integer(string="First Z", default=1)
+    name_pattern = fields.Char(
+        string="Name Pattern",
+        default=DEFAULT_SLOT_NAME,
+        required=True,
+        help="Nombre de cada ubicación: {rack}, {x}, {y} y {z} se sustituyen por el rack y las coordenadas"
+    )
+    existing_count = fields.Integer(string="Existing Slots", compute="_compute_existing_count")
+
+    @api.depends('rack_id')
+    def _compute_existing_count(self):
+        Location = self.env["stock.location"]
+        for wizard in self:
+            wizard.existing_count = len(Location._wms_grid(wizard.rack_id.id)) if wizard.rack_id else 0
+
+    def action_generate(self):
+        """Crear las ubicaciones que faltan en el rack"""
+        self.ensure_one()
+        if self.rack_id.is_box:
+            raise UserError(_('Select the rack container, not one of its slots.'))
+
+        slots = self.rack_id._wms_generate_slots(
+            self.size_x, self.size_y, self.size_z,
+            name_pattern=self.name_pattern,
+            start=(self.start_x, self.start_y, self.start_z),
+            is_dummy=self.slot_type == 'dummy',
+        )
+        total = self.size_x * self.size_y * self.size_z
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Rack Layout Generated'),
+                'message': _('%d slots created in %s (%d already existed).') % (
+                    len(slots), self.rack_id.display_name, total - len(slots)),
+                'type': 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
@@ -1,6 +1,37 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL, ormcache
+import logging
+import threading
+
+from ..tools.dummy_allocation import DummyAllocator
+from ..tools.rack_grid import RackGrid
+
+_logger = logging.getLogger(__name__)
+
+# Rejillas de ocupación confirmadas, por base de datos: {dbname: {rack_id: RackGrid}}
+# Cada worker mantiene su copia; grid_version en base de datos la invalida entre workers
+_RACK_GRIDS = {}
+_RACK_GRIDS_LOCK = threading.RLock()
+
+# Versión de una rejilla con cambios confirmados aún sin publicar (se reconstruye sin cachear)
+DIRTY_GRID_VERSION = -1
+# Campos de stock.location que alteran la estructura de una rejilla
+GRID_SLOT_FIELDS = {'location_id', 'is_box', 'is_rack', 'is_dummy', 'active', 'pos_x', 'pos_y', 'pos_z'}
+# Campos que cambian qué ubicaciones son puerta o dummy de cada almacén
+SPECIAL_LOCATION_FIELDS = {'is_door', 'is_dummy', 'usage', 'company_id', 'active', 'location_id'}
+# Nombre por defecto de las ubicaciones generadas ({rack}, {x}, {y}, {z})
+DEFAULT_SLOT_NAME = '{rack}-{x:02d}-{y:02d}-{z:02d}'
+# Columnas que _wms_generate_slots calcula por ubicación en el INSERT
+GENERATED_SLOT_COLUMNS = (
+    'id', 'parent_path', 'name', 'complete_name', 'pos_x', 'pos_y', 'pos_z',
+    'create_uid', 'create_date', 'write_uid', 'write_date',
+)
+# Campos que se pueden pedir en las consultas por coordenadas (API de solo lectura)
+LOOKUP_SLOT_FIELDS = ('location_id', 'box_id', 'box', 'state', 'assigned_box_id', 'is_dummy')
+
 
 class StockLocation(models.Model):
     """
@@ -21,6 +52,11 @@ class StockLocation(models.Model):
         string="Is Dummy/Temporary Storage",
         help="Marca si esta ubicación es para almacenamiento temporal"
     )
+    is_door = fields.Boolean(
+        string="Is Door",
+        help="Puerta de entrega del almacén: destino de las cajas tras el picking "
+             "y ubicación inicial de las cajas nuevas"
+    )
     
     # Relación con caja
     box_id = fields.Many2one(
@@ -58,29 +94,639 @@ class StockLocation(models.Model):
         string="Max Number of Boxes",
         help="Número máximo de cajas que puede contener"
     )
-    
+
+    # Versión de la rejilla de ocupación (solo en contenedores de ubicaciones is_box)
+    grid_version = fields.Integer(
+        string="Occupancy Grid Version",
+        readonly=True,
+        copy=False,
+        default=0,
+        help="Se incrementa en cada cambio de ocupación; invalida la rejilla en memoria de los demás workers"
+    )
+
+    # Índices de las búsquedas por coordenadas del WMS (solo ubicaciones is_box)
+    _wms_slot_column_idx = models.Index("(location_id, pos_x, pos_z, pos_y) WHERE is_box")
+    _wms_slot_coords_idx = models.Index("(pos_x, pos_y, pos_z) WHERE is_box")
+    _wms_free_slot_idx = models.Index("(location_id, id) WHERE is_box AND box_id IS NULL")
+    _wms_assigned_box_idx = models.Index("(box_id) WHERE box_id IS NOT NULL")
+    _wms_grid_version_idx = models.Index("(id, grid_version) WHERE grid_version > 0")
+
+    def init(self):
+        """Marcar como contenedores de rejilla los padres de ubicaciones is_box existentes"""
+        self.env.cr.execute("""
+            UPDATE stock_location parent
+               SET grid_version = 1
+             WHERE COALESCE(parent.grid_version, 0) = 0
+               AND EXISTS (
+                   SELECT 1 FROM stock_location slot
+                    WHERE slot.location_id = parent.id AND slot.is_box
+               )
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        slots = records.filtered('is_box')
+        if slots:
+            slots._wms_grid_sync_slots(slots.location_id, new=True)
+        if records.filtered(lambda location: location.is_door or location.is_dummy):
+            self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        clear_special = SPECIAL_LOCATION_FIELDS.intersection(vals) and (
+            vals.get('is_door') or vals.get('is_dummy')
+            or self.filtered(lambda location: location.is_door or location.is_dummy)
+        )
+        if not GRID_SLOT_FIELDS.intersection(vals) and 'box_id' not in vals:
+            res = super().write(vals)
+        else:
+            previous_racks = self.filtered('is_box').location_id
+            res = super().write(vals)
+            self._wms_grid_sync_slots(previous_racks | self.filtered('is_box').location_id)
+        if clear_special:
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        slots = self.filtered('is_box')
+        racks = slots.location_id
+        slot_ids = slots.ids
+        clear_special = self.filtered(lambda location: location.is_door or location.is_dummy)
+        res = super().unlink()
+        if clear_special:
+            self.env.registry.clear_cache()
+        if racks:
+            def apply(grid):
+                for location_id in slot_ids:
+                    grid.remove_slot(location_id)
+            self._wms_grid_touch(racks.ids, apply)
+        return res
+
+    # ========== REJILLA DE OCUPACIÓN ==========
+
+    @api.model
+    def _wms_grid_versions(self):
+        """
+        Versiones de todas las rejillas vistas por la transacción actual
+        Una sola consulta por transacción; se descarta en commit/rollback
+
+        Un contenedor con filas de wms.grid.change confirmadas por otra
+        transacción (commit hecho, publicación pendiente) tiene la versión
+        DIRTY_GRID_VERSION: la instantánea ya ve sus cajas pero grid_version
+        aún no ha cambiado, así que su rejilla se reconstruye desde base de datos.
+        """
+        data = self.env.cr.postcommit.data
+        versions = data.get('wms.grid.versions')
+        if versions is None:
+            own_changes = [change_id for ids in data.get('wms.grid.changes', {}).values() for change_id in ids]
+            self.env.cr.execute(SQL("""
+                WITH dirty AS (
+                    SELECT DISTINCT rack_id FROM wms_grid_change WHERE NOT (id = ANY(%s::int4[]))
+                )
+                SELECT location.id, CASE WHEN dirty.rack_id IS NULL THEN location.grid_version ELSE %s END
+                  FROM stock_location location
+                  LEFT JOIN dirty ON dirty.rack_id = location.id
+                 WHERE location.grid_version > 0 OR dirty.rack_id IS NOT NULL
+            """, own_changes, DIRTY_GRID_VERSION))
+            versions = data['wms.grid.versions'] = dict(self.env.cr.fetchall())
+        return versions
+
+    @api.model
+    def _wms_grid(self, rack_id):
+        """
+        Obtener la rejilla de ocupación de un rack (o zona dummy)
+
+        Args:
+            rack_id: id del contenedor de las ubicaciones is_box
+
+        Returns:
+            RackGrid: rejilla (vacía si el contenedor no tiene ubicaciones)
+        """
+        if not rack_id:
+            return RackGrid(False)
+
+        local = self.env.cr.postcommit.data.get('wms.grid.local', {})
+        if local.get(rack_id, (0, None))[1] is not None:
+            return local[rack_id][1]
+
+        version = self._wms_grid_versions().get(rack_id)
+        if rack_id in local:
+            version = local[rack_id][0]
+        elif not version:
+            return RackGrid(rack_id)
+
+        cache = _RACK_GRIDS.setdefault(self.env.cr.dbname, {})
+        grid = cache.get(rack_id)
+        if rack_id not in local and grid is not None and grid.version == version:
+            return grid
+
+        grid = self._wms_grid_build(rack_id, version)
+        if rack_id in local:
+            # Contenedor modificado en esta transacción: la rejilla no se comparte hasta el commit
+            local[rack_id] = (version, grid)
+        elif version != DIRTY_GRID_VERSION:
+            # Con cambios de otra transacción sin publicar, la rejilla solo vale para esta instantánea
+            with _RACK_GRIDS_LOCK:
+                current = cache.get(rack_id)
+                if current is None or current.version < version:
+                    cache[rack_id] = grid
+        return grid
+
+    @api.model
+    def _wms_grids(self):
+        """Todas las rejillas de ocupación, ordenadas por contenedor"""
+        rack_ids = set(self._wms_grid_versions())
+        rack_ids.update(self.env.cr.postcommit.data.get('wms.grid.local', {}))
+        return [self._wms_grid(rack_id) for rack_id in sorted(rack_ids)]
+
+    @api.model
+    def _wms_grid_build(self, rack_id, version):
+        """Construir la rejilla de un contenedor desde base de datos"""
+        self.flush_model(['location_id', 'is_box', 'is_rack', 'is_dummy', 'active',
+                          'pos_x', 'pos_y', 'pos_z', 'box_id'])
+        self.env['product.box'].flush_model(['parent_location', 'state'])
+        self.env.cr.execute(SQL("""
+            SELECT slot.id, slot.pos_x, slot.pos_y, slot.pos_z,
+                   slot.is_rack, slot.is_dummy, slot.box_id,
+                   box.id, box.state
+              FROM stock_location slot
+              LEFT JOIN product_box box ON box.parent_location = slot.id
+             WHERE slot.location_id = %s AND slot.is_box AND slot.active
+        """, rack_id))
+
+        grid = RackGrid(rack_id, version)
+        for location_id, x, y, z, is_rack, is_dummy, assigned, box_id, state in self.env.cr.fetchall():
+            if location_id not in grid:
+                grid.add_slot(location_id, x, y, z, is_rack, is_dummy, assigned)
+            if box_id:
+                grid.place_box(box_id, location_id, state)
+        _logger.debug(f"Rejilla del rack {rack_id} construida: {len(grid)} ubicaciones (v{version})")
+        return grid
+
+    @api.model
+    def _wms_grid_touch(self, rack_ids, apply=None):
+        """
+        Registrar un cambio de ocupación en uno o varios contenedores
+
+        Aplica el cambio sobre una copia local a la transacción y lo anota en
+        wms.grid.change (solo inserciones: no bloquea la fila del rack). Tras
+        el commit, _wms_grid_publish incrementa grid_version en una
+        transacción aparte, lo que invalida las copias de otros workers.
+
+        Args:
+            rack_ids: ids de los contenedores afectados
+            apply: función(grid) que aplica el cambio; si devuelve False la
+                   rejilla se reconstruye desde base de datos
+        """
+        rack_ids = tuple(sorted({rack_id for rack_id in rack_ids if rack_id}))
+        if not rack_ids:
+            return
+
+        cr = self.env.cr
+        versions = self._wms_grid_versions()
+        cr.execute(SQL("""
+            INSERT INTO wms_grid_change (rack_id, changed_at)
+            SELECT rack_id, (now() at time zone 'UTC') FROM unnest(%s::int4[]) AS rack_id
+         RETURNING id, rack_id
+        """, list(rack_ids)))
+        changes = cr.postcommit.data.setdefault('wms.grid.changes', {})
+        for change_id, rack_id in cr.fetchall():
+            changes.setdefault(rack_id, []).append(change_id)
+
+        local = cr.postcommit.data.get('wms.grid.local')
+        if local is None:
+            local = cr.postcommit.data['wms.grid.local'] = {}
+            cr.postcommit.add(
+                lambda registry=self.env.registry: self._wms_grid_publish(registry, local, changes)
+            )
+        if not cr.precommit.data.get('wms.grid.verify'):
+            cr.precommit.data['wms.grid.verify'] = True
+            cr.precommit.add(self._wms_grid_verify)
+        # Resumen de ocupación: los contenedores se anotan en su cola una vez por transacción, antes del commit
+        if 'wms.occupancy.racks' not in cr.precommit.data:
+            cr.precommit.data['wms.occupancy.racks'] = set()
+            cr.precommit.add(self.env['wms.rack.occupancy'].sudo()._wms_refresh_touched)
+        cr.precommit.data['wms.occupancy.racks'].update(rack_ids)
+
+        # Rejillas confirmadas de partida: el resumen compara con ellas las zonas dummy
+        bases = cr.precommit.data.setdefault('wms.occupancy.bases', {})
+
+        cache = _RACK_GRIDS.get(cr.dbname, {})
+        for rack_id in rack_ids:
+            if rack_id in local:
+                version, grid = local[rack_id]
+            else:
+                # La copia local parte de la versión vista por la transacción
+                version = versions.get(rack_id, 0)
+                base = cache.get(rack_id)
+                if base is not None and base.version != version:
+                    base = None
+                bases.setdefault(rack_id, base if version else RackGrid(rack_id))
+                grid = base.copy() if base is not None else None
+            if grid is not None and apply is not None and apply(grid) is False:
+                grid = None
+            local[rack_id] = (version, grid)
+
+    @api.model
+    def _wms_grid_verify(self):
+        """Descartar copias locales con cambios perdidos en un rollback a savepoint"""
+        changes = self.env.cr.postcommit.data.get('wms.grid.changes')
+        local = self.env.cr.postcommit.data.get('wms.grid.local')
+        if not changes or not local:
+            return
+        self.env.cr.execute(SQL(
+            "SELECT id FROM wms_grid_change WHERE id IN %s",
+            tuple(change_id for ids in changes.values() for change_id in ids),
+        ))
+        kept = {row[0] for row in self.env.cr.fetchall()}
+        for rack_id, ids in changes.items():
+            if rack_id in local and not kept.issuperset(ids):
+                local[rack_id] = (local[rack_id][0], None)
+            ids[:] = [change_id for change_id in ids if change_id in kept]
+
+    @staticmethod
+    def _wms_grid_publish(registry, local, changes):
+        """
+        Postcommit: incrementar grid_version y publicar las rejillas modificadas
+
+        Transacción corta en un cursor aparte, así el bloqueo de la fila del
+        rack dura un UPDATE. La copia local solo se publica si nadie más ha
+        incrementado la versión desde la que partió; si no, se descarta y el
+        siguiente lector la reconstruye. Los cambios huérfanos (anotados por
+        una transacción que cayó antes de publicarlos) se publican aquí.
+        """
+        change_ids = [change_id for ids in changes.values() for change_id in ids]
+        with registry.cursor() as cr:
+            cr.execute(SQL("""
+                DELETE FROM wms_grid_change
+                 WHERE id = ANY(%s::int4[])
+                    OR changed_at < (now() at time zone 'UTC') - interval '1 minute'
+             RETURNING rack_id
+            """, change_ids))
+            rack_ids = {row[0] for row in cr.fetchall()} | set(local)
+            cr.execute(SQL("""
+                UPDATE stock_location
+                   SET grid_version = COALESCE(grid_version, 0) + 1
+                 WHERE id IN %s
+             RETURNING id, grid_version
+            """, tuple(sorted(rack_ids))))
+            bumped = dict(cr.fetchall())
+
+        with _RACK_GRIDS_LOCK:
+            cache = _RACK_GRIDS.setdefault(registry.db_name, {})
+            for rack_id, version in bumped.items():
+                base, grid = local.get(rack_id, (None, None))
+                current = cache.get(rack_id)
+                if current is not None and current.version >= version:
+                    continue
+                if grid is not None and base == version - 1:
+                    grid.version = version
+                    cache[rack_id] = grid
+                else:
+                    cache.pop(rack_id, None)
+
+    def _wms_grid_sync_slots(self, racks, new=False):
+        """
+        Reflejar en las rejillas de racks los cambios de estas ubicaciones
+
+        Args:
+            new: ubicaciones recién creadas (no pueden contener cajas)
+        """
+        slots = {
+            location.id: (
+                location.location_id.id, location.is_box and location.active,
+                location.pos_x, location.pos_y, location.pos_z,
+                location.is_rack, location.is_dummy, location.box_id.id,
+            )
+            for location in self
+        }
+
+        def apply(grid):
+            for location_id, (rack_id, is_slot, x, y, z, is_rack, is_dummy, box_id) in slots.items():
+                if not is_slot or rack_id != grid.rack_id:
+                    grid.remove_slot(location_id)
+                elif new or location_id in grid or not self.env['product.box'].search_count(
+                        [('parent_location', '=', location_id)], limit=1):
+                    grid.add_slot(location_id, x, y, z, is_rack, is_dummy)
+                    grid.set_assigned(location_id, box_id)
+                else:
+                    # Ubicación con cajas que llega de otro contenedor: reconstruir
+                    return False
+            return True
+
+        self._wms_grid_touch(racks.ids, apply)
+
+    def _wms_generate_slots(self, size_x, size_y, size_z, name_pattern=DEFAULT_SLOT_NAME,
+                            start=(1, 1, 1), is_dummy=False, batch_size=1000):
+        """
+        Generar la rejilla de ubicaciones is_box de este rack (o zona dummy)
+
+        Inserta por lotes, con INSERT ... SELECT, las ubicaciones X × Y × Z que
+        aún no existen: id, parent_path y complete_name se calculan en la propia
+        consulta a partir del rack y los valores por defecto se resuelven una
+        sola vez. Los demás campos calculados almacenados quedan pendientes en
+        el ORM. Las coordenadas ya ocupadas por una ubicación del rack se
+        omiten, así que sirve también para ampliarlo.
+
+        Args:
+            size_x, size_y, size_z: dimensiones de la rejilla
+            name_pattern: nombre de cada ubicación ({rack}, {x}, {y}, {z})
+            start: coordenadas (x, y, z) de la primera ubicación
+            is_dummy: generar ubicaciones de la zona dummy en lugar de rack
+            batch_size: ubicaciones por INSERT
+
+        Returns:
+            stock.location: ubicaciones creadas
+        """
+        self.ensure_one()
+        if min(size_x, size_y, size_z) <= 0:
+            raise UserError(_('Rack dimensions must be positive.'))
+        try:
+            name_pattern.format(rack=self.name, x=0, y=0, z=0)
+        except (KeyError, IndexError, ValueError) as e:
+            raise UserError(_('Invalid slot name pattern %s:\n%s') % (name_pattern, e))
+        self.check_access('create')
+
+        grid = self._wms_grid(self.id)
+        start_x, start_y, start_z = start
+        rows = []
+        for x in range(start_x, start_x + size_x):
+            for z in range(start_z, start_z + size_z):
+                for y in range(start_y, start_y + size_y):
+                    if grid.slot_at(x, y, z):
+                        continue
+                    name = name_pattern.format(rack=self.name, x=x, y=y, z=z)
+                    rows.append((name, f"{self.complete_name}/{name}", x, y, z))
+
+        # Valores comunes a todas las ubicaciones, con los valores por defecto del modelo
+        template = self._add_missing_default_values({
+            'location_id': self.id,
+            'usage': 'internal',
+            'company_id': self.company_id.id,
+            'warehouse_id': self.warehouse_id.id,
+            'is_box': True,
+            'is_rack': not is_dummy,
+            'is_dummy': is_dummy,
+        })
+        common = {
+            name: self._fields[name].convert_to_column_insert(value, self)
+            for name, value in template.items()
+            if name in self._fields and self._fields[name].store and self._fields[name].column_type
+            and name not in GENERATED_SLOT_COLUMNS
+        }
+        self.flush_recordset(['parent_path', 'complete_name'])
+
+        new_ids = []
+        for index in range(0, len(rows), batch_size):
+            self.env.cr.execute(SQL("""
+                INSERT INTO stock_location (id, parent_path, name, complete_name, pos_x, pos_y, pos_z, %s,
+                                            create_uid, create_date, write_uid, write_date)
+                SELECT v.id, %s || v.id || '/', v.name, v.complete_name, v.x, v.y, v.z, %s,
+                       %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+                  FROM (SELECT nextval('stock_location_id_seq') AS id, r.*
+                          FROM (VALUES %s) AS r(name, complete_name, x, y, z)) v
+             RETURNING id
+            """,
+                SQL(", ").join(SQL.identifier(name) for name in common),
+                self.parent_path,
+                SQL(", ").join(common.values()),
+                self.env.uid, self.env.uid,
+                SQL(", ").join(
+                    SQL("(%s, %s, %s::int4, %s::int4, %s::int4)", *row) for row in rows[index:index + batch_size]
+                ),
+            ))
+            new_ids.extend(row[0] for row in self.env.cr.fetchall())
+        self.invalidate_recordset(['child_ids'])
+
+        slots = self.browse(sorted(new_ids))
+        if slots:
+            # Campos calculados almacenados que no se han escrito en el INSERT
+            written = set(common).union(GENERATED_SLOT_COLUMNS)
+            for field in self._fields.values():
+                if field.store and field.compute and field.name not in written:
+                    self.env.add_to_compute(field, slots)
+            slots._wms_grid_sync_slots(self, new=True)
+            if is_dummy:
+                self.env.registry.clear_cache()
+        _logger.info(
+            f"Rack {self.name}: {len(slots)} ubicaciones generadas "
+            f"({size_x * size_y * size_z - len(slots)} ya existían)"
+        )
+        return slots
+
+    @api.model
+    def _wms_find_slot(self, pos_x, pos_y, pos_z, is_rack=None, is_dummy=None):
+        """
+        Buscar una ubicación is_box por coordenadas en todas las rejillas
+
+        Args:
+            is_rack / is_dummy: filtrar por tipo de ubicación (None = cualquiera)
+        """
+        for grid in self._wms_grids():
+            location_id = grid.slot_at(pos_x, pos_y, pos_z)
+            if not location_id:
+                continue
+            slot_is_rack, slot_is_dummy = grid.flags_of(location_id)
+            if is_rack is not None and slot_is_rack != is_rack:
+                continue
+            if is_dummy is not None and slot_is_dummy != is_dummy:
+                continue
+            return self.browse(location_id)
+        return self.browse()
+
+    @api.model
+    def _wms_lookup_slots(self, rack_id, coords, field_names):
+        """
+        Resolver coordenadas de un rack desde su rejilla (API de solo lectura)
+
+        Solo consulta la base de datos para los identificadores de caja (campo
+        'box'), en una única consulta.
+
+        Args:
+            rack_id: id del rack o zona dummy
+            coords: lista de (x, y, z)
+            field_names: campos a devolver (de LOOKUP_SLOT_FIELDS)
+
+        Returns:
+            list: por coordenada, valores en el orden de field_names (None si no hay ubicación)
+        """
+        unknown = set(field_names) - set(LOOKUP_SLOT_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos no disponibles: {sorted(unknown)}")
+        self.check_access('read')
+        self.env['product.box'].check_access('read')
+
+        grid = self._wms_grid(rack_id)
+        slots = [grid.slot_at(x, y, z) for x, y, z in coords]
+        present = {location_id: (grid.boxes_at(location_id) or (None,))[0] for location_id in slots if location_id}
+
+        identifiers = {}
+        box_ids = [box_id for box_id in present.values() if box_id]
+        if 'box' in field_names and box_ids:
+            self.env['product.box'].flush_model(['location_identification'])
+            self.env.cr.execute(SQL(
+                "SELECT id, location_identification FROM product_box WHERE id IN %s", tuple(box_ids),
+            ))
+            identifiers = dict(self.env.cr.fetchall())
+
+        rows = []
+        for location_id in slots:
+            if not location_id:
+                rows.append(None)
+                continue
+            box_id = present[location_id]
+            values = {
+                'location_id': location_id,
+                'box_id': box_id,
+                'box': identifiers.get(box_id),
+                'state': grid.box_location(box_id)[1] if box_id else None,
+                'assigned_box_id': grid.assigned_box(location_id) or None,
+                'is_dummy': grid.flags_of(location_id)[1],
+            }
+            rows.append([values[name] for name in field_names])
+        return rows
+
+    @api.model
+    def _wms_dummy_allocator(self):
+        """
+        Preparar el reparto de ubicaciones dummy libres (is_dummy + is_box)
+
+        La capacidad de cada zona es max_box_dummy menos las ubicaciones ya
+        ocupadas o reservadas; sin max_box_dummy la zona no tiene límite.
+
+        Returns:
+            DummyAllocator: o None si no hay ubicaciones dummy configuradas
+        """
+        dummy_grids = []
+        for grid in self._wms_grids():
+            dummy_slots = self._wms_grid_dummy_slots(grid)
+            if dummy_slots:
+                dummy_grids.append((grid, dummy_slots))
+        if not dummy_grids:
+            return None
+        zones = self.browse([grid.rack_id for grid, _dummy_slots in dummy_grids])
+
+        slots = []
+        capacity = {}
+        for (grid, dummy_slots), zone in zip(dummy_grids, zones):
+            free = set(grid.free_slots()).intersection(dummy_slots)
+            if zone.max_box_dummy > 0:
+                capacity[zone.id] = max(zone.max_box_dummy - (len(dummy_slots) - len(free)), 0)
+            slots.extend((loc, grid.coords_of(loc), zone.id) for loc in sorted(free))
+        return DummyAllocator(slots, capacity)
+
+    @api.model
+    def _wms_grid_dummy_slots(self, grid):
+        """Ubicaciones dummy de una rejilla"""
+        return [loc for x, z in grid.columns() for _y, loc in grid.column(x, z)
+                if grid.flags_of(loc)[1]]
+
+    @api.model
+    def _wms_reserve_dummy_slots(self, allocations):
+        """
+        Reservar ubicaciones dummy para cajas bloqueantes
+
+        La reserva (box_id) se escribe en la misma transacción que el plan, así
+        dos planes concurrentes no pueden quedarse con la misma ubicación.
+
+        Args:
+            allocations: {location_id: box_id}
+        """
+        for location_id, box_id in allocations.items():
+            self.browse(location_id).write({'box_id': box_id})
+
+    @api.model
+    def _wms_dummy_reservations(self, box_ids):
+        """{location_id: box_id} de ubicaciones dummy reservadas para estas cajas"""
+        box_ids = set(box_ids)
+        reservations = {}
+        for grid in self._wms_grids():
+            for location_id, box_id in grid.slots_assigned_to(box_ids).items():
+                if grid.flags_of(location_id)[1]:
+                    reservations[location_id] = box_id
+        return reservations
+
+    @api.model
+    def _wms_dummy_slot_for_box(self, box_id, pos_x, pos_y, pos_z):
+        """Ubicación dummy reservada para la caja en esas coordenadas, o cualquiera en ellas"""
+        coords = (pos_x or 0, pos_y or 0, pos_z or 0)
+        for location_id in self._wms_dummy_reservations([box_id]):
+            location = self.browse(location_id)
+            if (location.pos_x, location.pos_y, location.pos_z) == coords:
+                return location
+        return self._wms_find_slot(pos_x, pos_y, pos_z, is_dummy=True)
+
+    @api.model
+    def _wms_first_dummy_slot(self, exclude=()):
+        """
+        Primera ubicación dummy libre (o la primera dummy si todas están ocupadas)
+
+        Args:
+            exclude: ids de ubicaciones ya elegidas en el mismo lote
+        """
+        fallback = self.browse()
+        for grid in self._wms_grids():
+            for location_id in grid.free_slots():
+                if grid.flags_of(location_id)[1] and location_id not in exclude:
+                    return self.browse(location_id)
+            if not fallback:
+                for x, z in sorted(grid.columns()):
+                    dummy_slots = [loc for _y, loc in grid.column(x, z) if grid.flags_of(loc)[1]]
+                    if dummy_slots:
+                        fallback = self.browse(dummy_slots[0])
+                        break
+        return fallback
+
     @api.model
     def get_box_location(self, pos_x, pos_y, pos_z, rack_location_id):
         """
         Obtener la ubicación de una caja por sus coordenadas
         """
-        return self.search([
-            ('pos_x', '=', pos_x),
-            ('pos_y', '=', pos_y),
-            ('pos_z', '=', pos_z),
-            ('location_id', '=', rack_location_id),
-            ('is_box', '=', True)
-        ], limit=1)
+        return self.browse(self._wms_grid(rack_location_id).slot_at(pos_x, pos_y, pos_z))
     
     @api.model
-    def get_dummy_location(self):
+    @ormcache('company_id')
+    def _wms_special_location_ids(self, company_id):
+        """
+        Puertas y ubicaciones dummy por almacén de una compañía (en caché)
+
+        Returns:
+            dict: {'door': {warehouse_id: location_id}, 'dummy': {...}}
+                  la clave False contiene la primera de la compañía
+        """
+        result = {}
+        for key, domain in (
+            ('door', [('is_door', '=', True)]),
+            ('dummy', [('is_dummy', '=', True), ('usage', '=', 'internal')]),
+        ):
+            locations = self.sudo().search(domain + [('company_id', 'in', [company_id, False])])
+            by_warehouse = result[key] = {}
+            # Las ubicaciones de la compañía tienen preferencia sobre las compartidas
+            for location in sorted(locations, key=lambda location: not location.company_id):
+                by_warehouse.setdefault(location.warehouse_id.id, location.id)
+                by_warehouse.setdefault(False, location.id)
+        return result
+
+    @api.model
+    def _wms_special_location(self, key, warehouse_id=False):
+        """Ubicación especial ('door' o 'dummy') del almacén, o la primera de la compañía"""
+        by_warehouse = self._wms_special_location_ids(self.env.company.id)[key]
+        return self.browse(by_warehouse.get(warehouse_id) or by_warehouse.get(False))
+
+    @api.model
+    def _wms_door_location(self, warehouse_id=False):
+        """
+        Obtener la puerta de entrega (is_door) del almacén
+        """
+        return self._wms_special_location('door', warehouse_id)
+
+    @api.model
+    def get_dummy_location(self, warehouse_id=False):
         """
         Obtener la ubicación dummy activa
         """
-        return self.search([
-            ('is_dummy', '=', True),
-            ('usage', '=', 'internal')
-        ], limit=1)
+        return self._wms_special_location('dummy', warehouse_id)
     
     @api.model
     def get_next_available_location(self):
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+import csv
+import io
+import itertools
+import json
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Líneas de error que se guardan en el registro de una importación
+MAX_ERROR_LINES = 1000
+
+
+class WmsBoxImport(models.Model):
+    """
+    Importación masiva de cajas desde CSV o NDJSON
+
+    Columnas (cabecera CSV o claves JSON):
+        key: código de la key (product.box.key.key), obligatoria sin identificador
+        location_identification: identificador existente (opcional)
+        rack: nombre del rack de la ubicación asignada (opcional)
+        x, y, z: coordenadas de la ubicación asignada (opcional)
+        state: inlocation / outlocation (por defecto inlocation si hay ubicación)
+
+    El fichero se procesa por bloques: cada bloque reserva los números de
+    secuencia de una vez por key, valida con una consulta por conjunto e inserta
+    cajas y ubicaciones con un INSERT/UPDATE por tabla. Cada bloque se confirma
+    junto con el contador de filas procesadas, así una importación interrumpida
+    continúa donde se quedó.
+    """
+    _name = 'wms.box.import'
+    _description = 'WMS Box Import'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: _('Box Import'))
+    file = fields.Binary(string='File', required=True, attachment=True)
+    filename = fields.Char(string='Filename')
+    file_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ], string='Format', compute='_compute_file_format', store=True, readonly=False, required=True)
+    chunk_size = fields.Integer(string='Chunk Size', default=2000, required=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='draft', required=True, readonly=True)
+    processed_rows = fields.Integer(string='Processed Rows', readonly=True)
+    imported_count = fields.Integer(string='Imported', readonly=True)
+    skipped_count = fields.Integer(string='Skipped', readonly=True)
+    error_log = fields.Text(string='Errors', readonly=True)
+    date_done = fields.Datetime(string='Finished On', readonly=True)
+
+    @api.depends('filename')
+    def _compute_file_format(self):
+        for record in self:
+            name = (record.filename or '').lower()
+            record.file_format = 'ndjson' if name.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+    @api.constrains('chunk_size')
+    def _check_chunk_size(self):
+        for record in self:
+            if record.chunk_size <= 0:
+                raise ValidationError(_('Chunk size must be positive.'))
+
+    def action_start(self):
+        """Poner en marcha (o reanudar) la importación en segundo plano"""
+        if self.filtered(lambda job: job.state == 'done'):
+            raise UserError(_('This import is already done.'))
+        self.write({'state': 'running'})
+        self.env.ref('warehouse_management_system.ir_cron_wms_box_import').sudo()._trigger()
+        return True
+
+    def action_reset(self):
+        """Volver a borrador una importación fallida (continúa desde la última fila confirmada)"""
+        self.filtered(lambda job: job.state == 'failed').write({'state': 'draft'})
+        return True
+
+    @api.model
+    def _cron_run(self):
+        """Procesar las importaciones en curso (incluidas las interrumpidas)"""
+        for job in self.search([('state', '=', 'running')], order='id'):
+            job._run()
+
+    def _run(self):
+        """
+        Importar el fichero desde la primera fila no procesada
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        context = self._import_context()
+        rows = itertools.islice(enumerate(self._iter_rows(), 1), self.processed_rows, None)
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self._import_chunk(chunk, context)
+                if auto_commit:
+                    self.env.cr.commit()
+        except Exception as e:
+            if not auto_commit:
+                raise
+            self.env.cr.rollback()
+            _logger.exception(f"Importación de cajas {self.id} detenida en la fila {self.processed_rows}")
+            self.write({'state': 'failed', 'error_log': self._append_errors([f"{self.processed_rows + 1}: {e}"])})
+            self.env.cr.commit()
+            return
+
+        self.write({'state': 'done', 'date_done': fields.Datetime.now()})
+        _logger.info(
+            f"Importación de cajas {self.id} terminada: {self.imported_count} importadas, "
+            f"{self.skipped_count} omitidas"
+        )
+
+    def _open_file(self):
+        """
+        Abrir el fichero adjunto en modo binario
+
+        Con el filestore se lee del fichero en disco, sin cargarlo en memoria;
+        los adjuntos guardados en base de datos ya vienen completos con la fila.
+        """
+        self.ensure_one()
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw or b'')
+
+    def _iter_rows(self):
+        """Filas del fichero como diccionarios, leídas de forma incremental"""
+        self.ensure_one()
+        with self._open_file() as binary:
+            stream = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+            if self.file_format == 'csv':
+                yield from csv.DictReader(stream)
+                return
+            for line in stream:
+                line = line.strip()
+                yield json.loads(line) if line else {}
+
+    def _import_context(self):
+        """
+        Datos de referencia que se cargan una sola vez por importación
+
+        Returns:
+            dict: keys por código, ubicaciones is_box por (rack, x, y, z) y
+                  por (x, y, z) y la puerta por defecto
+        """
+        Location = self.env['stock.location']
+        Location.flush_model(['location_id', 'is_box', 'is_rack', 'active', 'name', 'pos_x', 'pos_y', 'pos_z'])
+        self.env.cr.execute(SQL("""
+            SELECT slot.id, slot.location_id, rack.name, slot.pos_x, slot.pos_y, slot.pos_z, slot.is_rack
+              FROM stock_location slot
+              JOIN stock_location rack ON rack.id = slot.location_id
+             WHERE slot.is_box AND slot.active
+             ORDER BY slot.id
+        """))
+        by_rack = {}
+        by_coords = {}
+        slots = {}
+        for location_id, rack_id, rack_name, x, y, z, is_rack in self.env.cr.fetchall():
+            by_rack.setdefault((rack_name, x, y, z), location_id)
+            if is_rack:
+                by_coords.setdefault((x, y, z), location_id)
+            slots[location_id] = (rack_id, x, y, z)
+
+        return {
+            'keys': {key.key: key for key in self.env['product.box.key'].search([])},
+            'by_rack': by_rack,
+            'by_coords': by_coords,
+            'slots': slots,
+            'door': Location._wms_door_location().id,
+        }
+
+    def _import_chunk(self, chunk, context):
+        """
+        Validar e insertar un bloque de filas
+
+        Args:
+            chunk: lista de (número de fila, diccionario)
+            context: datos de _import_context
+        """
+        cr = self.env.cr
+        errors = []
+
+        # Identificadores ya presentes: filas importadas antes o cajas existentes
+        idents = [(row.get('location_identification') or '').strip() for _row_no, row in chunk]
+        existing = set()
+        if any(idents):
+            cr.execute(SQL(
+                "SELECT location_identification FROM product_box WHERE location_identification IN %s",
+                tuple(ident for ident in idents if ident),
+            ))
+            existing = {row[0] for row in cr.fetchall()}
+
+        candidates = []
+        seen_idents = set()
+        for (row_no, row), ident in zip(chunk, idents):
+            if not any(row.values()) or (ident and (ident in existing or ident in seen_idents)):
+                continue
+            try:
+                candidates.append((row_no, ident, *self._resolve_row(row, ident, context)))
+            except ValueError as e:
+                errors.append(f"{row_no}: {e}")
+                continue
+            if ident:
+                seen_idents.add(ident)
+
+        # Ocupación de las ubicaciones del bloque: una consulta para todo el conjunto
+        slot_ids = tuple({slot_id for _r, _i, _k, slot_id, _s in candidates if slot_id})
+        taken = set()
+        if slot_ids:
+            self.env['product.box'].flush_model(['parent_location', 'rack_location', 'state'])
+            self.env['stock.location'].flush_model(['box_id'])
+            cr.execute(SQL("""
+                SELECT slot.id FROM stock_location slot
+                 WHERE slot.id IN %s
+                   AND (slot.box_id IS NOT NULL
+                        OR EXISTS (SELECT 1 FROM product_box box
+                                    WHERE box.rack_location = slot.id
+                                       OR (box.parent_location = slot.id AND box.state = 'inlocation')))
+            """, slot_ids))
+            taken = {row[0] for row in cr.fetchall()}
+
+        rows = []
+        needed = {}
+        for row_no, ident, key, slot_id, state in candidates:
+            if slot_id and slot_id in taken:
+                errors.append(f"{row_no}: " + _('location already assigned to another box'))
+                continue
+            parent_id = slot_id if slot_id and state == 'inlocation' else context['door']
+            if not parent_id:
+                errors.append(f"{row_no}: " + _('no door location configured'))
+                continue
+            if slot_id:
+                taken.add(slot_id)
+            if not ident:
+                needed[key] = needed.get(key, 0) + 1
+            rows.append([ident, key, slot_id, parent_id, state])
+
+        # Un bloque de números de secuencia por key
+        reserved = {key: iter(key._reserve_identifiers(count)) for key, count in needed.items()}
+        for row in rows:
+            if not row[0]:
+                row[0] = next(reserved[row[1]])
+
+        if rows:
+            self._insert_boxes(rows, context)
+
+        self.write({
+            'processed_rows': chunk[-1][0],
+            'imported_count': self.imported_count + len(rows),
+            'skipped_count': self.skipped_count + len(chunk) - len(rows),
+            'error_log': self._append_errors(errors),
+        })
+
+    def _resolve_row(self, row, ident, context):
+        """
+        Key, ubicación asignada y estado de una fila
+
+        Raises:
+            ValueError: si la fila no es válida
+        """
+        key = context['keys'].get((row.get('key') or '').strip())
+        if not key and not ident:
+            raise ValueError(_('unknown box key %r') % row.get('key'))
+
+        slot_id = False
+        coords = [row.get(axis) for axis in ('x', 'y', 'z')]
+        if any(value not in (None, '') for value in coords):
+            try:
+                x, y, z = (int(value) for value in coords)
+            except (TypeError, ValueError):
+                raise ValueError(_('invalid coordinates %s') % coords)
+            rack = (row.get('rack') or '').strip()
+            slot_id = (context['by_rack'] if rack else context['by_coords']).get(
+                (rack, x, y, z) if rack else (x, y, z))
+            if not slot_id:
+                raise ValueError(_('no location at X=%d, Y=%d, Z=%d') % (x, y, z))
+
+        state = (row.get('state') or '').strip() or ('inlocation' if slot_id else 'outlocation')
+        if state not in ('inlocation', 'outlocation'):
+            raise ValueError(_('invalid state %r') % state)
+        return key or self.env['product.box.key'], slot_id, state
+
+    def _insert_boxes(self, rows, context):
+        """
+        Insertar las cajas del bloque y asignarlas a sus ubicaciones
+
+        Args:
+            rows: [identificador, key, ubicación asignada, ubicación actual, estado]
+        """
+        cr = self.env.cr
+        slots = context['slots']
+        values = SQL(", ").join(
+            SQL("(%s, %s, %s, %s, %s, %s, %s, %s)",
+                ident, key.id or None, slot_id or None, parent_id,
+                *(slots[slot_id][1:] if slot_id else (None, None, None)), state)
+            for ident, key, slot_id, parent_id, state in rows
+        )
+        cr.execute(SQL("""
+            INSERT INTO product_box (location_identification, key, rack_location, parent_location,
+                                     pos_x, pos_y, pos_z, state, in_rack_slot,
+                                     create_uid, create_date, write_uid, write_date)
+            SELECT v.ident, v.key_id::int4, v.slot_id::int4, v.parent_id::int4,
+                   v.x::int4, v.y::int4, v.z::int4, v.state,
+                   COALESCE(parent.is_box AND parent.is_rack, FALSE),
+                   %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+              FROM (VALUES %s) AS v(ident, key_id, slot_id, parent_id, x, y, z, state)
+              LEFT JOIN stock_location parent ON parent.id = v.parent_id::int4
+         RETURNING id, rack_location, parent_location, state
+        """, self.env.uid, self.env.uid, values))
+        inserted = cr.fetchall()
+
+        assigned = [(box_id, slot_id) for box_id, slot_id, _parent_id, _state in inserted if slot_id]
+        if assigned:
+            cr.execute(SQL("""
+                UPDATE stock_location slot
+                   SET box_id = v.box_id, write_uid = %s, write_date = (now() at time zone 'UTC')
+                  FROM (VALUES %s) AS v(box_id, slot_id)
+                 WHERE slot.id = v.slot_id
+            """, self.env.uid, SQL(", ").join(SQL("(%s, %s)", box_id, slot_id) for box_id, slot_id in assigned)))
+            self.env['stock.location'].browse([slot_id for _box_id, slot_id in assigned]).invalidate_recordset(
+                ['box_id', 'write_uid', 'write_date'])
+
+        def apply(grid):
+            for box_id, slot_id, parent_id, state in inserted:
+                if slot_id:
+                    grid.set_assigned(slot_id, box_id)
+                grid.place_box(box_id, parent_id, state)
+
+        rack_ids = {slots[slot_id][0] for _box_id, slot_id in assigned}
+        rack_ids.update(slots[parent_id][0] for _b, _s, parent_id, _st in inserted if parent_id in slots)
+        self.env['stock.location']._wms_grid_touch(rack_ids, apply)
+
+    def _append_errors(self, errors):
+        """Añadir errores al registro, hasta MAX_ERROR_LINES líneas"""
+        lines = (self.error_log or '').splitlines()
+        room = MAX_ERROR_LINES - len(lines)
+        if not errors or room <= 0:
+            return self.error_log
+        return '\n'.join(lines + errors[:room])
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+import datetime
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Parámetro con el primer día cuyo agregado aún se recalcula (los anteriores son definitivos)
+ROLLUP_PARAM = 'wms.box_move_rollup_since'
+# Parámetro con los días que se recalculan en cada ejecución (hoy incluido): deben
+# cubrir la transacción más larga que pueda insertar historial
+ROLLUP_DAYS_PARAM = 'wms.box_move_rollup_days'
+ROLLUP_DAYS_DEFAULT = 3
+# Parámetro con los días de historial detallado que se conservan (0 = no archivar)
+ARCHIVE_DAYS_PARAM = 'wms.box_move_archive_days'
+ARCHIVE_DAYS_DEFAULT = 180
+# Líneas archivadas por transacción
+ARCHIVE_BATCH = 5000
+
+
+class WmsBoxMoveDaily(models.Model):
+    """
+    Movimientos agregados por día, caja y ubicación destino
+
+    Se alimenta de product.box.line recalculando por completo los últimos
+    días (una línea confirmada tarde entra en el siguiente recálculo) y es la
+    fuente de los informes y del slotting, así no dependen del tamaño del
+    historial detallado, que se archiva pasado el horizonte configurado.
+    """
+    _name = 'wms.box.move.daily'
+    _description = 'WMS Daily Box Movements'
+    _order = 'day desc, box_id'
+    _log_access = False
+
+    day = fields.Date(string='Day', required=True, readonly=True, index=True)
+    box_id = fields.Many2one('product.box', string='Box', required=True, readonly=True, ondelete='cascade')
+    location_id = fields.Many2one('stock.location', string='To Location', required=True, readonly=True,
+                                  ondelete='cascade')
+    move_count = fields.Integer(string='Movements', readonly=True, aggregator='sum')
+    pick_count = fields.Integer(string='Pickings', readonly=True, aggregator='sum',
+                                help='Movimientos a una puerta')
+
+    _day_box_location_uniq = models.Constraint(
+        'UNIQUE(day, box_id, location_id)',
+        'Solo puede haber un agregado por día, caja y ubicación.',
+    )
+    _box_day_idx = models.Index("(box_id, day)")
+
+    @api.model
+    def _cron_rollup(self):
+        """
+        Recalcular los agregados de los días no definitivos
+
+        Borra y vuelve a insertar los agregados desde el día guardado en
+        ROLLUP_PARAM (idempotente: no depende del orden en que se confirmen
+        las líneas). Después, los días anteriores a la ventana de
+        ROLLUP_DAYS_PARAM pasan a ser definitivos. Días en UTC.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        cr = self.env.cr
+        today = fields.Datetime.now().date()
+        days = max(int(ICP.get_param(ROLLUP_DAYS_PARAM, ROLLUP_DAYS_DEFAULT)), 1)
+        self.env['product.box.line'].flush_model()
+
+        since = fields.Date.to_date(ICP.get_param(ROLLUP_PARAM))
+        if not since:
+            # Primera ejecución: desde la primera línea, sin volver a días ya archivados
+            cr.execute(SQL("""
+                SELECT GREATEST((SELECT min(create_date)::date FROM product_box_line),
+                                (SELECT max(move_date)::date + 1 FROM wms_box_move_archive))
+            """))
+            since = cr.fetchone()[0] or today
+
+        cr.execute(SQL("DELETE FROM wms_box_move_daily WHERE day >= %s", since))
+        cr.execute(SQL("""
+            INSERT INTO wms_box_move_daily (day, box_id, location_id, move_count, pick_count)
+            SELECT line.create_date::date, line.box_id, line.destination_location_id,
+                   count(*), count(*) FILTER (WHERE location.is_door)
+              FROM product_box_line line
+              JOIN stock_location location ON location.id = line.destination_location_id
+             WHERE line.create_date >= %s
+             GROUP BY 1, 2, 3
+        """, since))
+        count = cr.rowcount
+        ICP.set_param(ROLLUP_PARAM, fields.Date.to_string(max(since, today - datetime.timedelta(days=days - 1))))
+        self.invalidate_model()
+        _logger.info(f"Historial de movimientos agregado desde {since}: {count} agregados")
+
+
+class WmsBoxMoveArchive(models.Model):
+    """
+    Historial detallado archivado (líneas de product.box.line pasado el horizonte)
+
+    Tabla compacta sin campos de auditoría; las líneas solo se archivan una
+    vez agregadas en wms.box.move.daily.
+    """
+    _name = 'wms.box.move.archive'
+    _description = 'WMS Archived Box Movements'
+    _order = 'move_date desc, id desc'
+    _log_access = False
+
+    box_id = fields.Many2one('product.box', string='Box', required=True, readonly=True, ondelete='cascade')
+    source_location_id = fields.Many2one('stock.location', string='From Location', readonly=True,
+                                         ondelete='set null')
+    destination_location_id = fields.Many2one('stock.location', string='To Location', readonly=True,
+                                              ondelete='set null')
+    move_date = fields.Datetime(string='Movement Date', readonly=True)
+
+    _box_date_idx = models.Index("(box_id, move_date)")
+
+    @api.model
+    def _cron_archive(self):
+        """
+        Mover al archivo las líneas de historial más antiguas que el horizonte
+        (parámetro ARCHIVE_DAYS_PARAM), por bloques de ARCHIVE_BATCH con un
+        commit por bloque
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        days = int(ICP.get_param(ARCHIVE_DAYS_PARAM, ARCHIVE_DAYS_DEFAULT))
+        if days <= 0:
+            return
+        # Solo días completos con el agregado ya definitivo: los informes no pierden movimientos
+        self.env['wms.box.move.daily']._cron_rollup()
+        since = fields.Date.to_date(ICP.get_param(ROLLUP_PARAM))
+        horizon = min(since, fields.Datetime.now().date() - datetime.timedelta(days=days))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+
+        cr = self.env.cr
+        self.env['product.box.line'].flush_model()
+        total = 0
+        while True:
+            cr.execute(SQL("""
+                WITH moved AS (
+                    DELETE FROM product_box_line
+                     WHERE id IN (
+                         SELECT id FROM product_box_line
+                          WHERE create_date < %s
+                          ORDER BY id
+                          LIMIT %s
+                     )
+                 RETURNING box_id, source_location_id, destination_location_id, create_date
+                )
+                INSERT INTO wms_box_move_archive (box_id, source_location_id, destination_location_id, move_date)
+                SELECT box_id, source_location_id, destination_location_id, create_date FROM moved
+            """, horizon, ARCHIVE_BATCH))
+            total += cr.rowcount
+            if auto_commit:
+                cr.commit()
+            if cr.rowcount < ARCHIVE_BATCH:
+                break
+
+        self.env['product.box.line'].invalidate_model()
+        if total:
+            _logger.info(f"Historial de movimientos archivado: {total} líneas anteriores a {horizon}")
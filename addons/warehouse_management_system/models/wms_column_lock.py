@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Estados de operación que mantienen bloqueadas sus columnas
+LOCKING_STATES = ('queued', 'sent')
+# Segundos entre comprobaciones al esperar una columna
+LOCK_POLL_INTERVAL = 0.5
+
+
+class WmsColumnLock(models.Model):
+    """
+    Bloqueo de una columna (rack, X, Z) por una operación del middleware
+
+    Planificar una secuencia lee las cajas de la columna, así que dos
+    operaciones sobre la misma columna no pueden planificarse a la vez. La
+    fila de la columna se bloquea (FOR UPDATE) mientras se planifica y queda
+    asignada a la operación hasta que termina o falla. Las operaciones sobre
+    columnas distintas no se esperan entre sí.
+
+    Si una transacción planifica con una foto anterior a la liberación de la
+    columna, PostgreSQL rechaza el bloqueo por serialización y Odoo reintenta
+    la petición con datos actualizados.
+    """
+    _name = 'wms.column.lock'
+    _description = 'WMS Column Lock'
+    _order = 'rack_id, pos_x, pos_z'
+
+    rack_id = fields.Many2one('stock.location', string='Rack', required=True, readonly=True, ondelete='cascade')
+    pos_x = fields.Integer(string='X', required=True, readonly=True)
+    pos_z = fields.Integer(string='Z', required=True, readonly=True)
+    operation_id = fields.Many2one(
+        'wms.operation',
+        string='Held By',
+        readonly=True,
+        index='btree_not_null',
+        ondelete='set null'
+    )
+    operation_state = fields.Selection(related='operation_id.state', string='Operation State')
+
+    _column_uniq = models.Constraint('UNIQUE(rack_id, pos_x, pos_z)', 'Solo puede haber un bloqueo por columna.')
+
+    @api.model
+    def _wms_acquire(self, columns, mode=None):
+        """
+        Bloquear columnas para planificar una operación
+
+        Las columnas quedan pendientes de asignar a la siguiente operación que
+        se encole en la transacción (ver _wms_bind).
+
+        Args:
+            columns: iterable de (rack_id, pos_x, pos_z)
+            mode: 'wait' (esperar hasta column_lock_timeout), 'fail' (error
+                  inmediato) o 'skip' (devolver solo las columnas libres);
+                  por defecto el de la configuración activa
+
+        Returns:
+            set: columnas bloqueadas
+        """
+        columns = sorted({column for column in columns if column[0]})
+        if not columns:
+            return set()
+        config = self.env['middleware.config'].get_active_config(columns[0][0])
+        mode = mode or config.column_lock_mode or 'wait'
+
+        held = self._wms_held(columns)
+        if held and mode == 'wait':
+            self._wms_wait(held, config.column_lock_timeout)
+            # Columnas liberadas tras la foto de esta transacción: el FOR UPDATE
+            # siguiente falla por serialización y Odoo reintenta la petición
+        elif held and mode == 'fail':
+            raise UserError(self._wms_busy_message(held))
+        elif held:
+            columns = [column for column in columns if column not in held]
+            if not columns:
+                return set()
+
+        cr = self.env.cr
+        cr.execute(SQL("""
+            INSERT INTO wms_column_lock (rack_id, pos_x, pos_z, create_uid, create_date, write_uid, write_date)
+            VALUES %s
+            ON CONFLICT (rack_id, pos_x, pos_z) DO NOTHING
+        """, SQL(", ").join(
+            SQL("(%s, %s, %s, %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC'))",
+                rack_id, pos_x, pos_z, self.env.uid, self.env.uid)
+            for rack_id, pos_x, pos_z in columns
+        )))
+        cr.execute(SQL("""
+            SELECT column_lock.id, column_lock.rack_id, column_lock.pos_x, column_lock.pos_z, operation.operation_id
+              FROM wms_column_lock column_lock
+              LEFT JOIN wms_operation operation
+                ON operation.id = column_lock.operation_id AND operation.state IN %s
+             WHERE (column_lock.rack_id, column_lock.pos_x, column_lock.pos_z) IN %s
+             ORDER BY column_lock.id
+               FOR UPDATE OF column_lock
+        """, LOCKING_STATES, tuple(columns)))
+        rows = cr.fetchall()
+
+        busy = {(rack_id, x, z): ref for _id, rack_id, x, z, ref in rows if ref}
+        if busy and mode != 'skip':
+            raise UserError(self._wms_busy_message(busy))
+
+        pending = cr.postcommit.data.setdefault('wms.column.locks', {})
+        acquired = set()
+        for lock_id, rack_id, x, z, ref in rows:
+            if not ref:
+                pending[(rack_id, x, z)] = lock_id
+                acquired.add((rack_id, x, z))
+        return acquired
+
+    @api.model
+    def _wms_held(self, columns):
+        """{columna: operation_id} de las columnas bloqueadas por operaciones en curso"""
+        self.env.cr.execute(SQL("""
+            SELECT column_lock.rack_id, column_lock.pos_x, column_lock.pos_z, operation.operation_id
+              FROM wms_column_lock column_lock
+              JOIN wms_operation operation ON operation.id = column_lock.operation_id
+             WHERE operation.state IN %s AND (column_lock.rack_id, column_lock.pos_x, column_lock.pos_z) IN %s
+        """, LOCKING_STATES, tuple(columns)))
+        return {(rack_id, x, z): ref for rack_id, x, z, ref in self.env.cr.fetchall()}
+
+    @api.model
+    def _wms_wait(self, held, timeout):
+        """
+        Esperar a que se liberen las columnas (consultando con un cursor propio,
+        que ve los commits de los callbacks)
+        """
+        deadline = time.monotonic() + max(timeout, 0)
+        remaining = held
+        with self.env.registry.cursor() as cr:
+            while remaining:
+                if time.monotonic() >= deadline:
+                    raise UserError(self._wms_busy_message(remaining))
+                time.sleep(LOCK_POLL_INTERVAL)
+                cr.rollback()
+                remaining = self.with_env(self.env(cr=cr))._wms_held(list(remaining))
+        _logger.info(f"Columnas liberadas tras la espera: {sorted(held)}")
+
+    @api.model
+    def _wms_busy_message(self, busy):
+        columns = self.env['stock.location'].browse({rack_id for rack_id, _x, _z in busy})
+        names = {rack.id: rack.display_name for rack in columns}
+        return _('Column locked by another operation, try again when it finishes:\n%s') % '\n'.join(
+            "%s X=%d Z=%d (%s)" % (names.get(rack_id, rack_id), x, z, ref)
+            for (rack_id, x, z), ref in sorted(busy.items())
+        )
+
+    @api.model
+    def _wms_bind(self, operation, columns=None):
+        """
+        Asignar a una operación las columnas bloqueadas al planificarla
+
+        Args:
+            operation: wms.operation recién encolada
+            columns: columnas de la operación (por defecto todas las pendientes)
+        """
+        pending = self.env.cr.postcommit.data.get('wms.column.locks')
+        if not pending:
+            return
+        keys = list(pending) if columns is None else [column for column in columns if column in pending]
+        lock_ids = [pending.pop(key) for key in keys]
+        if lock_ids:
+            self.sudo().browse(lock_ids).write({'operation_id': operation.id})
+
+    @api.model
+    def _wms_release(self, operations):
+        """Liberar las columnas de operaciones terminadas o fallidas"""
+        locks = self.sudo().search([('operation_id', 'in', operations.ids)])
+        if locks:
+            locks.write({'operation_id': False})
+
+    def action_release(self):
+        """Botón: liberar columnas manualmente (operaciones perdidas en el middleware)"""
+        self.check_access('write')
+        self.write({'operation_id': False})
+        _logger.warning(f"Columnas liberadas manualmente por el usuario {self.env.uid}: {self.ids}")
+        return True
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class WmsGridChange(models.Model):
+    """
+    Cambio de ocupación pendiente de publicar (registro de solo inserción)
+
+    StockLocation._wms_grid_touch inserta una fila por contenedor dentro de la
+    transacción en lugar de actualizar la fila del rack, así las transacciones
+    concurrentes no se serializan. Tras el commit, grid_version se incrementa
+    en una transacción corta aparte y las filas se borran; mientras tanto, las
+    demás transacciones que ven las filas reconstruyen la rejilla del
+    contenedor desde base de datos (DIRTY_GRID_VERSION). Una fila que
+    desaparece antes del commit delata un rollback a savepoint; las que
+    sobreviven a una caída se publican en el siguiente commit que toque una
+    rejilla.
+    """
+    _name = 'wms.grid.change'
+    _description = 'WMS Pending Grid Change'
+    _log_access = False
+
+    rack_id = fields.Many2one('stock.location', string='Container', required=True, readonly=True,
+                              ondelete='cascade')
+    changed_at = fields.Datetime(string='Changed At', required=True, readonly=True)
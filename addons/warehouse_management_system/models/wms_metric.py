@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.modules.registry import Registry
+from odoo.tools import SQL
+import atexit
+import logging
+import threading
+
+from ..tools.metrics import COUNT_BUCKETS, DURATION_BUCKETS, MetricsBuffer, render
+
+_logger = logging.getLogger(__name__)
+
+# Incrementos pendientes de cada worker, por base de datos: {dbname: MetricsBuffer}
+_BUFFERS = {}
+_BUFFERS_LOCK = threading.Lock()
+# Segundos mínimos entre volcados de un worker fuera del final de transacción
+FLUSH_INTERVAL = 10
+
+# Familias expuestas: {nombre: (tipo, ayuda)}
+METRICS = {
+    'wms_dispatch_seconds': ('histogram', 'Latency of sending an operation to the middleware'),
+    'wms_dispatch_total': ('counter', 'Operations sent to the middleware by result'),
+    'wms_operation_completion_seconds': ('histogram', 'Time from sending an operation to its last step callback'),
+    'wms_operation_steps': ('histogram', 'Steps per queued operation'),
+    'wms_picking_blockers': ('histogram', 'Blocking boxes moved to dummy per picking operation'),
+    'wms_request_wait_seconds': ('histogram', 'Time a picking or put-in request waited for the scheduler'),
+    'wms_callback_seconds': ('histogram', 'Processing time of middleware callbacks'),
+    'wms_callback_steps_total': ('counter', 'Step callbacks received by operation type and status'),
+    'wms_lookup_seconds': ('histogram', 'Processing time of read-only box and location lookups'),
+    'wms_errors_total': ('counter', 'Errors by operation type and stage'),
+    'wms_dummy_occupied_boxes': ('gauge', 'Boxes currently in each dummy zone'),
+    'wms_dummy_capacity': ('gauge', 'Capacity of each dummy zone'),
+    'wms_operations': ('gauge', 'Operations in the outbox by state'),
+    'wms_middleware_up': ('gauge', 'Whether each middleware endpoint is accepting operations (0 when down)'),
+}
+
+
+def _flush_buffer(registry, buffer):
+    """
+    Insertar en wms.metric.delta los incrementos pendientes de un buffer
+
+    Solo inserciones, con un cursor propio: los workers no compiten por las
+    filas de las series. Si falla, los incrementos vuelven al buffer.
+    """
+    series = buffer.drain()
+    if not series:
+        return
+    try:
+        with registry.cursor() as cr:
+            cr.execute(SQL(
+                "INSERT INTO wms_metric_delta (name, labels, value) VALUES %s",
+                SQL(", ").join(
+                    SQL("(%s, %s, %s)", name, labels, value) for (name, labels), value in sorted(series.items())
+                ),
+            ))
+    except Exception as e:
+        buffer.restore(series)
+        _logger.warning(f"No se pudieron volcar las métricas del WMS: {e}")
+
+
+@atexit.register
+def _flush_at_exit():
+    """Volcar lo pendiente cuando el worker termina (límites de peticiones o memoria)"""
+    for dbname, buffer in list(_BUFFERS.items()):
+        registry = Registry.registries.get(dbname)
+        if registry is not None:
+            _flush_buffer(registry, buffer)
+
+
+class WmsMetric(models.Model):
+    """
+    Series de métricas agregadas de todos los workers
+
+    Una fila por serie (nombre + etiquetas). Los workers acumulan los
+    incrementos en memoria y los vuelcan a wms.metric.delta al terminar cada
+    transacción que los registra (commit o rollback) y al salir; el cron
+    _cron_compact los suma aquí. La exposición suma ambas tablas.
+    """
+    _name = 'wms.metric'
+    _description = 'WMS Metric Series'
+    _order = 'name, labels'
+
+    name = fields.Char(string='Name', required=True, readonly=True)
+    labels = fields.Char(string='Labels', default='', readonly=True)
+    value = fields.Float(string='Value', readonly=True)
+
+    _series_uniq = models.Constraint('UNIQUE(name, labels)', 'Cada serie de métricas debe ser única.')
+
+    @api.model
+    def _wms_buffer(self):
+        """Incrementos pendientes de este worker para la base de datos actual"""
+        dbname = self.env.cr.dbname
+        buffer = _BUFFERS.get(dbname)
+        if buffer is None:
+            with _BUFFERS_LOCK:
+                buffer = _BUFFERS.setdefault(dbname, MetricsBuffer())
+        return buffer
+
+    @api.model
+    def _wms_flush_at_end(self, buffer):
+        """Volcar el buffer al terminar la transacción actual, con commit o con rollback"""
+        cr = self.env.cr
+        if buffer.due(FLUSH_INTERVAL):
+            self._wms_flush()
+        elif not cr.postcommit.data.get('wms.metric.flush'):
+            cr.postcommit.data['wms.metric.flush'] = True
+            registry = self.env.registry
+            flush = lambda: _flush_buffer(registry, buffer)
+            cr.postcommit.add(flush)
+            cr.postrollback.add(flush)
+
+    @api.model
+    def _wms_inc(self, name, labels=None, value=1):
+        """Incrementar un contador"""
+        buffer = self._wms_buffer()
+        buffer.inc(name, labels, value)
+        self._wms_flush_at_end(buffer)
+
+    @api.model
+    def _wms_observe(self, name, value, labels=None, buckets=DURATION_BUCKETS):
+        """Registrar una observación en un histograma"""
+        buffer = self._wms_buffer()
+        buffer.observe(name, value, labels, buckets)
+        self._wms_flush_at_end(buffer)
+
+    @api.model
+    def _wms_observe_count(self, name, value, labels=None):
+        """Registrar un recuento (pasos, cajas) en un histograma"""
+        self._wms_observe(name, value, labels, COUNT_BUCKETS)
+
+    @api.model
+    def _wms_flush(self):
+        """Volcar ya los incrementos pendientes de este worker"""
+        _flush_buffer(self.env.registry, self._wms_buffer())
+
+    @api.model
+    def _cron_compact(self):
+        """
+        Sumar a las series los incrementos de wms.metric.delta
+
+        Un único DELETE ... RETURNING con INSERT ... ON CONFLICT; solo lo
+        ejecuta el cron, así que nadie más actualiza las filas de las series.
+        """
+        self.env.cr.execute(SQL("""
+            WITH moved AS (
+                DELETE FROM wms_metric_delta RETURNING name, labels, value
+            )
+            INSERT INTO wms_metric (name, labels, value, create_uid, create_date, write_uid, write_date)
+            SELECT name, labels, sum(value), %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+              FROM moved
+             GROUP BY name, labels
+             ORDER BY name, labels
+            ON CONFLICT (name, labels) DO UPDATE
+               SET value = wms_metric.value + EXCLUDED.value,
+                   write_date = EXCLUDED.write_date
+        """, self.env.uid, self.env.uid))
+        self.invalidate_model()
+
+    @api.model
+    def _wms_gauges(self):
+        """Series instantáneas: ocupación de zonas dummy, operaciones por estado y salud de los middlewares"""
+        gauges = []
+        zones = self.env['wms.rack.occupancy'].sudo().search_fetch(
+            [('zone_type', '=', 'dummy')], ['rack_id', 'occupied_count', 'capacity'],
+        )
+        for zone in zones:
+            labels = 'zone="%s"' % zone.rack_id.display_name.replace('"', '\\"')
+            gauges.append(('wms_dummy_occupied_boxes', labels, zone.occupied_count))
+            gauges.append(('wms_dummy_capacity', labels, zone.capacity))
+        groups = self.env['wms.operation'].sudo()._read_group([], ['state'], ['__count'])
+        gauges.extend(('wms_operations', f'state="{state}"', count) for state, count in groups)
+        for config in self.env['middleware.config'].sudo().search_fetch([], ['name', 'health_status']):
+            labels = 'middleware="%s"' % config.name.replace('"', '\\"')
+            gauges.append(('wms_middleware_up', labels, 0 if config.health_status == 'down' else 1))
+        return gauges
+
+    @api.model
+    def _wms_render(self):
+        """Exposición de todas las métricas en formato de texto de Prometheus"""
+        self._wms_flush()
+        # Cursor nuevo: su instantánea ya incluye el volcado anterior
+        with self.env.registry.cursor() as cr:
+            cr.execute(SQL("""
+                SELECT name, labels, sum(value)
+                  FROM (SELECT name, labels, value FROM wms_metric
+                        UNION ALL
+                        SELECT name, labels, value FROM wms_metric_delta) series
+                 GROUP BY name, labels
+            """))
+            series = cr.fetchall()
+        series += self._wms_gauges()
+        return render(series, METRICS)
+
+
+class WmsMetricDelta(models.Model):
+    """Incrementos volcados por los workers pendientes de sumar a wms.metric (solo inserción)"""
+    _name = 'wms.metric.delta'
+    _description = 'WMS Metric Increments'
+    _log_access = False
+
+    name = fields.Char(string='Name', required=True, readonly=True)
+    labels = fields.Char(string='Labels', default='', readonly=True)
+    value = fields.Float(string='Value', readonly=True)
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, Command, _
+from odoo.exceptions import UserError
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+
+_logger = logging.getLogger(__name__)
+
+# Reintentos del dispatcher antes de marcar la operación como fallida
+DISPATCH_MAX_ATTEMPTS = 10
+# Espera máxima entre reintentos del dispatcher (segundos)
+DISPATCH_MAX_BACKOFF = 300
+# Acción de la secuencia que corresponde a cada tipo de callback
+CALLBACK_ACTIONS = {'put_in': 'place', 'picking': 'deliver'}
+# Orden de envío por prioridad
+PRIORITY_RANK = {'high': 0, 'normal': 1, 'low': 2}
+# Middlewares atendidos en paralelo por el dispatcher
+DISPATCH_THREADS = 4
+# Tiempo máximo de envío por middleware en cada ejecución (segundos); el resto
+# queda para la siguiente, así un PLC lento no retiene al dispatcher
+DISPATCH_TIME_BUDGET = 60
+
+
+class WmsOperation(models.Model):
+    """
+    Outbox transaccional y registro de operaciones para el middleware
+    Las operaciones se guardan en la misma transacción que las genera y un
+    dispatcher en segundo plano (cron) las envía en orden; los callbacks del
+    middleware marcan sus pasos como completados
+    """
+    _name = 'wms.operation'
+    _description = 'WMS Middleware Operation'
+    _rec_name = 'operation_id'
+    _order = 'id desc'
+
+    operation_id = fields.Char(string='Operation ID', required=True, readonly=True, copy=False)
+    operation_type = fields.Selection([
+        ('picking', 'Picking'),
+        ('put_in', 'Put In'),
+        ('clean_up', 'Clean Up'),
+        ('slotting', 'Slotting'),
+    ], string='Operation Type', required=True, readonly=True)
+    priority = fields.Selection([
+        ('high', 'High'),
+        ('normal', 'Normal'),
+        ('low', 'Low'),
+    ], string='Priority', default='normal', readonly=True)
+    box_id = fields.Many2one('product.box', string='Target Box', ondelete='set null', readonly=True)
+    config_id = fields.Many2one(
+        'middleware.config',
+        string='Middleware',
+        required=True,
+        ondelete='cascade',
+        readonly=True
+    )
+    payload = fields.Text(string='Payload', readonly=True, help="JSON enviado al middleware")
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='queued', required=True, readonly=True)
+    step_ids = fields.One2many('wms.operation.step', 'operation_id', string='Steps', readonly=True)
+    attempts = fields.Integer(string='Attempts', readonly=True)
+    next_attempt_date = fields.Datetime(string='Next Attempt', readonly=True)
+    sent_date = fields.Datetime(string='Sent On', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+    idempotency_key = fields.Char(
+        string='Idempotency Key',
+        readonly=True,
+        copy=False,
+        help="Clave del llamante: volver a encolar con la misma clave devuelve la operación existente"
+    )
+
+    _operation_id_uniq = models.Constraint(
+        'UNIQUE(operation_id)',
+        'El identificador de operación debe ser único.',
+    )
+    _idempotency_key_uniq = models.UniqueIndex(
+        '(idempotency_key) WHERE idempotency_key IS NOT NULL',
+        'La clave de idempotencia debe ser única.',
+    )
+    _queued_idx = models.Index("(config_id, id) WHERE state = 'queued'")
+
+    def write(self, vals):
+        """Liberar columnas (y, si falla, reservas dummy y asignaciones de slotting) al terminar la operación"""
+        res = super().write(vals)
+        if vals.get('state') in ('done', 'failed'):
+            self.env['wms.column.lock']._wms_release(self)
+        if vals.get('state') == 'failed':
+            # Las cajas bloqueantes que no llegaron a moverse dejan libre su ubicación dummy
+            self.step_ids.filtered(lambda step: step.action == 'move_to_dummy').box_id._release_dummy_reservations()
+            # Reordenaciones de slotting: las cajas que no se movieron recuperan su asignación
+            self.env['wms.slotting.line'].search([
+                ('operation_id', 'in', self.ids), ('state', '=', 'queued'),
+            ])._wms_revert_assignment()
+        return res
+
+    @api.model
+    def _new_operation_id(self, prefix, *parts):
+        """
+        Identificador de operación: prefijo, partes legibles, fecha y un sufijo
+        aleatorio, así dos operaciones del mismo segundo no colisionan
+
+        Returns:
+            str: p. ej. PICKING-42-20260117-103000-1f3a9c2b
+        """
+        stamp = fields.Datetime.now().strftime('%Y%m%d-%H%M%S')
+        return '-'.join([prefix, *(str(part) for part in parts), stamp, uuid.uuid4().hex[:8]])
+
+    @api.model
+    def _enqueue(self, config, operation_data, box=None, columns=None, idempotency_key=None):
+        """
+        Guardar una operación en el outbox (misma transacción que el plan)
+
+        Si la transacción se reintenta la fila se deshace con ella. Cada
+        llamada encola una operación nueva; solo una clave de idempotencia
+        explícita devuelve la operación ya encolada con esa clave.
+
+        Args:
+            config: middleware.config destino
+            operation_data: diccionario con los datos de la operación
+            box: caja objetivo (opcional)
+            columns: columnas bloqueadas al planificar que pasan a la operación
+                     (por defecto todas las pendientes de la transacción)
+            idempotency_key: clave del llamante para no duplicar la operación (opcional)
+
+        Returns:
+            wms.operation: registro del outbox
+        """
+        if idempotency_key:
+            existing = self.search([('idempotency_key', '=', idempotency_key)], limit=1)
+            if existing:
+                return existing
+
+        operation = self.create({
+            'operation_id': operation_data['operation_id'],
+            'idempotency_key': idempotency_key or False,
+            'operation_type': operation_data['operation_type'],
+            'priority': operation_data.get('priority', 'normal'),
+            'box_id': box.id if box else False,
+            'config_id': config.id,
+            'payload': json.dumps(operation_data),
+            'step_ids': [Command.create({
+                'operation_ref': operation_data['operation_id'],
+                'step': step['step'],
+                'action': step['action'],
+                'box_ident': step['box_id'],
+                'box_id': step.get('box_odoo_id'),
+            }) for step in operation_data.get('sequence', [])],
+        })
+        self.env['wms.column.lock']._wms_bind(operation, columns)
+        # El cron solo se dispara cuando la transacción se confirma
+        self.env.ref('warehouse_management_system.ir_cron_wms_dispatch').sudo()._trigger()
+
+        Metric = self.env['wms.metric']
+        sequence = operation_data.get('sequence', [])
+        Metric._wms_observe_count('wms_operation_steps', len(sequence), {'operation_type': operation.operation_type})
+        if operation.operation_type == 'picking':
+            blockers = sum(1 for step in sequence if step['action'] == 'move_to_dummy')
+            Metric._wms_observe_count('wms_picking_blockers', blockers)
+        return operation
+
+    @api.model
+    def _cron_dispatch(self, limit=200):
+        """
+        Enviar al middleware las operaciones pendientes, en orden por middleware
+
+        Cada middleware (un PLC por pasillo) se atiende en su propio hilo y
+        cursor, en paralelo con los demás; dentro de un middleware el orden se
+        respeta y, si una operación falla, las siguientes esperan a su
+        reintento para no alterar el orden de ejecución en el PLC. Se envían
+        primero las de mayor prioridad; las de prioridad baja esperan a que el
+        middleware no tenga operaciones de mayor prioridad en curso (como mucho
+        low_priority_max_wait minutos), así nunca retrasan un picking.
+        """
+        testing = getattr(threading.current_thread(), 'testing', False)
+        operations = self.search([('state', '=', 'queued')], order='id', limit=limit)
+        plans = operations._dispatch_plan()
+
+        if testing or len(plans) <= 1:
+            for operation_ids in plans.values():
+                self.browse(operation_ids)._dispatch_sequence(auto_commit=not testing)
+        else:
+            with ThreadPoolExecutor(max_workers=min(DISPATCH_THREADS, len(plans)),
+                                    thread_name_prefix='wms-dispatch') as executor:
+                futures = [executor.submit(self._dispatch_thread, operation_ids) for operation_ids in plans.values()]
+            for future in futures:
+                if future.exception():
+                    _logger.error(f"Error en un hilo del dispatcher: {future.exception()}")
+
+        if len(operations) == limit:
+            self.env.ref('warehouse_management_system.ir_cron_wms_dispatch').sudo()._trigger()
+
+    def _dispatch_plan(self):
+        """
+        Operaciones que se pueden enviar ahora, en orden de envío por middleware
+
+        Returns:
+            dict: {config_id: [operation_id]}
+        """
+        now = fields.Datetime.now()
+        busy_configs = self._live_configs()
+        awaited = self._awaited_operations()
+        blocked_configs = set()
+        plans = {}
+        for operation in self.sorted(lambda op: (PRIORITY_RANK.get(op.priority, 1), op.id)):
+            if operation.config_id.id in blocked_configs:
+                continue
+            if operation.next_attempt_date and operation.next_attempt_date > now:
+                blocked_configs.add(operation.config_id.id)
+                continue
+            if operation.priority == 'low' and operation.config_id.id in busy_configs and operation.id not in awaited:
+                max_wait = datetime.timedelta(minutes=operation.config_id.low_priority_max_wait)
+                if operation.create_date + max_wait > now:
+                    continue
+            plans.setdefault(operation.config_id.id, []).append(operation.id)
+        return plans
+
+    @api.model
+    def _dispatch_thread(self, operation_ids):
+        """Enviar las operaciones de un middleware con un cursor propio (hilo del dispatcher)"""
+        with self.env.registry.cursor() as cr:
+            threading.current_thread().dbname = cr.dbname
+            self.with_env(self.env(cr=cr)).browse(operation_ids)._dispatch_sequence(auto_commit=True)
+
+    def _dispatch_sequence(self, auto_commit=True):
+        """
+        Enviar en orden operaciones de un mismo middleware
+
+        Se detiene en el primer fallo (las siguientes esperan al reintento) o
+        al agotar DISPATCH_TIME_BUDGET.
+        """
+        deadline = time.monotonic() + DISPATCH_TIME_BUDGET
+        for operation in self:
+            if time.monotonic() > deadline:
+                self.env.ref('warehouse_management_system.ir_cron_wms_dispatch').sudo()._trigger()
+                if auto_commit:
+                    self.env.cr.commit()
+                break
+            sent = operation._dispatch()
+            if auto_commit:
+                self.env.cr.commit()
+            if not sent:
+                break
+
+    def _live_configs(self):
+        """
+        Middlewares con operaciones de prioridad normal o alta en curso
+        (encoladas, o enviadas recientemente y sin completar)
+        """
+        configs = self.config_id
+        if not configs:
+            return set()
+        since = fields.Datetime.now() - datetime.timedelta(minutes=max(configs.mapped('low_priority_max_wait')))
+        groups = self._read_group([
+            ('config_id', 'in', configs.ids),
+            ('priority', '!=', 'low'),
+            '|', ('state', '=', 'queued'), '&', ('state', '=', 'sent'), ('sent_date', '>=', since),
+        ], ['config_id'], ['__count'])
+        busy = {config.id for config, _count in groups}
+        if self.env['wms.request'].search_count([('state', '=', 'pending')], limit=1):
+            # Pickings y put-ins esperando al planificador: el clean-up cede el paso
+            busy.update(configs.ids)
+        return busy
+
+    def _awaited_operations(self):
+        """
+        Operaciones que bloquean columnas esperadas por peticiones pendientes
+        (se envían aunque sean de prioridad baja, retenerlas retrasaría el picking)
+        """
+        columns = self.env['wms.request']._wms_awaited_columns()
+        if not columns:
+            return set()
+        locks = self.env['wms.column.lock'].sudo().search_fetch(
+            [('operation_id', 'in', self.ids)], ['rack_id', 'pos_x', 'pos_z', 'operation_id'],
+        )
+        return {lock.operation_id.id for lock in locks if (lock.rack_id.id, lock.pos_x, lock.pos_z) in columns}
+
+    def _dispatch(self):
+        """
+        Enviar una operación del outbox
+
+        Returns:
+            bool: True si se envió
+        """
+        self.ensure_one()
+        Metric = self.env['wms.metric']
+        labels = {'operation_type': self.operation_type, 'middleware': self.config_id.name}
+        start = time.perf_counter()
+        try:
+            self.config_id.send_operation(json.loads(self.payload))
+        except Exception as e:
+            self.config_id._record_health(e)
+            Metric._wms_observe('wms_dispatch_seconds', time.perf_counter() - start, labels)
+            Metric._wms_inc('wms_dispatch_total', dict(labels, result='error'))
+            Metric._wms_inc('wms_errors_total', dict(labels, stage='dispatch'))
+            attempts = self.attempts + 1
+            next_attempt = fields.Datetime.now() + datetime.timedelta(
+                seconds=min(2 ** attempts, DISPATCH_MAX_BACKOFF)
+            )
+            self.write({
+                'attempts': attempts,
+                'last_error': str(e),
+                'state': 'failed' if attempts >= DISPATCH_MAX_ATTEMPTS else 'queued',
+                'next_attempt_date': next_attempt,
+            })
+            if self.state == 'queued':
+                self.env.ref('warehouse_management_system.ir_cron_wms_dispatch').sudo()._trigger(at=next_attempt)
+            _logger.warning(f"Operación {self.operation_id} no enviada (intento {attempts}): {e}")
+            return False
+
+        Metric._wms_observe('wms_dispatch_seconds', time.perf_counter() - start, labels)
+        Metric._wms_inc('wms_dispatch_total', dict(labels, result='ok'))
+        self.config_id._record_health()
+        self.write({
+            'state': 'sent',
+            'attempts': self.attempts + 1,
+            'sent_date': fields.Datetime.now(),
+            'last_error': False,
+        })
+        _logger.info(f"Operación {self.operation_id} enviada al middleware")
+        return True
+
+    def action_retry(self):
+        """Volver a encolar operaciones fallidas"""
+        failed = self.filtered(lambda op: op.state == 'failed')
+        if not failed:
+            raise UserError(_('Only failed operations can be retried.'))
+        failed.write({
+            'state': 'queued',
+            'attempts': 0,
+            'next_attempt_date': False,
+        })
+        self.env.ref('warehouse_management_system.ir_cron_wms_dispatch').sudo()._trigger()
+        return True
+
+    def _check_completion(self):
+        """Marcar como terminadas las operaciones con todos sus pasos completados"""
+        done = self.filtered(
+            lambda op: op.state != 'done' and op.step_ids
+            and all(step.state == 'done' for step in op.step_ids)
+        )
+        if done:
+            done.write({'state': 'done'})
+            now = fields.Datetime.now()
+            for operation in done.filtered('sent_date'):
+                self.env['wms.metric']._wms_observe(
+                    'wms_operation_completion_seconds',
+                    (now - operation.sent_date).total_seconds(),
+                    {'operation_type': operation.operation_type},
+                )
+
+
+class WmsOperationStep(models.Model):
+    """
+    Pasos de una operación y callbacks recibidos del middleware
+    El índice (operation_ref, step) permite detectar callbacks duplicados con
+    una sola consulta
+    """
+    _name = 'wms.operation.step'
+    _description = 'WMS Operation Step'
+    _order = 'operation_ref, step'
+
+    operation_id = fields.Many2one('wms.operation', string='Operation', ondelete='cascade', index=True)
+    operation_ref = fields.Char(string='Operation ID', required=True)
+    step = fields.Integer(string='Step')
+    action = fields.Char(string='Action')
+    box_ident = fields.Char(string='Box ID')
+    box_id = fields.Many2one('product.box', string='Box', ondelete='set null')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True)
+    completed_date = fields.Datetime(string='Completed On')
+
+    # step > 0: el ORM guarda un paso sin número como 0, no como NULL
+    _operation_step_number_uniq = models.UniqueIndex('(operation_ref, step) WHERE step > 0')
+
+    def init(self):
+        # Índice anterior (WHERE step IS NOT NULL): rechazaba el segundo callback sin número de paso
+        self.env.cr.execute("DROP INDEX IF EXISTS wms_operation_step_operation_step_uniq")
+
+    @api.model
+    def _match_callbacks(self, callbacks):
+        """
+        Localizar en el registro el paso de cada callback
+
+        Una única consulta indexada por operation_ref para todo el lote. El paso
+        se identifica por su número si el middleware lo envía, o si no por
+        caja y acción (primer paso pendiente).
+
+        Returns:
+            list: wms.operation.step (vacío si no está registrado) por callback
+        """
+        refs = list({callback.get('operation_id') for callback in callbacks if callback.get('operation_id')})
+        if not refs:
+            return [self.browse() for _callback in callbacks]
+
+        records = self.search_fetch(
+            [('operation_ref', 'in', refs)],
+            ['operation_id', 'operation_ref', 'step', 'action', 'box_ident', 'state'],
+        )
+        by_number = {}
+        by_box = {}
+        for record in records:
+            if record.step:
+                by_number[(record.operation_ref, record.step)] = record
+            by_box.setdefault((record.operation_ref, record.box_ident, record.action), []).append(record)
+
+        matches = []
+        claimed = set()
+        for callback in callbacks:
+            ref = callback.get('operation_id')
+            record = self.browse()
+            if callback.get('step'):
+                record = by_number.get((ref, int(callback['step'])), self.browse())
+            else:
+                action = CALLBACK_ACTIONS.get(callback.get('operation_type'), callback.get('operation_type'))
+                candidates = by_box.get((ref, callback.get('box_id'), action), [])
+                pending = [c for c in candidates if c.state == 'pending' and c.id not in claimed]
+                record = pending[0] if pending else (candidates[-1] if candidates else self.browse())
+            if record:
+                claimed.add(record.id)
+            matches.append(record)
+        return matches
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools import SQL
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class WmsRackOccupancy(models.Model):
+    """
+    Resumen de ocupación por rack y zona dummy (modelo de lectura)
+
+    Una fila por contenedor de ubicaciones is_box, así los paneles y
+    planificadores leen una fila en lugar de contar cajas. Las transacciones
+    que cambian la ocupación solo anotan sus contenedores en
+    wms.rack.occupancy.queue (inserciones, sin tocar estas filas); el cron
+    _cron_refresh, disparado tras el commit, recalcula los anotados desde su
+    propia instantánea.
+    """
+    _name = 'wms.rack.occupancy'
+    _description = 'WMS Rack Occupancy'
+    _rec_name = 'rack_id'
+    _order = 'zone_type, rack_id'
+
+    rack_id = fields.Many2one('stock.location', string='Rack', required=True, readonly=True, ondelete='cascade')
+    zone_type = fields.Selection([
+        ('rack', 'Rack'),
+        ('dummy', 'Dummy Zone'),
+    ], string='Type', readonly=True)
+    slot_count = fields.Integer(string='Slots', readonly=True)
+    occupied_count = fields.Integer(string='Occupied', readonly=True)
+    free_count = fields.Integer(string='Free', readonly=True, help="Ubicaciones sin caja presente ni asignada")
+    in_dummy_count = fields.Integer(
+        string='In Dummy',
+        readonly=True,
+        help="Rack: cajas asignadas que están en una zona dummy. Zona dummy: cajas presentes"
+    )
+    capacity = fields.Integer(string='Capacity', readonly=True, help="max_box / max_box_dummy, o el número de ubicaciones")
+    fill_rate = fields.Float(string='Fill Rate (%)', readonly=True, digits=(5, 1))
+    over_limit = fields.Boolean(string='Over Limit', readonly=True, help="Zona dummy por encima del límite de clean-up")
+    column_depth = fields.Text(
+        string='Deepest Occupied Y per Column',
+        readonly=True,
+        help='JSON {"x,z": y} con la profundidad ocupada más al fondo de cada columna'
+    )
+    grid_version = fields.Integer(string='Grid Version', readonly=True)
+
+    _rack_uniq = models.Constraint('UNIQUE(rack_id)', 'Solo puede haber un resumen por rack.')
+
+    @api.model
+    def _wms_dummy_zone_ids(self):
+        """Contenedores con ubicaciones dummy"""
+        self.env['stock.location'].flush_model(['location_id', 'is_box', 'is_dummy', 'active'])
+        self.env.cr.execute(SQL("""
+            SELECT DISTINCT location_id FROM stock_location
+             WHERE is_box AND is_dummy AND active AND location_id IS NOT NULL
+        """))
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _wms_refresh(self, rack_ids):
+        """
+        Recalcular desde las rejillas el resumen de estos contenedores
+
+        Se escribe con un único INSERT ... ON CONFLICT.
+
+        Args:
+            rack_ids: ids de los contenedores
+        """
+        if not rack_ids:
+            return
+        Location = self.env['stock.location']
+        dummy_zone_ids = self._wms_dummy_zone_ids()
+
+        dummy_boxes = set()
+        for zone_id in dummy_zone_ids:
+            dummy_boxes.update(Location._wms_grid(zone_id).box_ids())
+
+        racks = Location.browse(sorted(rack_ids)).exists()
+        rows = [self._wms_summary(rack, Location._wms_grid(rack.id), dummy_boxes) for rack in racks]
+        if not rows:
+            return
+
+        columns = list(rows[0])
+        self.env.cr.execute(SQL("""
+            INSERT INTO wms_rack_occupancy (%s, create_uid, create_date, write_uid, write_date)
+            VALUES %s
+            ON CONFLICT (rack_id) DO UPDATE SET %s
+        """,
+            SQL(", ").join(SQL.identifier(column) for column in columns),
+            SQL(", ").join(
+                SQL("(%s, %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC'))",
+                    SQL(", ").join(row[column] for column in columns), self.env.uid, self.env.uid)
+                for row in rows
+            ),
+            SQL(", ").join(
+                SQL("%s = EXCLUDED.%s", SQL.identifier(column), SQL.identifier(column))
+                for column in columns + ['write_uid', 'write_date']
+            ),
+        ))
+        self.invalidate_model()
+
+        if any(row['over_limit'] for row in rows):
+            # Zona dummy por encima de su límite: planificar el clean-up tras el commit
+            self.env.ref('warehouse_management_system.ir_cron_wms_clean_up').sudo()._trigger()
+
+    @api.model
+    def _wms_summary(self, rack, grid, dummy_boxes):
+        """Valores del resumen de un contenedor a partir de su rejilla"""
+        is_dummy_zone = any(grid.flags_of(loc)[1] for x, z in grid.columns() for _y, loc in grid.column(x, z))
+        box_ids = grid.box_ids()
+
+        depth = {}
+        for x, z in grid.columns():
+            occupied = [y for y, loc in grid.column(x, z) if grid.boxes_at(loc)]
+            if occupied:
+                depth[f"{x},{z}"] = occupied[-1]
+
+        if is_dummy_zone:
+            capacity = rack.max_box_dummy or len(grid)
+            in_dummy = len(box_ids)
+        else:
+            capacity = rack.max_box or len(grid)
+            in_dummy = len(grid.slots_assigned_to(dummy_boxes))
+        occupied_count = grid.occupied_count()
+        return {
+            'rack_id': rack.id,
+            'zone_type': 'dummy' if is_dummy_zone else 'rack',
+            'slot_count': len(grid),
+            'occupied_count': occupied_count,
+            'free_count': len(grid.free_slots()),
+            'in_dummy_count': in_dummy,
+            'capacity': capacity,
+            'fill_rate': round(100.0 * occupied_count / capacity, 1) if capacity else 0.0,
+            'over_limit': bool(is_dummy_zone and rack.limit and len(box_ids) >= rack.limit),
+            'column_depth': json.dumps(depth),
+            'grid_version': grid.version,
+        }
+
+    @api.model
+    def _wms_dummy_owner_racks(self, rack_ids, bases):
+        """
+        Racks a los que pertenecen las cajas que han entrado o salido de las
+        zonas dummy modificadas (su in_dummy_count cambia)
+
+        Compara la rejilla confirmada de cada zona con la de la transacción;
+        si no se tiene la confirmada, toma todas las cajas presentes ahora y los
+        racks que ya tenían cajas en zonas dummy.
+
+        Args:
+            rack_ids: contenedores modificados en la transacción
+            bases: {contenedor: rejilla confirmada de partida o None}
+        """
+        Location = self.env['stock.location']
+        cr = self.env.cr
+        owner_ids = set()
+        moved = set()
+        for zone_id in set(rack_ids) & self._wms_dummy_zone_ids():
+            current = set(Location._wms_grid(zone_id).box_ids())
+            base = bases.get(zone_id)
+            if base is not None:
+                moved.update(current.symmetric_difference(base.box_ids()))
+                continue
+            moved.update(current)
+            if not owner_ids:
+                self.flush_model(['in_dummy_count'])
+                cr.execute(SQL("SELECT rack_id FROM wms_rack_occupancy WHERE in_dummy_count > 0"))
+                owner_ids.update(row[0] for row in cr.fetchall())
+        if moved:
+            self.env['product.box'].flush_model(['rack_location'])
+            cr.execute(SQL("""
+                SELECT DISTINCT slot.location_id
+                  FROM product_box box
+                  JOIN stock_location slot ON slot.id = box.rack_location
+                 WHERE box.id IN %s
+            """, tuple(moved)))
+            owner_ids.update(row[0] for row in cr.fetchall())
+        return owner_ids
+
+    @api.model
+    def _wms_refresh_touched(self):
+        """
+        Precommit: anotar los contenedores modificados en la transacción (y los
+        racks de las cajas que entran o salen de zonas dummy) para _cron_refresh
+
+        Solo inserta en la cola: dos transacciones sobre el mismo rack no
+        compiten por su fila de resumen.
+        """
+        rack_ids = self.env.cr.precommit.data.pop('wms.occupancy.racks', None)
+        bases = self.env.cr.precommit.data.pop('wms.occupancy.bases', {})
+        if not rack_ids:
+            return
+        rack_ids = rack_ids | self._wms_dummy_owner_racks(rack_ids, bases)
+        self.env.cr.execute(SQL(
+            "INSERT INTO wms_rack_occupancy_queue (rack_id) SELECT unnest(%s::int4[])",
+            sorted(rack_ids),
+        ))
+        self.env.ref('warehouse_management_system.ir_cron_wms_rack_occupancy').sudo()._trigger()
+        # Se ejecuta como precommit, después del último flush
+        self.env.flush_all()
+
+    @api.model
+    def _cron_refresh(self):
+        """Recalcular los contenedores anotados en la cola"""
+        self.env.cr.execute(SQL("DELETE FROM wms_rack_occupancy_queue RETURNING rack_id"))
+        rack_ids = {row[0] for row in self.env.cr.fetchall()}
+        if rack_ids:
+            self._wms_refresh(rack_ids)
+
+    @api.model
+    def _wms_refresh_all(self):
+        """Recalcular el resumen de todos los contenedores"""
+        Location = self.env['stock.location']
+        rack_ids = set(Location._wms_grid_versions())
+        self._wms_refresh(rack_ids)
+        stale = self.search([('rack_id', 'not in', list(rack_ids))])
+        stale.unlink()
+        _logger.info(f"Resumen de ocupación recalculado para {len(rack_ids)} contenedores")
+        return True
+
+    def action_refresh(self):
+        """Botón: recalcular el resumen"""
+        self._wms_refresh_all()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
+
+    def _wms_export(self):
+        """Representación JSON del resumen"""
+        return [{
+            'rack_id': record.rack_id.id,
+            'rack': record.rack_id.complete_name,
+            'zone_type': record.zone_type,
+            'slots': record.slot_count,
+            'occupied': record.occupied_count,
+            'free': record.free_count,
+            'in_dummy': record.in_dummy_count,
+            'capacity': record.capacity,
+            'fill_rate': record.fill_rate,
+            'over_limit': record.over_limit,
+            'column_depth': json.loads(record.column_depth or '{}'),
+            'grid_version': record.grid_version,
+            'updated': record.write_date and record.write_date.isoformat(),
+        } for record in self]
+
+
+class WmsRackOccupancyQueue(models.Model):
+    """
+    Contenedores pendientes de recalcular en wms.rack.occupancy (solo inserción)
+
+    Cada transacción que cambia la ocupación inserta aquí sus contenedores en
+    el precommit; _cron_refresh los consume.
+    """
+    _name = 'wms.rack.occupancy.queue'
+    _description = 'WMS Rack Occupancy Refresh Queue'
+    _log_access = False
+
+    rack_id = fields.Many2one('stock.location', string='Container', required=True, readonly=True,
+                              ondelete='cascade')
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+import datetime
+import logging
+import threading
+
+from .wms_operation import PRIORITY_RANK
+
+_logger = logging.getLogger(__name__)
+
+# Prioridad de la operación según el rango de su mejor petición
+RANK_PRIORITY = {rank: priority for priority, rank in PRIORITY_RANK.items()}
+
+
+class WmsRequest(models.Model):
+    """
+    Petición de picking o put-in pendiente de planificar
+
+    Las peticiones esperan como mucho schedule_window segundos (ventana que
+    empieza con la más antigua) y se planifican juntas: por prioridad, con
+    las que han superado su SLA por delante, y los pickings de una misma
+    columna en una sola operación, así cada caja bloqueante se mueve a dummy
+    una vez para varias cajas objetivo. Mientras haya peticiones pendientes
+    el dispatcher retiene el clean-up y el slotting.
+    """
+    _name = 'wms.request'
+    _description = 'WMS Scheduled Request'
+    _rec_name = 'box_id'
+    _order = 'id desc'
+
+    request_type = fields.Selection([
+        ('picking', 'Picking'),
+        ('put_in', 'Put In'),
+    ], string='Request Type', required=True, readonly=True)
+    box_id = fields.Many2one('product.box', string='Box', required=True, ondelete='cascade', readonly=True)
+    target_location_id = fields.Many2one(
+        'stock.location',
+        string='Target Location',
+        readonly=True,
+        help='Ubicación destino del put-in (por defecto la ubicación asignada de la caja)'
+    )
+    priority = fields.Selection([
+        ('high', 'High'),
+        ('normal', 'Normal'),
+        ('low', 'Low'),
+    ], string='Priority', default='normal', required=True, readonly=True)
+    deadline = fields.Datetime(string='SLA Deadline', readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('planned', 'Planned'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ], string='State', default='pending', required=True, readonly=True)
+    operation_id = fields.Many2one('wms.operation', string='Operation', readonly=True, ondelete='set null')
+    planned_date = fields.Datetime(string='Planned On', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+
+    _pending_idx = models.Index("(box_id, request_type) WHERE state = 'pending'")
+
+    @api.model
+    def _wms_submit(self, boxes, request_type, priority='normal', target_location=None):
+        """
+        Registrar peticiones para el planificador
+
+        Una caja con una petición pendiente del mismo tipo no se duplica; si la
+        nueva es más prioritaria se sube la prioridad de la existente.
+
+        Args:
+            boxes: product.box
+            request_type: 'picking' o 'put_in'
+            priority: 'high', 'normal' o 'low'
+            target_location: destino del put-in (opcional)
+
+        Returns:
+            wms.request: peticiones pendientes de las cajas
+        """
+        Config = self.env['middleware.config']
+        now = fields.Datetime.now()
+
+        def config_of(box):
+            location = (target_location or box.rack_location) if request_type == 'put_in' else box.parent_location
+            return Config.get_active_config(location.location_id.id)
+
+        configs = {box.id: config_of(box) for box in boxes}
+        existing = self.search([
+            ('state', '=', 'pending'),
+            ('request_type', '=', request_type),
+            ('box_id', 'in', boxes.ids),
+        ])
+        raised = existing.filtered(lambda r: PRIORITY_RANK[priority] < PRIORITY_RANK[r.priority])
+        if raised:
+            raised.write({'priority': priority})
+
+        known = set(existing.box_id.ids)
+        requests = existing | self.create([{
+            'request_type': request_type,
+            'box_id': box.id,
+            'target_location_id': target_location.id if target_location else False,
+            'priority': priority,
+            'deadline': now + datetime.timedelta(minutes=configs[box.id].schedule_sla),
+        } for box in boxes if box.id not in known])
+
+        # Las peticiones de prioridad alta no esperan a la ventana
+        window = min((config.schedule_window for config in configs.values()), default=0)
+        at = now if priority == 'high' else now + datetime.timedelta(seconds=window)
+        self.env.ref('warehouse_management_system.ir_cron_wms_schedule').sudo()._trigger(at=at)
+        return requests
+
+    def _wms_column(self):
+        """Columna (rack, X, Z) que toca la petición"""
+        self.ensure_one()
+        if self.request_type == 'picking':
+            box = self.box_id
+            return (box.parent_location.location_id.id, box.pos_x, box.pos_z)
+        target = self._wms_target()
+        return (target.location_id.id, target.pos_x, target.pos_z)
+
+    def _wms_config(self):
+        """Middleware que atiende la columna de la petición"""
+        return self.env['middleware.config'].get_active_config(self._wms_column()[0])
+
+    def _wms_target(self):
+        """Ubicación destino de un put-in"""
+        self.ensure_one()
+        return self.target_location_id or self.box_id.rack_location
+
+    def _wms_rank(self, now):
+        """Orden de planificación: prioridad (SLA vencido = alta), SLA y llegada"""
+        self.ensure_one()
+        overdue = self.deadline and self.deadline <= now
+        return (0 if overdue else PRIORITY_RANK[self.priority], self.deadline or now, self.id)
+
+    def _wms_invalid_reason(self):
+        """Motivo por el que la petición ya no se puede planificar (o False)"""
+        self.ensure_one()
+        if self.request_type == 'picking' and self.box_id.state != 'inlocation':
+            return _('The box is not in its location.')
+        if self.request_type == 'put_in':
+            if self.box_id.state == 'inlocation':
+                return _('The box is already in its location.')
+            if not self._wms_target():
+                return _('The box has no assigned rack location.')
+        return False
+
+    @api.model
+    def _wms_awaited_columns(self):
+        """Columnas que esperan las peticiones pendientes"""
+        return {request._wms_column() for request in self.search([('state', '=', 'pending')])}
+
+    def _wms_plan(self):
+        """
+        Planificar peticiones pendientes como operaciones del outbox
+
+        Las columnas bloqueadas por otra operación (o ya usadas en esta
+        planificación) se dejan para la siguiente ejecución. Si una columna
+        falla, su savepoint se deshace y las demás siguen adelante.
+
+        Returns:
+            wms.operation: operaciones encoladas
+        """
+        Config = self.env['middleware.config']
+        now = fields.Datetime.now()
+        Metric = self.env['wms.metric']
+
+        pending = self.filtered(lambda r: r.state == 'pending')
+        for request in pending:
+            reason = request._wms_invalid_reason()
+            if reason:
+                request.write({'state': 'cancelled', 'error': reason})
+                pending -= request
+
+        # Agrupar por columna en orden de planificación: los pickings de una columna van juntos
+        groups = {}
+        for request in pending.sorted(lambda r: r._wms_rank(now)):
+            column = request._wms_column()
+            key = ('picking',) + column if request.request_type == 'picking' else ('put_in', request.id)
+            if key not in groups:
+                groups[key] = (column, [])
+            groups[key][1].append(request)
+
+        locked = self.env['wms.column.lock']._wms_acquire(
+            {column for column, _requests in groups.values()}, mode='skip'
+        )
+
+        operations = self.env['wms.operation']
+        used = set()
+        for column, requests in groups.values():
+            if column not in locked or column in used:
+                continue
+            used.add(column)
+            requests = self.browse([request.id for request in requests])
+            priority = RANK_PRIORITY[min(request._wms_rank(now)[0] for request in requests)]
+            try:
+                with self.env.cr.savepoint():
+                    operation = requests._wms_queue(Config.get_active_config(column[0]), priority, column)
+            except UserError as e:
+                requests.write({'state': 'failed', 'error': str(e)})
+                _logger.warning(f"Peticiones {requests.ids} no planificadas: {e}")
+                continue
+
+            operations |= operation
+            for request in requests:
+                Metric._wms_observe(
+                    'wms_request_wait_seconds',
+                    (now - request.create_date).total_seconds(),
+                    {'request_type': request.request_type},
+                )
+
+        if operations:
+            _logger.info(
+                f"Planificador: {len(operations)} operaciones para "
+                f"{len(pending.filtered(lambda r: r.state == 'planned'))} peticiones"
+            )
+        return operations
+
+    def _wms_queue(self, config, priority, column):
+        """
+        Encolar una operación para un grupo de peticiones de la misma columna
+
+        Args:
+            config: middleware.config destino
+            priority: prioridad de la operación
+            column: columna (rack, X, Z) bloqueada para la operación
+
+        Returns:
+            wms.operation: operación encolada
+        """
+        boxes = self.box_id
+        if self[0].request_type == 'put_in':
+            operation_data = boxes._prepare_operation_data('put_in', self._wms_target(), priority=priority)
+        elif len(boxes) == 1:
+            operation_data = boxes._prepare_operation_data('picking', priority=priority)
+        else:
+            operation_data = boxes._prepare_batch_picking_data(priority=priority)
+
+        operation = config.queue_operation(operation_data, box=boxes[:1], columns=[column])
+        self.write({
+            'state': 'planned',
+            'operation_id': operation.id,
+            'planned_date': fields.Datetime.now(),
+            'error': False,
+        })
+        return operation
+
+    @api.model
+    def _cron_schedule(self):
+        """
+        Planificar las peticiones pendientes cuando vence la ventana de la más
+        antigua (o antes si hay alguna de prioridad alta o con el SLA vencido)
+        """
+        pending = self.search([('state', '=', 'pending')], order='id')
+        if not pending:
+            return
+        try:
+            windows = {
+                request.id: datetime.timedelta(seconds=request._wms_config().schedule_window)
+                for request in pending
+            }
+        except UserError as e:
+            _logger.warning(f"Planificador sin middleware activo: {e}")
+            return
+
+        now = fields.Datetime.now()
+        window = min(windows.values())
+        due = min(request.create_date + windows[request.id] for request in pending)
+        urgent = any(request._wms_rank(now)[0] == 0 for request in pending)
+        cron = self.env.ref('warehouse_management_system.ir_cron_wms_schedule').sudo()
+        if due > now and not urgent:
+            cron._trigger(at=due)
+            return
+
+        pending._wms_plan()
+        if pending.filtered(lambda r: r.state == 'pending'):
+            # Columnas ocupadas: se reintenta en la siguiente ventana
+            cron._trigger(at=now + max(window, datetime.timedelta(seconds=1)))
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    def action_cancel(self):
+        """Botón: cancelar peticiones pendientes"""
+        self.filtered(lambda r: r.state == 'pending').write({'state': 'cancelled'})
+        return True
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+import datetime
+import logging
+import threading
+
+from ..tools.slotting import abc_classes, expected_blockers, plan_column
+
+_logger = logging.getLogger(__name__)
+
+
+class WmsSlotting(models.Model):
+    """
+    Optimización de slotting a partir del historial de movimientos
+
+    Puntúa cada caja por sus pickings recientes (líneas de historial con
+    destino la puerta), la clasifica en ABC y propone reordenar cada columna
+    para que las cajas más pedidas queden delante. Al aplicarla, cada columna
+    se convierte en una operación de prioridad baja para el middleware; un
+    cron las genera por bloques de columnas.
+    """
+    _name = 'wms.slotting'
+    _description = 'WMS Slotting Optimization'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: _('Slotting'))
+    rack_ids = fields.Many2many(
+        'stock.location',
+        string='Racks',
+        domain=[('is_rack', '=', True), ('is_box', '=', False)],
+        help="Racks a optimizar (vacío = todos)"
+    )
+    lookback_days = fields.Integer(string='History (days)', default=90, required=True)
+    a_share = fields.Float(string='Class A (%)', default=20.0, required=True)
+    b_share = fields.Float(string='Class B (%)', default=30.0, required=True)
+    chunk_size = fields.Integer(
+        string='Columns per Chunk',
+        default=20,
+        required=True,
+        help="Columnas que se encolan por transacción al aplicar"
+    )
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('proposed', 'Proposed'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string='State', default='draft', required=True, readonly=True)
+    line_ids = fields.One2many('wms.slotting.line', 'slotting_id', string='Relocations', readonly=True)
+    line_count = fields.Integer(string='Relocations', compute='_compute_line_count')
+    column_count = fields.Integer(string='Columns', readonly=True)
+    blockers_before = fields.Integer(
+        string='Expected Blockers (Before)',
+        readonly=True,
+        help="Cajas bloqueantes que habrían movido los pickings del periodo con el reparto actual"
+    )
+    blockers_after = fields.Integer(
+        string='Expected Blockers (After)',
+        readonly=True,
+        help="Las mismas, con el reparto propuesto"
+    )
+
+    @api.depends('line_ids')
+    def _compute_line_count(self):
+        for record in self:
+            record.line_count = len(record.line_ids)
+
+    @api.constrains('a_share', 'b_share', 'chunk_size')
+    def _check_shares(self):
+        for record in self:
+            if record.a_share < 0 or record.b_share < 0 or record.a_share + record.b_share > 100:
+                raise ValidationError(_('Class shares must be between 0 and 100%.'))
+            if record.chunk_size <= 0:
+                raise ValidationError(_('Chunk size must be positive.'))
+
+    # ========== PROPUESTA ==========
+
+    def _pick_scores(self):
+        """Pickings por caja en el periodo (agregados diarios del historial)"""
+        since = fields.Date.today() - datetime.timedelta(days=self.lookback_days)
+        groups = self.env['wms.box.move.daily']._read_group(
+            [('day', '>=', since), ('pick_count', '>', 0)],
+            ['box_id'], ['pick_count:sum'],
+        )
+        return {box.id: count for box, count in groups}
+
+    def _column_boxes(self):
+        """
+        Cajas asignadas a ubicaciones de rack, agrupadas por columna
+
+        Returns:
+            dict: {(rack_id, x, z): {box_id: (y, location_id, en su sitio)}}
+        """
+        self.env['product.box'].flush_model(['rack_location', 'parent_location', 'state'])
+        self.env['stock.location'].flush_model(['location_id', 'is_box', 'is_rack', 'active',
+                                                'pos_x', 'pos_y', 'pos_z'])
+        rack_filter = SQL("AND slot.location_id IN %s", tuple(self.rack_ids.ids)) if self.rack_ids else SQL()
+        self.env.cr.execute(SQL("""
+            SELECT box.id, slot.id, slot.location_id, slot.pos_x, slot.pos_y, slot.pos_z,
+                   box.parent_location = slot.id AND box.state = 'inlocation'
+              FROM product_box box
+              JOIN stock_location slot ON slot.id = box.rack_location
+             WHERE slot.is_box AND slot.is_rack AND slot.active %s
+        """, rack_filter))
+        columns = {}
+        for box_id, location_id, rack_id, x, y, z, in_place in self.env.cr.fetchall():
+            columns.setdefault((rack_id, x, z), {})[box_id] = (y, location_id, in_place)
+        return columns
+
+    def action_compute(self):
+        """Calcular la propuesta de reubicaciones"""
+        self.ensure_one()
+        if self.state not in ('draft', 'proposed'):
+            raise UserError(_('The proposal can only be recomputed before it is applied.'))
+
+        Location = self.env['stock.location']
+        scores = self._pick_scores()
+        columns = self._column_boxes()
+        all_boxes = {box_id: scores.get(box_id, 0) for boxes in columns.values() for box_id in boxes}
+        classes = abc_classes(all_boxes, self.a_share / 100.0, self.b_share / 100.0)
+
+        lines = []
+        before = after = planned_columns = 0
+        for (rack_id, x, z), boxes in columns.items():
+            depths = {box_id: y for box_id, (y, _loc, _in_place) in boxes.items()}
+            before += expected_blockers(depths, scores)
+            if not all(in_place for _y, _loc, in_place in boxes.values()):
+                # Columna con cajas fuera de su sitio: se deja como está
+                after += expected_blockers(depths, scores)
+                continue
+
+            grid = Location._wms_grid(rack_id)
+            slots = [
+                (y, location_id) for y, location_id in grid.column(x, z)
+                if grid.flags_of(location_id)[0] and (
+                    grid.assigned_box(location_id) in boxes
+                    or (not grid.assigned_box(location_id) and not grid.boxes_at(location_id))
+                )
+            ]
+            plan = plan_column(slots, depths, scores, classes)
+            after += expected_blockers({box_id: y for box_id, (y, _loc) in plan.items()}, scores)
+
+            moves = [(box_id, location_id) for box_id, (_y, location_id) in plan.items()
+                     if location_id != boxes[box_id][1]]
+            if moves:
+                planned_columns += 1
+            for box_id, location_id in moves:
+                lines.append({
+                    'slotting_id': self.id,
+                    'box_id': box_id,
+                    'rack_id': rack_id,
+                    'score': scores.get(box_id, 0),
+                    'abc_class': classes[box_id],
+                    'current_location_id': boxes[box_id][1],
+                    'proposed_location_id': location_id,
+                })
+
+        self.line_ids.unlink()
+        self.env['wms.slotting.line'].create(lines)
+        self.write({
+            'state': 'proposed',
+            'column_count': planned_columns,
+            'blockers_before': before,
+            'blockers_after': after,
+        })
+        _logger.info(
+            f"Slotting {self.id}: {len(lines)} reubicaciones en {planned_columns} columnas, "
+            f"cajas bloqueantes esperadas {before} → {after}"
+        )
+        return True
+
+    # ========== APLICACIÓN ==========
+
+    def action_apply(self):
+        """Encolar las reubicaciones propuestas (en segundo plano, por bloques)"""
+        self.ensure_one()
+        if self.state != 'proposed':
+            raise UserError(_('Compute the proposal first.'))
+        self.write({'state': 'running'})
+        self.env.ref('warehouse_management_system.ir_cron_wms_slotting').sudo()._trigger()
+        return True
+
+    @api.model
+    def _cron_apply(self):
+        """
+        Encolar por bloques de columnas las reubicaciones de los slottings en curso
+
+        Cada columna va en su savepoint: una columna ocupada por otra operación
+        o sin hueco en la zona dummy se salta hasta la siguiente ejecución sin
+        detener las demás.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        for job in self.search([('state', '=', 'running')], order='id'):
+            postponed = set()
+            while True:
+                pending = job.line_ids.filtered(lambda line: line.state == 'pending')
+                if not pending:
+                    job.write({'state': 'done'})
+                    break
+                columns = {}
+                for line in pending:
+                    key = (line.rack_id.id, line.current_location_id.pos_x, line.current_location_id.pos_z)
+                    if key not in postponed:
+                        columns.setdefault(key, self.env['wms.slotting.line'])
+                        columns[key] |= line
+                if not columns:
+                    break
+                for key in list(columns)[:job.chunk_size]:
+                    try:
+                        with self.env.cr.savepoint():
+                            job._queue_column(*key, columns[key])
+                    except UserError as e:
+                        # Columna bloqueada o zona dummy llena: se reintenta en la siguiente ejecución
+                        postponed.add(key)
+                        _logger.warning(f"Slotting {job.id}: columna {key} aplazada: {e}")
+                if auto_commit:
+                    self.env.cr.commit()
+
+    def _queue_column(self, rack_id, pos_x, pos_z, lines):
+        """
+        Encolar la operación de reordenación de una columna
+
+        Las líneas cuya caja ya no está en su sitio o cuya ubicación propuesta
+        dejó de estar libre se descartan. La columna queda bloqueada hasta que
+        termine la operación.
+        """
+        # Columna en uso por otra operación: UserError, se reintenta en la siguiente ejecución
+        self.env['wms.column.lock']._wms_acquire([(rack_id, pos_x, pos_z)], mode='fail')
+        Location = self.env['stock.location']
+        grid = Location._wms_grid(rack_id)
+        column_boxes = {line.box_id.id for line in lines}
+        valid = lines.filtered(lambda line: (
+            line.box_id.rack_location == line.current_location_id
+            and line.box_id.parent_location == line.current_location_id
+            and line.box_id.state == 'inlocation'
+            and grid.assigned_box(line.proposed_location_id.id) in column_boxes | {False}
+            and all(box_id in column_boxes for box_id in grid.boxes_at(line.proposed_location_id.id))
+        ))
+        (lines - valid).write({'state': 'skipped'})
+        if not valid:
+            return
+
+        targets = {line.box_id.id: line.proposed_location_id for line in valid}
+        sequence = self.env['product.box']._build_relocation_sequence(rack_id, pos_x, pos_z, targets)
+
+        # Nuevas asignaciones: primero se liberan las ubicaciones actuales
+        valid.current_location_id.write({'box_id': False})
+        for line in valid:
+            line.proposed_location_id.write({'box_id': line.box_id.id})
+            line.box_id.write({'rack_location': line.proposed_location_id.id})
+
+        first = valid[0].box_id
+        operation_data = {
+            "operation_id": self.env['wms.operation']._new_operation_id('SLOTTING', self.id, rack_id, pos_x, pos_z),
+            "operation_type": "slotting",
+            "timestamp": fields.Datetime.now().isoformat(),
+            "priority": "low",
+            "target_box": {
+                "id": first.location_identification,
+                "odoo_id": first.id,
+                "current_pos": {"x": first.pos_x, "y": first.pos_y, "z": first.pos_z},
+                "target_pos": {
+                    "x": valid[0].proposed_location_id.pos_x,
+                    "y": valid[0].proposed_location_id.pos_y,
+                    "z": valid[0].proposed_location_id.pos_z,
+                },
+            },
+            "sequence": sequence,
+        }
+        middleware = self.env['middleware.config'].get_active_config(rack_id)
+        operation = middleware.queue_operation(operation_data, box=first, columns=[(rack_id, pos_x, pos_z)])
+        valid.write({'state': 'queued', 'operation_id': operation.id})
+        _logger.info(f"Slotting {self.id}: columna ({pos_x}, {pos_z}) del rack {rack_id} encolada ({len(valid)} cajas)")
+
+
+class WmsSlottingLine(models.Model):
+    """
+    Reubicación propuesta de una caja
+    """
+    _name = 'wms.slotting.line'
+    _description = 'WMS Slotting Relocation'
+    _order = 'slotting_id, rack_id, current_location_id'
+
+    slotting_id = fields.Many2one('wms.slotting', string='Slotting', required=True, ondelete='cascade', index=True)
+    box_id = fields.Many2one('product.box', string='Box', required=True, ondelete='cascade')
+    rack_id = fields.Many2one('stock.location', string='Rack')
+    score = fields.Integer(string='Picks')
+    abc_class = fields.Selection([
+        ('A', 'A'),
+        ('B', 'B'),
+        ('C', 'C'),
+    ], string='Class')
+    current_location_id = fields.Many2one('stock.location', string='Current Location')
+    proposed_location_id = fields.Many2one('stock.location', string='Proposed Location')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('queued', 'Queued'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True)
+    operation_id = fields.Many2one('wms.operation', string='Operation', ondelete='set null')
+
+    def _wms_revert_assignment(self):
+        """
+        Deshacer la nueva asignación de las cajas de una operación fallida
+
+        Las cajas que no llegaron a su ubicación propuesta vuelven a tener
+        asignada la actual. Una caja cuya ubicación actual ya ocupa otra caja
+        que sí llegó conserva la propuesta.
+        """
+        keep = self.filtered(lambda line: line.box_id.parent_location == line.proposed_location_id)
+        revert = self - keep
+        while True:
+            blocked = revert.filtered(lambda line: line.current_location_id in keep.proposed_location_id)
+            if not blocked:
+                break
+            revert -= blocked
+            keep |= blocked
+        if not revert:
+            return
+
+        revert.proposed_location_id.filtered(lambda slot: slot.box_id in revert.box_id).write({'box_id': False})
+        for line in revert:
+            line.current_location_id.write({'box_id': line.box_id.id})
+            line.box_id.write({'rack_location': line.current_location_id.id})
+        revert.write({'state': 'failed'})
+        _logger.info(f"Slotting: {len(revert)} asignaciones deshechas por operaciones fallidas")
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from . import test_wms_performance
+from . import test_wms_column_lock
+from . import test_wms_scheduler
+from . import test_wms_routing
+from . import test_wms_lookup
+from . import test_wms_box_move_history
+from . import test_wms_box_constraints
+from . import test_wms_grid
+from . import test_wms_dummy_allocation
+from . import test_wms_outbox
+from . import test_wms_callbacks
+from . import test_wms_box_import
+from . import test_wms_metrics
+from . import test_wms_slotting
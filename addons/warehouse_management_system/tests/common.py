@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Bases de los tests y de los benchmarks del WMS
+
+WmsCommon siembra un rack pequeño con una ocupación fija, una zona dummy y
+una puerta: es la base de los tests funcionales. WmsBenchmarkCommon siembra
+en cambio un rack de tamaño configurable con cajas a una densidad dada; cada
+medición cuenta las consultas SQL y el tiempo de la acción, comprueba su
+presupuesto de consultas y emite una línea JSON (log WMS_BENCH y,
+opcionalmente, un fichero) para seguir la tendencia.
+
+Variables de entorno:
+    WMS_BENCH_RACK      dimensiones XxYxZ del rack (por defecto 10x6x4)
+    WMS_BENCH_DENSITY   fracción de ubicaciones ocupadas (por defecto 0.6)
+    WMS_BENCH_SEED      semilla del reparto de cajas (por defecto 42)
+    WMS_BENCH_OUTPUT    fichero donde añadir los resultados (JSON lines)
+
+Uso:
+    WMS_BENCH_RACK=40x10x8 WMS_BENCH_OUTPUT=/tmp/wms_bench.jsonl \\
+        odoo-bin -d bench -i warehouse_management_system --test-tags wms_benchmark --stop-after-init
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+
+def _rack_size():
+    """Dimensiones del rack sembrado (WMS_BENCH_RACK=XxYxZ)"""
+    size = os.environ.get('WMS_BENCH_RACK', '10x6x4')
+    size_x, size_y, size_z = (int(value) for value in size.lower().split('x'))
+    return size_x, size_y, size_z
+
+
+class WmsCommon(TransactionCase):
+    """
+    Rack 4x3x2 con una ocupación fija (BOX_COORDS): columna (1, 1) llena,
+    columna (2, 1) con el fondo libre, una caja suelta a media profundidad en
+    (3, 1), dos columnas de la fila z=2 con una caja delante y la columna x=4
+    vacía. Las aserciones no dependen de las variables de los benchmarks.
+    """
+
+    RACK_SIZE = (4, 3, 2)
+    BOX_COORDS = (
+        (1, 1, 1), (1, 2, 1), (1, 3, 1),
+        (2, 1, 1), (2, 2, 1),
+        (3, 2, 1),
+        (1, 1, 2), (2, 1, 2),
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.size_x, cls.size_y, cls.size_z = cls._rack_size()
+
+        Location = cls.env['stock.location']
+        cls.warehouse = cls.env.ref('stock.warehouse0')
+        stock = cls.warehouse.lot_stock_id
+        cls.door = Location.create({
+            'name': 'Puerta',
+            'location_id': stock.id,
+            'usage': 'internal',
+            'is_door': True,
+        })
+        cls.rack = Location.create({
+            'name': 'BENCH',
+            'location_id': stock.id,
+            'usage': 'internal',
+            'is_rack': True,
+        })
+        cls.rack_slots = cls.rack._wms_generate_slots(cls.size_x, cls.size_y, cls.size_z)
+        cls.dummy_zone = Location.create({
+            'name': 'BENCH-DUMMY',
+            'location_id': stock.id,
+            'usage': 'internal',
+        })
+        cls.dummy_slots = cls.dummy_zone._wms_generate_slots(
+            2, cls.size_y, cls.size_z, start=(cls.size_x + 1, 1, 1), is_dummy=True,
+        )
+
+        cls.key = cls.env['product.box.key'].create({'name': 'Benchmark', 'key': 'BEN'})
+        cls.boxes = cls._create_boxes(cls._occupied_slots())
+
+    def setUp(self):
+        super().setUp()
+        # Cada test termina con un rollback a savepoint: descartar las rejillas
+        # locales que contengan cambios de tests anteriores
+        self.env['stock.location']._wms_grid_verify()
+
+    @classmethod
+    def _rack_size(cls):
+        """Dimensiones del rack sembrado"""
+        return cls.RACK_SIZE
+
+    @classmethod
+    def _occupied_slots(cls):
+        """Ubicaciones del rack que reciben una caja"""
+        coords = set(cls.BOX_COORDS)
+        return cls.rack_slots.filtered(lambda slot: (slot.pos_x, slot.pos_y, slot.pos_z) in coords)
+
+    @classmethod
+    def _create_boxes(cls, slots):
+        """Cajas en su ubicación asignada, una por ubicación"""
+        identifiers = cls.key._reserve_identifiers(len(slots))
+        boxes = cls.env['product.box'].create([{
+            'key': cls.key.id,
+            'location_identification': identifier,
+            'parent_location': slot.id,
+            'rack_location': slot.id,
+            'pos_x': slot.pos_x,
+            'pos_y': slot.pos_y,
+            'pos_z': slot.pos_z,
+            'state': 'inlocation',
+        } for identifier, slot in zip(identifiers, slots)])
+        for box, slot in zip(boxes, slots):
+            slot.box_id = box
+        return boxes
+
+    # ========== ESCENARIOS ==========
+
+    def _slot_at(self, x, y, z):
+        """Ubicación del rack en unas coordenadas"""
+        return self.rack_slots.filtered(lambda slot: (slot.pos_x, slot.pos_y, slot.pos_z) == (x, y, z))
+
+    def _box_at(self, x, y, z):
+        """Caja sembrada en unas coordenadas del rack"""
+        return self.boxes.filtered(lambda box: (box.pos_x, box.pos_y, box.pos_z) == (x, y, z))
+
+    def _column_front(self, location):
+        """Cajas presentes por delante de una ubicación del rack"""
+        grid = self.env['stock.location']._wms_grid(self.rack.id)
+        return grid.blockers(location.pos_x, location.pos_z, location.pos_y)
+
+    def _box_with_most_blockers(self):
+        """Caja del rack con más cajas por delante (el peor picking)"""
+        return max(self.boxes, key=lambda box: (len(self._column_front(box.parent_location)), -box.id))
+
+    def _free_slot_with_most_blockers(self):
+        """Ubicación libre del rack con más cajas por delante (el peor put-in)"""
+        free = self.rack_slots.filtered(lambda slot: not slot.box_id)
+        return max(free, key=lambda slot: (len(self._column_front(slot)), -slot.id))
+
+
+
+class WmsBenchmarkCommon(WmsCommon):
+    """Rack de tamaño y densidad configurables (WMS_BENCH_*) con medición de consultas"""
+
+    @classmethod
+    def _rack_size(cls):
+        return _rack_size()
+
+    @classmethod
+    def _occupied_slots(cls):
+        cls.density = float(os.environ.get('WMS_BENCH_DENSITY', 0.6))
+        cls.rng = random.Random(int(os.environ.get('WMS_BENCH_SEED', 42)))
+        occupied = cls.rack_slots.filtered(lambda slot: cls.rng.random() < cls.density)
+        _logger.info(
+            f"Benchmark WMS: rack {cls.size_x}x{cls.size_y}x{cls.size_z}, "
+            f"{len(occupied)} cajas (densidad {cls.density})"
+        )
+        return occupied
+
+    # ========== MEDICIÓN ==========
+
+    @contextmanager
+    def benchmark(self, name, budget):
+        """
+        Medir consultas SQL y tiempo de un bloque
+
+        El bloque puede indicar en result['items'] cuántos elementos procesó;
+        el presupuesto es fijo + por elemento (budget = (fijo, por_elemento)).
+        La caché del ORM se vacía antes y las escrituras pendientes se cuentan.
+        """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        result = {'items': 1}
+        queries = self.cr.sql_log_count
+        start = time.perf_counter()
+        yield result
+        self.env.flush_all()
+        elapsed = time.perf_counter() - start
+        queries = self.cr.sql_log_count - queries
+
+        fixed, per_item = budget
+        allowed = fixed + per_item * result['items']
+        self._emit({
+            'benchmark': name,
+            'rack': f"{self.size_x}x{self.size_y}x{self.size_z}",
+            'density': self.density,
+            'boxes': len(self.boxes),
+            'items': result['items'],
+            'queries': queries,
+            'query_budget': allowed,
+            'ms': round(elapsed * 1000, 2),
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+        })
+        self.assertLessEqual(
+            queries, allowed,
+            f"{name}: {queries} consultas SQL, presupuesto {allowed} ({fixed} + {per_item} × {result['items']})"
+        )
+
+    def _emit(self, result):
+        """Emitir un resultado como línea JSON"""
+        line = json.dumps(result, sort_keys=True)
+        _logger.info(f"WMS_BENCH {line}")
+        path = os.environ.get('WMS_BENCH_OUTPUT')
+        if path:
+            with open(path, 'a', encoding='utf-8') as output:
+                output.write(line + '\n')
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsBoxConstraints(WmsCommon):
+
+    def _precommit_check(self):
+        """Comprobación de ubicaciones que se ejecuta antes del commit"""
+        self.env['product.box']._wms_check_unique_slots()
+
+    def test_in_rack_slot(self):
+        box = self.boxes[0]
+        self.assertTrue(box.in_rack_slot)
+        box.write({'parent_location': self.door.id, 'state': 'outlocation'})
+        self.assertFalse(box.in_rack_slot)
+
+    def test_occupied_slot(self):
+        box, other = self._box_at(1, 1, 1), self._box_at(2, 1, 1)
+        other.write({'parent_location': box.parent_location.id})
+        with self.assertRaises(ValidationError):
+            self._precommit_check()
+
+    def test_conflict_within_batch(self):
+        free = self.rack_slots - self.boxes.parent_location
+        boxes = self.boxes[:2]
+        boxes.write({'parent_location': self.door.id, 'state': 'outlocation'})
+        boxes.write({'parent_location': free[0].id, 'state': 'inlocation'})
+        with self.assertRaises(ValidationError):
+            self._precommit_check()
+
+    def test_swap_slots(self):
+        first, second = self._box_at(1, 1, 1), self._box_at(2, 1, 1)
+        first_slot, second_slot = first.parent_location, second.parent_location
+        first.write({'parent_location': second_slot.id})
+        self.env.flush_all()
+        second.write({'parent_location': first_slot.id})
+        self._precommit_check()
+        self.assertEqual((first.parent_location, second.parent_location), (second_slot, first_slot))
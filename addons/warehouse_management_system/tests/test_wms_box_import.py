@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import base64
+
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsBoxImport(WmsCommon):
+
+    def _job(self, lines, **vals):
+        content = '\n'.join(['location_identification,key,rack,x,y,z'] + lines) + '\n'
+        return self.env['wms.box.import'].create(dict({
+            'filename': 'boxes.csv',
+            'file': base64.b64encode(content.encode()),
+            'chunk_size': 2,
+        }, **vals))
+
+    def _imported(self, idents):
+        return self.env['product.box'].search([('location_identification', 'in', idents)])
+
+    def test_import_places_boxes(self):
+        job = self._job([
+            'IMP-1,BEN,BENCH,4,1,1',
+            'IMP-2,BEN,BENCH,1,1,1',
+            'IMP-3,BEN,,,,',
+        ])
+        job.action_start()
+        job._run()
+
+        self.assertEqual((job.state, job.processed_rows, job.imported_count, job.skipped_count), ('done', 3, 2, 1))
+        self.assertIn('location already assigned', job.error_log)
+        placed, at_door = self._imported(['IMP-1']), self._imported(['IMP-3'])
+        self.assertEqual(placed.rack_location, self._slot_at(4, 1, 1))
+        self.assertEqual((placed.parent_location, placed.state), (self._slot_at(4, 1, 1), 'inlocation'))
+        self.assertTrue(at_door.parent_location.is_door)
+        self.assertEqual(at_door.state, 'outlocation')
+        self.assertFalse(self._imported(['IMP-2']))
+
+    def test_resume_from_processed_rows(self):
+        # Bloque de las dos primeras filas ya confirmado antes de la interrupción
+        job = self._job(['RES-%d,BEN,,,,' % index for index in range(1, 6)],
+                        state='running', processed_rows=2)
+        job._run()
+
+        self.assertEqual((job.state, job.processed_rows, job.imported_count), ('done', 5, 3))
+        self.assertEqual(sorted(self._imported(['RES-%d' % index for index in range(1, 6)]).mapped(
+            'location_identification')), ['RES-3', 'RES-4', 'RES-5'])
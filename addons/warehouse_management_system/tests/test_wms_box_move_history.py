@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsBoxMoveHistory(WmsCommon):
+
+    def _history(self, box, destinations, days_ago):
+        """Líneas de historial de la caja con fecha de hace days_ago días"""
+        lines = self.env['product.box.line'].create([{
+            'box_id': box.id,
+            'source_location_id': box.parent_location.id,
+            'destination_location_id': destination.id,
+        } for destination in destinations])
+        lines.flush_model()
+        self.env.cr.execute(SQL(
+            "UPDATE product_box_line SET create_date = %s WHERE id IN %s",
+            fields.Datetime.now() - datetime.timedelta(days=days_ago), tuple(lines.ids),
+        ))
+        lines.invalidate_model()
+        return lines
+
+    def _daily(self, box):
+        rows = self.env['wms.box.move.daily'].search([('box_id', '=', box.id)])
+        return {row.location_id: (row.move_count, row.pick_count) for row in rows}
+
+    def test_rollup_is_incremental(self):
+        box = self.boxes[0]
+        self._history(box, [self.door, self.door, box.rack_location], days_ago=2)
+        Daily = self.env['wms.box.move.daily']
+
+        Daily._cron_rollup()
+        self.assertEqual(self._daily(box), {self.door: (2, 2), box.rack_location: (1, 0)})
+
+        Daily._cron_rollup()
+        self._history(box, [self.door], days_ago=2)
+        Daily._cron_rollup()
+        self.assertEqual(self._daily(box), {self.door: (3, 3), box.rack_location: (1, 0)})
+
+    def test_rollup_counts_lines_committed_late(self):
+        """Una línea con id menor que las ya agregadas, visible solo tras el agregado"""
+        box = self.boxes[0]
+        late, _early = self._history(box, [self.door, box.rack_location], days_ago=1)
+        self.env.cr.execute(SQL(
+            "DELETE FROM product_box_line WHERE id = %s RETURNING id, box_id, source_location_id, "
+            "destination_location_id, create_date", late.id,
+        ))
+        row = self.env.cr.fetchone()
+        Daily = self.env['wms.box.move.daily']
+
+        Daily._cron_rollup()
+        self.assertEqual(self._daily(box), {box.rack_location: (1, 0)})
+
+        # Su transacción confirma ahora
+        self.env.cr.execute(SQL(
+            "INSERT INTO product_box_line (id, box_id, source_location_id, destination_location_id, create_date) "
+            "VALUES %s", row,
+        ))
+        Daily._cron_rollup()
+        self.assertEqual(self._daily(box), {self.door: (1, 1), box.rack_location: (1, 0)})
+
+    def test_archive_keeps_rollups(self):
+        box = self.boxes[0]
+        old = self._history(box, [self.door, box.rack_location], days_ago=40)
+        recent = self._history(box, [self.door], days_ago=5)
+        self.env['ir.config_parameter'].sudo().set_param('wms.box_move_archive_days', 30)
+
+        self.env['wms.box.move.archive']._cron_archive()
+        self.assertEqual(box.box_move_ids, recent)
+        self.assertFalse(old.exists())
+        archived = self.env['wms.box.move.archive'].search([('box_id', '=', box.id)])
+        self.assertEqual(sorted(archived.destination_location_id.ids), sorted([self.door.id, box.rack_location.id]))
+        self.assertEqual(sum(count for count, _picks in self._daily(box).values()), 3)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from odoo.tests import HttpCase, tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsCallbacks(WmsCommon, HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = cls.env['middleware.config'].get_active_config()
+        cls.config.schedule_window = 0
+
+    def _queue_picking(self, box):
+        operation_data = box._prepare_operation_data('picking')
+        operation = self.config.queue_operation(operation_data, box=box)
+        return operation, operation_data
+
+    def _steps(self, operation_data):
+        """Callbacks completados de todos los pasos de la operación"""
+        return [{
+            'operation_id': operation_data['operation_id'],
+            'operation_type': 'picking' if step['action'] == 'deliver' else step['action'],
+            'step': step['step'],
+            'box_id': step['box_id'],
+            'status': 'completed',
+            'new_location': step['to'],
+        } for step in operation_data['sequence']]
+
+    def _post_batch(self, steps):
+        payload = {'jsonrpc': '2.0', 'method': 'call', 'params': {'steps': steps}, 'id': None}
+        response = self.url_open(
+            '/api/wms/operation/complete_batch',
+            data=json.dumps(payload),
+            headers={'Content-Type': 'application/json'},
+        )
+        self.env.invalidate_all()
+        return response
+
+    def test_batch_completes_operation(self):
+        box = self._box_at(1, 3, 1)
+        operation, operation_data = self._queue_picking(box)
+
+        response = self._post_batch(self._steps(operation_data))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['result']['success'])
+        self.assertEqual((box.parent_location, box.state), (self.door, 'outlocation'))
+        blockers = self._box_at(1, 1, 1) | self._box_at(1, 2, 1)
+        self.assertTrue(all(blockers.mapped('parent_location.is_dummy')))
+        self.assertEqual(operation.state, 'done')
+
+    def test_duplicate_batch_is_acknowledged(self):
+        box = self._box_at(1, 3, 1)
+        _operation, operation_data = self._queue_picking(box)
+        steps = self._steps(operation_data)
+        self._post_batch(steps)
+        history = self.env['product.box.line'].search_count([])
+
+        results = self._post_batch(steps).json()['result']['results']
+        self.assertTrue(all(result['success'] and result.get('duplicate') for result in results))
+        self.assertEqual(self.env['product.box.line'].search_count([]), history)
+
+    def test_failed_batch_is_rolled_back(self):
+        box = self._box_at(1, 1, 2)
+        other = self._box_at(2, 1, 2)
+        slot = box.parent_location
+        steps = [{
+            'operation_id': 'LEGACY-PICK',
+            'operation_type': 'picking',
+            'box_id': box.location_identification,
+            'status': 'completed',
+        }, {
+            # Coordenada no numérica: la escritura de la caja falla después de la anterior
+            'operation_id': 'LEGACY-PUT',
+            'operation_type': 'put_in',
+            'box_id': other.location_identification,
+            'status': 'completed',
+            'new_location': {'x': 'bad', 'y': 1, 'z': 2},
+        }]
+
+        response = self._post_batch(steps)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(box.parent_location, slot)
+        self.assertFalse(self.env['wms.operation.step'].search([('operation_ref', 'like', 'LEGACY-')]))
+
+    def test_occupied_slot_is_reported_in_response(self):
+        box = self._box_at(1, 1, 2)
+        other = self._box_at(2, 1, 2)
+        slot = other.parent_location
+        response = self._post_batch([{
+            'operation_id': 'LEGACY-CONFLICT',
+            'operation_type': 'put_in',
+            'box_id': other.location_identification,
+            'status': 'completed',
+            'new_location': {'x': 1, 'y': 1, 'z': 2},
+        }])
+
+        self.assertEqual(response.status_code, 500)
+        result = response.json()['result']
+        self.assertFalse(result['success'])
+        self.assertIn(box.location_identification, result['error'])
+        self.assertEqual(other.parent_location, slot)
+
+    def test_stepless_callbacks_of_one_operation(self):
+        boxes = self._box_at(1, 1, 2) | self._box_at(2, 1, 2)
+        steps = [{
+            'operation_id': 'LEGACY-1',
+            'operation_type': 'picking',
+            'box_id': box.location_identification,
+            'status': 'completed',
+        } for box in boxes]
+
+        results = self.env['product.box']._apply_operation_callbacks(steps)
+        self.assertTrue(all(result['success'] for result in results))
+        ledger = self.env['wms.operation.step'].search([('operation_ref', '=', 'LEGACY-1')])
+        self.assertEqual(ledger.box_id, boxes)
+
+        again = self.env['product.box']._apply_operation_callbacks(steps)
+        self.assertTrue(all(result.get('duplicate') for result in again))
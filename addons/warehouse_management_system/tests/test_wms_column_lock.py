@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsColumnLock(WmsCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['middleware.config'].get_active_config().column_lock_mode = 'fail'
+
+    def _pick(self, box):
+        operation_data = box._prepare_operation_data('picking')
+        return self.env['middleware.config'].get_active_config().queue_operation(operation_data, box=box)
+
+    def _column(self, box):
+        return (box.parent_location.location_id.id, box.pos_x, box.pos_z)
+
+    def test_same_column_is_locked(self):
+        box = self._box_at(1, 3, 1)
+        operation = self._pick(box)
+        lock = self.env['wms.column.lock'].search([('operation_id', '=', operation.id)])
+        self.assertEqual((lock.rack_id.id, lock.pos_x, lock.pos_z), self._column(box))
+
+        with self.assertRaises(UserError):
+            self._pick(self._box_at(1, 1, 1))
+
+    def test_other_columns_are_free(self):
+        self._pick(self._box_at(1, 3, 1))
+        self.assertTrue(self._pick(self._box_at(2, 1, 1)))
+
+    def test_lock_released_when_done(self):
+        box = self._box_at(1, 3, 1)
+        operation = self._pick(box)
+        operation.write({'state': 'done'})
+        self.assertFalse(self.env['wms.column.lock'].search([('operation_id', '=', operation.id)]))
+        self.assertTrue(self._pick(box))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsDummyAllocation(WmsCommon):
+
+    def _moves(self, operation_data):
+        return [step for step in operation_data['sequence'] if step['action'] == 'move_to_dummy']
+
+    def _reservations(self, boxes):
+        return self.env['stock.location']._wms_dummy_reservations(boxes.ids)
+
+    def test_blockers_get_distinct_slots(self):
+        blockers = self._box_at(1, 1, 1) | self._box_at(1, 2, 1)
+        moves = self._moves(self._box_at(1, 3, 1)._prepare_operation_data('picking'))
+
+        slots = [move['to_location_odoo_id'] for move in moves]
+        self.assertEqual([move['box_odoo_id'] for move in moves], blockers.ids)
+        self.assertEqual(len(set(slots)), 2)
+        self.assertTrue(set(slots) <= set(self.dummy_slots.ids))
+        self.assertEqual(self._reservations(blockers), dict(zip(slots, blockers.ids)))
+
+    def test_reserved_slots_are_not_reused(self):
+        first = self._moves(self._box_at(1, 3, 1)._prepare_operation_data('picking'))
+        second = self._moves(self._box_at(2, 2, 1)._prepare_operation_data('picking'))
+        self.assertEqual(len(second), 1)
+        self.assertNotIn(second[0]['to_location_odoo_id'], {move['to_location_odoo_id'] for move in first})
+
+    def test_failed_operation_releases_reservations(self):
+        box = self._box_at(1, 3, 1)
+        config = self.env['middleware.config'].get_active_config()
+        operation = config.queue_operation(box._prepare_operation_data('picking'), box=box)
+        blockers = self._box_at(1, 1, 1) | self._box_at(1, 2, 1)
+        self.assertEqual(len(self._reservations(blockers)), 2)
+
+        operation.write({'state': 'failed'})
+        self.assertFalse(self._reservations(blockers))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from ..models.stock_location import _RACK_GRIDS
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsGrid(WmsCommon):
+
+    def _grid(self):
+        return self.env['stock.location']._wms_grid(self.rack.id)
+
+    def _move_to_door(self, box):
+        box.write({'parent_location': self.door.id, 'state': 'outlocation'})
+
+    def test_grid_follows_box_moves(self):
+        box = self._box_at(1, 1, 1)
+        slot = box.parent_location
+        self.assertEqual([b for _y, _loc, b in self._grid().blockers(1, 1, 3)],
+                         (box | self._box_at(1, 2, 1)).ids)
+
+        self._move_to_door(box)
+        grid = self._grid()
+        self.assertFalse(grid.boxes_at(slot.id))
+        self.assertEqual([b for _y, _loc, b in grid.blockers(1, 1, 3)], self._box_at(1, 2, 1).ids)
+
+        box.write({'parent_location': slot.id, 'state': 'inlocation'})
+        self.assertEqual(self._grid().boxes_at(slot.id), (box.id,))
+
+    def test_touch_does_not_write_rack_row(self):
+        def rack_version():
+            self.env.cr.execute(SQL("SELECT grid_version FROM stock_location WHERE id = %s", self.rack.id))
+            return self.env.cr.fetchone()[0]
+
+        version = rack_version()
+        self._move_to_door(self._box_at(1, 1, 1))
+        self.env.flush_all()
+        self.assertEqual(rack_version(), version)
+        changes = self.env['wms.grid.change'].search([('rack_id', '=', self.rack.id)])
+        self.assertTrue(changes)
+
+    def test_savepoint_rollback_discards_local_grid(self):
+        box = self._box_at(1, 1, 1)
+        slot = box.parent_location
+        self._grid()
+        with self.assertRaises(ValueError), self.env.cr.savepoint():
+            self._move_to_door(box)
+            self.env.flush_all()
+            self.assertFalse(self._grid().boxes_at(slot.id))
+            raise ValueError
+        self.env.invalidate_all()
+
+        self.env['stock.location']._wms_grid_verify()
+        self.assertEqual(self._grid().boxes_at(slot.id), (box.id,))
+
+    def test_committed_unpublished_change_is_not_served_from_cache(self):
+        """Otra transacción confirma un movimiento y aún no ha publicado grid_version"""
+        Location = self.env['stock.location']
+        box = self._box_at(1, 1, 1)
+        slot = box.parent_location
+        self.env.flush_all()
+        data = self.env.cr.postcommit.data
+        saved = {key: data.pop(key) for key in ('wms.grid.local', 'wms.grid.changes', 'wms.grid.versions')
+                 if key in data}
+        try:
+            # Estado publicado: rejilla en caché con la versión vigente
+            self.env.cr.execute("DELETE FROM wms_grid_change")
+            self.env.cr.execute(SQL(
+                "UPDATE stock_location SET grid_version = COALESCE(grid_version, 0) + 1 WHERE id = %s",
+                self.rack.id,
+            ))
+            cached = Location._wms_grid(self.rack.id)
+            self.assertEqual(cached.boxes_at(slot.id), (box.id,))
+
+            # Commit de la otra transacción: cajas movidas y cambio anotado, sin publicar
+            self.env.cr.execute(SQL(
+                "UPDATE product_box SET parent_location = %s, state = 'outlocation' WHERE id = %s",
+                self.door.id, box.id,
+            ))
+            self.env.cr.execute(SQL(
+                "INSERT INTO wms_grid_change (rack_id, changed_at) VALUES (%s, now() at time zone 'UTC')",
+                self.rack.id,
+            ))
+            self.env.invalidate_all()
+
+            # Nueva transacción: grid_version no ha cambiado, pero la rejilla no sale de la caché
+            data.pop('wms.grid.versions', None)
+            grid = Location._wms_grid(self.rack.id)
+            self.assertIsNot(grid, cached)
+            self.assertFalse(grid.boxes_at(slot.id))
+            self.assertIs(_RACK_GRIDS[self.env.cr.dbname][self.rack.id], cached)
+        finally:
+            _RACK_GRIDS.get(self.env.cr.dbname, {}).pop(self.rack.id, None)
+            data.pop('wms.grid.versions', None)
+            data.update(saved)
+
+    def test_dummy_move_refreshes_owner_rack_only(self):
+        Location = self.env['stock.location']
+        Occupancy = self.env['wms.rack.occupancy']
+        other = Location.create({
+            'name': 'OTHER',
+            'location_id': self.rack.location_id.id,
+            'usage': 'internal',
+            'is_rack': True,
+        })
+        other_slot = other._wms_generate_slots(1, 1, 1)
+        parked_slot, free_slot = self.dummy_slots[:2]
+        self.env['product.box'].create({
+            'key': self.key.id,
+            'location_identification': 'PARKED',
+            'rack_location': other_slot.id,
+            'parent_location': parked_slot.id,
+            'state': 'inlocation',
+        })
+        Occupancy._wms_refresh_all()
+        base = Location._wms_grid(self.dummy_zone.id).copy()
+
+        self._box_at(1, 1, 1).write({'parent_location': free_slot.id, 'state': 'inlocation'})
+        self.env.flush_all()
+        owners = Occupancy._wms_dummy_owner_racks({self.rack.id, self.dummy_zone.id}, {self.dummy_zone.id: base})
+        self.assertEqual(owners, {self.rack.id})
+
+        Occupancy._wms_refresh({self.rack.id, self.dummy_zone.id} | owners)
+        summary = Occupancy.search([('rack_id', 'in', (self.rack | other).ids)])
+        self.assertEqual({row.rack_id: row.in_dummy_count for row in summary}, {self.rack: 1, other: 1})
+
+    def test_occupancy_refresh_is_queued(self):
+        Occupancy = self.env['wms.rack.occupancy']
+        Occupancy._wms_refresh_all()
+        summary = Occupancy.search([('rack_id', '=', self.rack.id)])
+        occupied = summary.occupied_count
+
+        self._move_to_door(self._box_at(1, 1, 1))
+        self.env.flush_all()
+        Occupancy._wms_refresh_touched()
+        queued = self.env['wms.rack.occupancy.queue'].search([('rack_id', '=', self.rack.id)])
+        self.assertTrue(queued)
+        self.assertEqual(summary.occupied_count, occupied)
+
+        Occupancy._cron_refresh()
+        self.assertEqual(summary.occupied_count, occupied - 1)
+        self.assertFalse(queued.exists())
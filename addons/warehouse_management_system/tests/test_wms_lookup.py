@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from odoo.tests import HttpCase, tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsLookup(WmsCommon, HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate('admin', 'admin')
+
+    def _post(self, route, params, etag=None):
+        headers = {'Content-Type': 'application/json'}
+        if etag:
+            headers['If-None-Match'] = etag
+        return self.url_open(route, data=json.dumps(params), headers=headers)
+
+    def test_boxes_lookup(self):
+        boxes = self.boxes[:3]
+        identifiers = boxes.mapped('location_identification') + ['UNKNOWN']
+        response = self._post('/api/wms/boxes/lookup', {'ids': identifiers, 'fields': ['id', 'pos_x', 'state']})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['fields'], ['id', 'pos_x', 'state'])
+        self.assertEqual(data['rows'][:3], [[box.id, box.pos_x, box.state] for box in boxes])
+        self.assertIsNone(data['rows'][3])
+
+    def test_boxes_lookup_etag(self):
+        params = {'ids': self.boxes[:2].mapped('location_identification'), 'fields': ['state']}
+        etag = self._post('/api/wms/boxes/lookup', params).headers['ETag']
+
+        self.assertEqual(self._post('/api/wms/boxes/lookup', params, etag).status_code, 304)
+        self.boxes[0].write({'state': 'outlocation'})
+        self.assertEqual(self._post('/api/wms/boxes/lookup', params, etag).status_code, 200)
+
+    def test_locations_lookup(self):
+        box = self._box_at(1, 1, 1)
+        # (9, 9, 9) queda fuera del rack 4x3x2
+        response = self.url_open(
+            '/api/wms/locations/lookup?rack_id=%d&coords=1,1,1;9,9,9&fields=box,state' % self.rack.id
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rows'], [[box.location_identification, 'inlocation'], None])
+
+    def test_unknown_field(self):
+        response = self._post('/api/wms/boxes/lookup', {'ids': ['X'], 'fields': ['name']})
+        self.assertEqual(response.status_code, 400)
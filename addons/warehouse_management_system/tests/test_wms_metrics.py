@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import HttpCase, tagged
+
+from ..models.wms_metric import _BUFFERS
+
+
+@tagged('post_install', '-at_install')
+class TestWmsMetrics(HttpCase):
+
+    def _get(self, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return self.url_open('/api/wms/metrics', headers=headers)
+
+    def test_metrics_require_configured_token(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('wms.metrics_token', False)
+        self.assertEqual(self._get().status_code, 404)
+
+        ICP.set_param('wms.metrics_token', 'secret')
+        self.assertEqual(self._get().status_code, 401)
+        self.assertEqual(self._get('wrong').status_code, 401)
+        response = self._get('secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+
+    def test_increments_reach_other_workers(self):
+        label = 'operation_type="aggregation",stage="test"'
+        # Worker A: el incremento se vuelca al terminar su transacción
+        with self.env.registry.cursor() as cr:
+            self.env(cr=cr)['wms.metric']._wms_inc(
+                'wms_errors_total', {'operation_type': 'aggregation', 'stage': 'test'})
+            cr.postcommit.run()
+        # Worker B: sin nada en memoria, la exposición lo incluye
+        _BUFFERS.pop(self.env.cr.dbname, None)
+        Metric = self.env['wms.metric']
+        self.assertIn(f'wms_errors_total{{{label}}} 1\n', Metric._wms_render())
+
+        Metric._cron_compact()
+        self.assertFalse(self.env['wms.metric.delta'].search_count([]))
+        self.assertIn(f'wms_errors_total{{{label}}} 1\n', Metric._wms_render())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsOutbox(WmsCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = cls.env['middleware.config'].get_active_config()
+        cls.config.schedule_window = 0
+
+    def _operation_data(self, box):
+        return {
+            'operation_id': self.env['wms.operation']._new_operation_id('PICKING', box.id),
+            'operation_type': 'picking',
+            'sequence': [],
+        }
+
+    def test_same_second_operations_are_distinct(self):
+        box = self._box_at(1, 1, 2)
+        first = self.config.queue_operation(self._operation_data(box), box=box)
+        second = self.config.queue_operation(self._operation_data(box), box=box)
+        self.assertNotEqual(first, second)
+        self.assertNotEqual(first.operation_id, second.operation_id)
+
+    def test_idempotency_key(self):
+        box = self._box_at(1, 1, 2)
+        first = self.config.queue_operation(self._operation_data(box), box=box, idempotency_key='client-1')
+        again = self.config.queue_operation(self._operation_data(box), box=box, idempotency_key='client-1')
+        other = self.config.queue_operation(self._operation_data(box), box=box, idempotency_key='client-2')
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, other)
+
+    def _aisle(self):
+        """Segundo rack, con su propio middleware y una caja"""
+        Location = self.env['stock.location']
+        rack = Location.create({
+            'name': 'AISLE-2',
+            'location_id': self.rack.location_id.id,
+            'usage': 'internal',
+            'is_rack': True,
+        })
+        slot = rack._wms_generate_slots(1, 1, 1)
+        box = self.env['product.box'].create({
+            'key': self.key.id,
+            'location_identification': 'AISLE-BOX',
+            'parent_location': slot.id,
+            'rack_location': slot.id,
+            'pos_x': 1, 'pos_y': 1, 'pos_z': 1,
+            'state': 'inlocation',
+        })
+        slot.box_id = box
+        config = self.env['middleware.config'].create({
+            'name': 'Aisle 2',
+            'middleware_url': 'http://localhost:8000',
+            'rack_ids': [(6, 0, rack.ids)],
+        })
+        return config, box
+
+    def test_picking_batch_schedule_window_per_config(self):
+        aisle_config, aisle_box = self._aisle()
+        aisle_config.schedule_window = 30
+        box = self._box_at(1, 1, 2)
+
+        ret = self.env['product.box'].api_picking_batch([box.location_identification, 'AISLE-BOX'])
+        direct, scheduled = ret['results']
+        self.assertEqual(ret['error'], 'OK')
+        self.assertEqual(ret['operation_ids'], [direct['operation_id']])
+        self.assertIn('request_id', scheduled)
+        self.assertEqual(self.env['wms.request'].browse(scheduled['request_id']).box_id, aisle_box)
+
+    def test_picking_batch_failure_is_per_config(self):
+        aisle_config, _aisle_box = self._aisle()
+        box = self._box_at(1, 1, 2)
+        queue_operation = type(aisle_config).queue_operation
+
+        def fail_aisle(config, *args, **kwargs):
+            if config == aisle_config:
+                raise UserError('aisle down')
+            return queue_operation(config, *args, **kwargs)
+
+        with patch.object(type(aisle_config), 'queue_operation', fail_aisle):
+            ret = self.env['product.box'].api_picking_batch([box.location_identification, 'AISLE-BOX'])
+        queued, failed = ret['results']
+        self.assertEqual(ret['error'], 'aisle down')
+        self.assertEqual(ret['operation_ids'], [queued['operation_id']])
+        self.assertEqual(failed['error'], 'aisle down')
+        operations = self.env['wms.operation'].search([('operation_id', 'in', ret['operation_ids'])])
+        self.assertEqual(operations.config_id, self.config)
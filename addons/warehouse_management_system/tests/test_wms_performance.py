@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from odoo.tests import HttpCase, tagged
+
+from .common import WmsBenchmarkCommon
+
+# Presupuesto de consultas SQL por acción: (fijo, por elemento procesado)
+# Las acciones por lotes no deben crecer con el número de cajas
+QUERY_BUDGETS = {
+    'picking_sequence': (16, 2),
+    'put_in_sequence': (16, 2),
+    'clean_up': (45, 4),
+    'box_naming': (25, 0),
+    'bulk_box_write': (20, 0),
+    'search_box': (8, 0),
+    'outside_warehouse': (6, 0),
+    'outside_export': (3, 1),
+    'callback_batch': (30, 3),
+}
+
+
+@tagged('post_install', '-at_install', 'wms_benchmark')
+class TestWmsPerformance(WmsBenchmarkCommon):
+
+    def test_picking_sequence(self):
+        box = self._box_with_most_blockers()
+        with self.benchmark('picking_sequence', QUERY_BUDGETS['picking_sequence']) as result:
+            sequence = box._build_picking_sequence()
+            result['items'] = len(sequence)
+
+        self.assertEqual(len(sequence), len(self._column_front(box.parent_location)) + 1)
+        self.assertEqual(sequence[-1]['action'], 'deliver')
+        self.assertEqual(sequence[-1]['box_odoo_id'], box.id)
+
+    def test_put_in_sequence(self):
+        slot = self._free_slot_with_most_blockers()
+        box = self.env['product.box'].create({
+            'key': self.key.id,
+            'location_identification': self.key._reserve_identifiers(1)[0],
+            'parent_location': self.door.id,
+            'rack_location': slot.id,
+            'state': 'outlocation',
+        })
+        slot.box_id = box
+
+        with self.benchmark('put_in_sequence', QUERY_BUDGETS['put_in_sequence']) as result:
+            sequence = box._build_put_in_sequence(slot)
+            result['items'] = len(sequence)
+
+        self.assertEqual(sequence[-1]['action'], 'place')
+        self.assertEqual(sequence[-1]['to'], {'x': slot.pos_x, 'y': slot.pos_y, 'z': slot.pos_z})
+
+    def test_clean_up(self):
+        moved = self.boxes[::max(len(self.boxes) // len(self.dummy_slots) + 1, 5)][:len(self.dummy_slots)]
+        for box, dummy in zip(moved, self.dummy_slots):
+            box.write({
+                'parent_location': dummy.id,
+                'pos_x': dummy.pos_x,
+                'pos_y': dummy.pos_y,
+                'pos_z': dummy.pos_z,
+                'state': 'outlocation',
+            })
+
+        with self.benchmark('clean_up', QUERY_BUDGETS['clean_up']) as result:
+            self.env['product.box'].action_clean_up()
+            result['items'] = len(moved)
+
+        operations = self.env['wms.operation'].search([('operation_type', '=', 'clean_up')])
+        returned = operations.step_ids.filtered(lambda step: step.action == 'place').box_id
+        self.assertEqual(returned & moved, moved)
+
+    def test_box_naming(self):
+        free = self.rack_slots.filtered(lambda slot: not slot.box_id)
+        count = min(len(free), 50)
+        new_boxes = self.env['product.box'].create([{
+            'key': self.key.id,
+            'location_identification': identifier,
+            'parent_location': self.door.id,
+        } for identifier in self.key._reserve_identifiers(count)])
+        wizard = self.env['box.movement.wizard'].create({'assignment_strategy': 'rack'})
+
+        with self.benchmark('box_naming', QUERY_BUDGETS['box_naming']) as result:
+            wizard.action_box_naming()
+            result['items'] = count
+
+        self.assertTrue(all(new_boxes.mapped('rack_location')))
+
+    def test_bulk_box_write(self):
+        """Escritura de todas las cajas en un lote: las validaciones no crecen con el lote"""
+        with self.benchmark('bulk_box_write', QUERY_BUDGETS['bulk_box_write']) as result:
+            self.boxes.write({'parent_location': self.door.id, 'state': 'outlocation'})
+            result['items'] = len(self.boxes)
+
+        self.assertFalse(any(self.boxes.mapped('in_rack_slot')))
+
+    def test_search_box(self):
+        box = self.boxes[len(self.boxes) // 2]
+        wizard = self.env['box.movement.wizard'].create({
+            'rack_id': self.rack.id,
+            'x_coordinate': box.pos_x,
+            'y_coordinate': box.pos_y,
+            'z_coordinate': box.pos_z,
+        })
+
+        with self.benchmark('search_box', QUERY_BUDGETS['search_box']):
+            action = wizard.action_search_box()
+
+        self.assertIn(box.location_identification, action['params']['message'])
+
+    def test_outside_warehouse(self):
+        customers = self.env.ref('stock.stock_location_customers')
+        outside = self.boxes[::5]
+        outside.write({'parent_location': customers.id, 'state': 'outlocation'})
+        wizard = self.env['box.movement.wizard'].create({})
+
+        with self.benchmark('outside_warehouse', QUERY_BUDGETS['outside_warehouse']) as result:
+            action = wizard.action_outside_warehouse()
+            result['items'] = len(outside)
+
+        self.assertEqual(action['res_model'], 'product.box')
+        self.assertEqual(self.env['product.box'].search_count(action['domain']), len(outside))
+
+    def test_outside_export(self):
+        customers = self.env.ref('stock.stock_location_customers')
+        outside = self.boxes[::3]
+        outside.write({'parent_location': customers.id, 'state': 'outlocation'})
+        chunk_size = max(len(outside) // 4, 1)
+
+        # Una consulta por bloque, nunca más de chunk_size cajas en memoria
+        with self.benchmark('outside_export', QUERY_BUDGETS['outside_export']) as result:
+            chunks = [len(rows) for rows in self.env['product.box']._wms_outside_chunks(chunk_size)]
+            result['items'] = len(chunks)
+
+        self.assertEqual(sum(chunks), len(outside))
+        self.assertLessEqual(max(chunks), chunk_size)
+
+
+@tagged('post_install', '-at_install', 'wms_benchmark')
+class TestWmsCallbackPerformance(WmsBenchmarkCommon, HttpCase):
+
+    def test_callback_batch(self):
+        box = self._box_with_most_blockers()
+        operation_data = box._prepare_operation_data('picking')
+        self.env['middleware.config'].get_active_config().queue_operation(operation_data, box=box)
+        steps = [{
+            'operation_id': operation_data['operation_id'],
+            'operation_type': 'picking' if step['action'] == 'deliver' else step['action'],
+            'step': step['step'],
+            'box_id': step['box_id'],
+            'status': 'completed',
+            'new_location': step['to'],
+        } for step in operation_data['sequence']]
+        payload = {'jsonrpc': '2.0', 'method': 'call', 'params': {'steps': steps}, 'id': None}
+
+        with self.benchmark('callback_batch', QUERY_BUDGETS['callback_batch']) as result:
+            response = self.url_open(
+                '/api/wms/operation/complete_batch',
+                data=json.dumps(payload),
+                headers={'Content-Type': 'application/json'},
+            )
+            result['items'] = len(steps)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['result']['success'])
+        self.env.invalidate_all()
+        self.assertEqual(box.parent_location, self.door)
+        self.assertEqual(box.state, 'outlocation')
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from odoo import Command
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsRouting(WmsCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Config = cls.env['middleware.config']
+        cls.default = Config.get_active_config()
+        cls.default.schedule_window = 0
+        cls.aisle = Config.create({
+            'name': 'Aisle 2',
+            'middleware_url': 'http://localhost:8002',
+            'rack_ids': [Command.set(cls.rack.ids)],
+            'schedule_window': 0,
+        })
+
+    def test_route_by_rack(self):
+        Config = self.env['middleware.config']
+        self.assertEqual(Config.get_active_config(self.rack.id), self.aisle)
+        self.assertEqual(Config.get_active_config(), self.default)
+        self.assertEqual(Config.get_active_config(self.dummy_zone.id), self.default)
+
+    def test_rack_bound_once(self):
+        with self.assertRaises(UserError):
+            self.env['middleware.config'].create({
+                'name': 'Aisle 2 bis',
+                'middleware_url': 'http://localhost:8003',
+                'rack_ids': [Command.set(self.rack.ids)],
+            })
+
+    def test_operations_dispatched_per_middleware(self):
+        box = self._box_at(1, 3, 1)
+        box.action_move()
+        operation = self.env['wms.operation'].search([('box_id', '=', box.id)])
+        self.assertEqual(operation.config_id, self.aisle)
+
+        other = self.env['wms.operation'].create({
+            'operation_id': 'TEST-DEFAULT',
+            'operation_type': 'picking',
+            'config_id': self.default.id,
+            'payload': '{}',
+        })
+        plans = (operation | other)._dispatch_plan()
+        self.assertEqual(plans, {self.aisle.id: operation.ids, self.default.id: other.ids})
+
+    def test_health_status(self):
+        self.aisle._record_health(Exception('timeout'))
+        self.assertEqual(self.aisle.health_status, 'degraded')
+        self.aisle._record_health(Exception('timeout'))
+        self.aisle._record_health(Exception('timeout'))
+        self.assertEqual(self.aisle.health_status, 'down')
+        self.aisle._record_health()
+        self.assertEqual(self.aisle.health_status, 'healthy')
+        self.assertEqual(self.default.health_status, 'unknown')
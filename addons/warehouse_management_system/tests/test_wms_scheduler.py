@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsScheduler(WmsCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = cls.env['middleware.config'].get_active_config()
+        cls.config.schedule_window = 60
+
+    def _submit(self, boxes, priority='normal'):
+        return self.env['wms.request']._wms_submit(boxes, 'picking', priority)
+
+    def test_action_move_is_scheduled(self):
+        box = self._box_at(1, 3, 1)
+        box.action_move()
+        box.action_move()
+        request = self.env['wms.request'].search([('box_id', '=', box.id)])
+        self.assertEqual(len(request), 1)
+        self.assertEqual(request.state, 'pending')
+        self.assertFalse(self.env['wms.operation'].search([('box_id', '=', box.id)]))
+
+    def test_same_column_is_merged(self):
+        box = self._box_at(1, 3, 1)
+        front_box = self._box_at(1, 1, 1)
+        requests = self._submit(box | front_box)
+
+        operations = requests._wms_plan()
+        self.assertEqual(len(operations), 1)
+        self.assertEqual(requests.mapped('state'), ['planned', 'planned'])
+        moves = operations.step_ids.filtered(lambda step: step.action == 'move_to_dummy')
+        delivers = operations.step_ids.filtered(lambda step: step.action == 'deliver')
+        self.assertEqual(moves.box_id, self._box_at(1, 2, 1))
+        self.assertEqual(delivers.box_id, box | front_box)
+
+    def test_priority_order(self):
+        normal = self._box_at(3, 2, 1)
+        high = self._box_at(1, 1, 2)
+        requests = self._submit(normal) | self._submit(high, priority='high')
+
+        operations = requests._wms_plan()
+        operations = operations.sorted('id')
+        self.assertEqual(operations.box_id.ids, [high.id, normal.id])
+        self.assertEqual(operations[0].priority, 'high')
+
+    def test_clean_up_yields_to_pending_requests(self):
+        box = self._box_at(1, 3, 1)
+        operation = self.config.queue_operation(box._prepare_operation_data('picking', priority='low'), box=box)
+        self.assertFalse(operation._live_configs())
+
+        self._submit(self._box_at(2, 1, 1))
+        self.assertEqual(operation._live_configs(), {self.config.id})
+        self.assertFalse(operation._awaited_operations())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from .common import WmsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWmsSlotting(WmsCommon):
+
+    def _job(self, moves):
+        """Slotting en curso con las reubicaciones (caja, ubicación propuesta)"""
+        job = self.env['wms.slotting'].create({'name': 'Test', 'state': 'running'})
+        self.env['wms.slotting.line'].create([{
+            'slotting_id': job.id,
+            'box_id': box.id,
+            'rack_id': self.rack.id,
+            'current_location_id': box.rack_location.id,
+            'proposed_location_id': target.id,
+        } for box, target in moves])
+        return job
+
+    def _line(self, job, box):
+        return job.line_ids.filtered(lambda line: line.box_id == box)
+
+    def test_busy_column_does_not_stop_job(self):
+        first, second, third = self._box_at(2, 1, 1), self._box_at(2, 2, 1), self._box_at(3, 2, 1)
+        # Columna (2, 1) en uso por un picking
+        operation_data = second._prepare_operation_data('picking')
+        self.env['middleware.config'].get_active_config().queue_operation(operation_data, box=second)
+        job = self._job([
+            (first, second.rack_location),
+            (second, first.rack_location),
+            (third, self._slot_at(3, 1, 1)),
+        ])
+
+        self.env['wms.slotting']._cron_apply()
+        self.assertEqual(self._line(job, third).state, 'queued')
+        self.assertEqual((self._line(job, first) | self._line(job, second)).mapped('state'), ['pending', 'pending'])
+        self.assertEqual(job.state, 'running')
+
+    def test_failed_operation_reverts_assignment(self):
+        box = self._box_at(3, 2, 1)
+        current, proposed = box.rack_location, self._slot_at(3, 1, 1)
+        job = self._job([(box, proposed)])
+        self.env['wms.slotting']._cron_apply()
+        line = job.line_ids
+        self.assertEqual((line.state, box.rack_location), ('queued', proposed))
+
+        line.operation_id.write({'state': 'failed'})
+        self.assertEqual(line.state, 'failed')
+        self.assertEqual(box.rack_location, current)
+        self.assertEqual((current.box_id, proposed.box_id), (box, self.env['product.box']))
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from . import rack_grid
+from . import dummy_allocation
+from . import box_assignment
+from . import slotting
+from . import metrics
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Asignación masiva de cajas a ubicaciones libres del rack
+
+Empareja en memoria las cajas sin ubicación asignada con las ubicaciones
+libres según una estrategia. No depende de Odoo: el modelo ``product.box``
+obtiene los datos con una consulta por tabla y aplica el resultado por lotes.
+"""
+
+from .dummy_allocation import crane_travel
+
+# Posición de la puerta (destino del picking)
+DOOR_POSITION = (0, 0, 0)
+
+STRATEGIES = {
+    # Rack a rack, en el orden de creación de las ubicaciones
+    'rack': lambda location_id, rack_id, coords: (rack_id, location_id),
+    # Columna a columna, empezando por el fondo (Y mayor) para no bloquear las cajas ya colocadas
+    'depth': lambda location_id, rack_id, coords: (rack_id, coords[0], coords[2], -coords[1], location_id),
+    # Primero las ubicaciones con menor recorrido de la grúa desde la puerta
+    'door': lambda location_id, rack_id, coords: (crane_travel(DOOR_POSITION, coords), location_id),
+}
+
+
+def assign_boxes(box_ids, slots, strategy='rack'):
+    """
+    Emparejar cajas y ubicaciones libres
+
+    Args:
+        box_ids: ids de las cajas, en el orden en que deben recibir ubicación
+        slots: iterable de (location_id, rack_id, (x, y, z)) libres
+        strategy: clave de STRATEGIES
+
+    Returns:
+        list: [(box_id, location_id)]; las cajas sobrantes quedan sin ubicación
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Estrategia de asignación desconocida: {strategy}")
+    key = STRATEGIES[strategy]
+    ordered = sorted(slots, key=lambda slot: key(*slot))
+    return [(box_id, slot[0]) for box_id, slot in zip(box_ids, ordered)]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Asignación de ubicaciones dummy para cajas bloqueantes
+
+Cada caja bloqueante recibe una ubicación dummy libre distinta, la más
+cercana a la columna de origen, respetando la capacidad de cada zona dummy.
+No depende de Odoo para poder usarse también desde los benchmarks.
+"""
+
+
+def crane_travel(origin, target):
+    """
+    Distancia recorrida por la grúa entre dos posiciones (x, y, z)
+    (suma de desplazamientos por eje)
+    """
+    return sum(abs((a or 0) - (b or 0)) for a, b in zip(origin, target))
+
+
+def _xyz(position):
+    return (position.get('x') or 0, position.get('y') or 0, position.get('z') or 0)
+
+
+def sequence_travel(sequence, start=(0, 0, 0)):
+    """
+    Recorrido total de la grúa para ejecutar una secuencia de movimientos
+
+    Por cada paso la grúa viaja en vacío hasta el origen y cargada hasta el destino.
+    """
+    position = start
+    total = 0
+    for step in sequence:
+        source, target = _xyz(step['from']), _xyz(step['to'])
+        total += crane_travel(position, source) + crane_travel(source, target)
+        position = target
+    return total
+
+
+class DummyAllocator:
+    """
+    Reparto de ubicaciones dummy libres dentro de un mismo plan
+    """
+
+    def __init__(self, slots, capacity=None):
+        """
+        Args:
+            slots: iterable de (location_id, (x, y, z), zone_id) libres
+            capacity: {zone_id: cajas que aún admite la zona}; None = sin límite
+        """
+        self._slots = {location_id: (coords, zone_id) for location_id, coords, zone_id in slots}
+        self._capacity = dict(capacity or {})
+        self.allocations = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def allocate(self, source, box_id=None):
+        """
+        Reservar la ubicación dummy libre más cercana a source
+
+        Returns:
+            tuple: (location_id, (x, y, z)) o None si no queda espacio
+        """
+        best = None
+        for location_id, (coords, zone_id) in self._slots.items():
+            if self._capacity.get(zone_id) is not None and self._capacity[zone_id] <= 0:
+                continue
+            key = (crane_travel(source, coords), location_id)
+            if best is None or key < best[0]:
+                best = (key, location_id)
+        if best is None:
+            return None
+
+        location_id = best[1]
+        coords, zone_id = self._slots.pop(location_id)
+        if self._capacity.get(zone_id) is not None:
+            self._capacity[zone_id] -= 1
+        self.allocations[location_id] = box_id
+        return location_id, coords
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas del WMS en formato Prometheus
+
+Cada worker acumula en memoria los incrementos de contadores e histogramas
+(MetricsBuffer) y los vuelca periódicamente a base de datos sumándolos a los
+de los demás workers, así la exposición agrega todo el servidor. Todas las
+series son aditivas: un histograma son sus series _bucket, _sum y _count.
+No depende de Odoo.
+"""
+
+import math
+import threading
+import time
+
+# Límites de los histogramas de duración (segundos)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Límites de los histogramas de recuento (pasos, cajas bloqueantes)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def label_string(labels):
+    """Etiquetas en forma canónica: k1="v1",k2="v2" (ordenadas)"""
+    if not labels:
+        return ''
+    return ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())
+    )
+
+
+def _format_bound(bound):
+    return '+Inf' if math.isinf(bound) else repr(float(bound))
+
+
+class MetricsBuffer:
+    """Incrementos pendientes de volcar de un worker (seguro entre hilos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self.last_flush = time.monotonic()
+
+    def inc(self, name, labels=None, value=1.0):
+        """Sumar value a un contador"""
+        key = (name, label_string(labels))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + value
+
+    def observe(self, name, value, labels=None, buckets=DURATION_BUCKETS):
+        """Registrar una observación en un histograma"""
+        labels = dict(labels or {})
+        series = [(f'{name}_sum', label_string(labels), value), (f'{name}_count', label_string(labels), 1.0)]
+        for bound in tuple(buckets) + (math.inf,):
+            if value <= bound:
+                series.append((f'{name}_bucket', label_string(dict(labels, le=_format_bound(bound))), 1.0))
+        with self._lock:
+            for series_name, series_labels, delta in series:
+                key = (series_name, series_labels)
+                self._series[key] = self._series.get(key, 0.0) + delta
+
+    def due(self, interval):
+        """Hay incrementos y han pasado interval segundos desde el último volcado"""
+        return bool(self._series) and time.monotonic() - self.last_flush >= interval
+
+    def drain(self):
+        """Extraer y vaciar los incrementos pendientes: {(nombre, etiquetas): delta}"""
+        with self._lock:
+            series, self._series = self._series, {}
+            self.last_flush = time.monotonic()
+        return series
+
+    def restore(self, series):
+        """Devolver incrementos que no se pudieron volcar"""
+        with self._lock:
+            for key, delta in series.items():
+                self._series[key] = self._series.get(key, 0.0) + delta
+
+
+def _family(name, descriptions):
+    """Familia de una serie (sin el sufijo _bucket / _sum / _count de los histogramas)"""
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in descriptions:
+            return name[:-len(suffix)]
+    return name
+
+
+def _sort_key(series, descriptions):
+    """Orden de exposición: familia, etiquetas y límites le de menor a mayor"""
+    name, labels, _value = series
+    parts = labels.split(',') if labels else []
+    bound = next((part[4:-1] for part in parts if part.startswith('le="')), None)
+    others = ','.join(part for part in parts if not part.startswith('le="'))
+    return (_family(name, descriptions), others, name, float(bound) if bound else 0.0)
+
+
+def render(series, descriptions):
+    """
+    Exposición en texto de Prometheus
+
+    Args:
+        series: [(nombre, etiquetas, valor)]
+        descriptions: {familia: (tipo, ayuda)}
+
+    Returns:
+        str: texto de exposición
+    """
+    lines = []
+    announced = set()
+    for name, labels, value in sorted(series, key=lambda item: _sort_key(item, descriptions)):
+        family = _family(name, descriptions)
+        if family not in announced and family in descriptions:
+            metric_type, help_text = descriptions[family]
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {metric_type}')
+            announced.add(family)
+        value = int(value) if float(value).is_integer() else value
+        lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
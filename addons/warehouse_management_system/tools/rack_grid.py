@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Índice en memoria de ocupación de un rack (o zona dummy)
+
+Un RackGrid representa todas las ubicaciones ``is_box`` hijas de un mismo
+contenedor (``stock.location.location_id``) indexadas por coordenadas, junto
+con las cajas que ocupan cada una. No depende de Odoo: el modelo
+``stock.location`` se encarga de construirlo, versionarlo y mantenerlo.
+"""
+
+import bisect
+
+
+class RackGrid:
+    """
+    Rejilla de ocupación (x, y, z) -> ubicación -> cajas de un contenedor
+    """
+    __slots__ = (
+        'rack_id', 'version',
+        '_slots', '_coords', '_flags', '_assigned',
+        '_slot_boxes', '_boxes', '_columns',
+    )
+
+    def __init__(self, rack_id, version=0):
+        self.rack_id = rack_id
+        self.version = version
+        self._slots = {}        # (x, y, z) -> location_id
+        self._coords = {}       # location_id -> (x, y, z)
+        self._flags = {}        # location_id -> (is_rack, is_dummy)
+        self._assigned = {}     # location_id -> box_id asignado (stock.location.box_id)
+        self._slot_boxes = {}   # location_id -> set(box_id) presentes físicamente
+        self._boxes = {}        # box_id -> (location_id, state)
+        self._columns = {}      # (x, z) -> lista ordenada de y
+
+    def __len__(self):
+        return len(self._coords)
+
+    def __contains__(self, location_id):
+        return location_id in self._coords
+
+    def copy(self, version=None):
+        """Copia independiente (para cambios todavía no confirmados)"""
+        grid = RackGrid(self.rack_id, self.version if version is None else version)
+        grid._slots = dict(self._slots)
+        grid._coords = dict(self._coords)
+        grid._flags = dict(self._flags)
+        grid._assigned = dict(self._assigned)
+        grid._slot_boxes = {loc: set(boxes) for loc, boxes in self._slot_boxes.items()}
+        grid._boxes = dict(self._boxes)
+        grid._columns = {col: list(ys) for col, ys in self._columns.items()}
+        return grid
+
+    # ========== MUTACIONES ==========
+
+    def add_slot(self, location_id, x, y, z, is_rack=False, is_dummy=False, assigned_box_id=False):
+        """Registrar (o mover) una ubicación dentro de la rejilla"""
+        x, y, z = x or 0, y or 0, z or 0
+        boxes = self._slot_boxes.get(location_id)
+        if location_id in self._coords:
+            self.remove_slot(location_id, keep_boxes=True)
+        if (x, y, z) not in self._slots:
+            bisect.insort(self._columns.setdefault((x, z), []), y)
+        self._slots[(x, y, z)] = location_id
+        self._coords[location_id] = (x, y, z)
+        self._flags[location_id] = (bool(is_rack), bool(is_dummy))
+        if assigned_box_id:
+            self._assigned[location_id] = assigned_box_id
+        if boxes:
+            self._slot_boxes[location_id] = boxes
+
+    def remove_slot(self, location_id, keep_boxes=False):
+        """Quitar una ubicación de la rejilla"""
+        coords = self._coords.pop(location_id, None)
+        if coords is None:
+            return
+        x, y, z = coords
+        if self._slots.get(coords) == location_id:
+            del self._slots[coords]
+            ys = self._columns.get((x, z))
+            if ys:
+                idx = bisect.bisect_left(ys, y)
+                if idx < len(ys) and ys[idx] == y:
+                    ys.pop(idx)
+                if not ys:
+                    del self._columns[(x, z)]
+        self._flags.pop(location_id, None)
+        self._assigned.pop(location_id, None)
+        if not keep_boxes:
+            for box_id in self._slot_boxes.pop(location_id, ()):
+                self._boxes.pop(box_id, None)
+
+    def set_assigned(self, location_id, box_id):
+        """Actualizar la caja asignada (stock.location.box_id) de una ubicación"""
+        if location_id not in self._coords:
+            return
+        if box_id:
+            self._assigned[location_id] = box_id
+        else:
+            self._assigned.pop(location_id, None)
+
+    def place_box(self, box_id, location_id, state):
+        """
+        Registrar la posición actual de una caja
+
+        Si location_id no pertenece a la rejilla la caja simplemente sale de ella.
+        """
+        self.remove_box(box_id)
+        if location_id in self._coords:
+            self._boxes[box_id] = (location_id, state)
+            self._slot_boxes.setdefault(location_id, set()).add(box_id)
+
+    def remove_box(self, box_id):
+        """Quitar una caja de la rejilla"""
+        previous = self._boxes.pop(box_id, None)
+        if previous:
+            boxes = self._slot_boxes.get(previous[0])
+            if boxes:
+                boxes.discard(box_id)
+                if not boxes:
+                    del self._slot_boxes[previous[0]]
+
+    # ========== CONSULTAS ==========
+
+    def slot_at(self, x, y, z):
+        """Ubicación en las coordenadas dadas (o False)"""
+        return self._slots.get((x or 0, y or 0, z or 0), False)
+
+    def coords_of(self, location_id):
+        """Coordenadas (x, y, z) de una ubicación (o None)"""
+        return self._coords.get(location_id)
+
+    def flags_of(self, location_id):
+        """Tupla (is_rack, is_dummy) de una ubicación"""
+        return self._flags.get(location_id, (False, False))
+
+    def assigned_box(self, location_id):
+        """Caja asignada a la ubicación (stock.location.box_id)"""
+        return self._assigned.get(location_id, False)
+
+    def slots_assigned_to(self, box_ids):
+        """{location_id: box_id} de las ubicaciones asignadas a alguna de las cajas"""
+        return {loc: box for loc, box in self._assigned.items() if box in box_ids}
+
+    def boxes_at(self, location_id):
+        """Cajas presentes físicamente en la ubicación"""
+        return tuple(sorted(self._slot_boxes.get(location_id, ())))
+
+    def box_at(self, x, y, z, state=None):
+        """Primera caja presente en las coordenadas (opcionalmente filtrada por estado)"""
+        location_id = self.slot_at(x, y, z)
+        for box_id in self.boxes_at(location_id):
+            if state is None or self._boxes[box_id][1] == state:
+                return box_id
+        return False
+
+    def box_location(self, box_id):
+        """Tupla (location_id, state) de una caja o None"""
+        return self._boxes.get(box_id)
+
+    def columns(self):
+        """Columnas (x, z) con al menos una ubicación"""
+        return list(self._columns)
+
+    def column(self, x, z):
+        """Lista [(y, location_id)] de la columna (x, z) ordenada por profundidad"""
+        return [(y, self._slots[(x, y, z)]) for y in self._columns.get((x, z), ())]
+
+    def blockers(self, x, z, y, state='inlocation'):
+        """
+        Cajas que bloquean el acceso a la profundidad y de la columna (x, z)
+
+        Returns:
+            list: [(y, location_id, box_id)] ordenado por y ascendente
+        """
+        result = []
+        ys = self._columns.get((x, z), ())
+        for depth in ys[:bisect.bisect_left(ys, y)]:
+            location_id = self._slots[(x, depth, z)]
+            for box_id in self.boxes_at(location_id):
+                if state is None or self._boxes[box_id][1] == state:
+                    result.append((depth, location_id, box_id))
+        return result
+
+    def free_slots(self):
+        """Ubicaciones sin cajas presentes ni caja asignada, ordenadas por coordenadas"""
+        return [
+            self._slots[coords] for coords in sorted(self._slots)
+            if self._slots[coords] not in self._slot_boxes
+            and self._slots[coords] not in self._assigned
+        ]
+
+    def occupied_count(self):
+        """Número de ubicaciones con al menos una caja"""
+        return len(self._slot_boxes)
+
+    def box_ids(self):
+        """Cajas presentes físicamente en la rejilla"""
+        return list(self._boxes)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Slotting: reordenar las cajas de cada columna según su popularidad
+
+El coste de un picking es el número de cajas por delante (Y menor) en la
+misma columna, así que las cajas más pedidas deben ocupar las posiciones
+delanteras. Las cajas se clasifican en clases ABC por número de pickings y
+dentro de cada columna se reparten las profundidades por clase y puntuación.
+No depende de Odoo para poder usarse también desde los benchmarks.
+"""
+
+ABC_RANK = {'A': 0, 'B': 1, 'C': 2}
+
+
+def abc_classes(scores, a_share=0.2, b_share=0.3):
+    """
+    Clasificar cajas por popularidad
+
+    Args:
+        scores: {box_id: número de pickings}
+        a_share: fracción de cajas (las más pedidas) en clase A
+        b_share: fracción siguiente en clase B; el resto, y las cajas sin pickings, en C
+
+    Returns:
+        dict: {box_id: 'A' | 'B' | 'C'}
+    """
+    ranked = sorted((box_id for box_id, score in scores.items() if score > 0),
+                    key=lambda box_id: (-scores[box_id], box_id))
+    a_count = int(round(len(scores) * a_share))
+    b_count = int(round(len(scores) * b_share))
+    classes = {box_id: 'C' for box_id in scores}
+    for index, box_id in enumerate(ranked):
+        if index < a_count:
+            classes[box_id] = 'A'
+        elif index < a_count + b_count:
+            classes[box_id] = 'B'
+    return classes
+
+
+def plan_column(slots, boxes, scores, classes):
+    """
+    Nuevo reparto de las ubicaciones de una columna
+
+    Args:
+        slots: [(y, location_id)] ubicaciones disponibles de la columna
+               (libres o asignadas a las cajas de la columna)
+        boxes: {box_id: y actual}
+        scores / classes: popularidad y clase ABC de cada caja
+
+    Returns:
+        dict: {box_id: (y, location_id)} nueva ubicación de cada caja
+    """
+    ordered_boxes = sorted(boxes, key=lambda box_id: (
+        ABC_RANK[classes.get(box_id, 'C')], -scores.get(box_id, 0), boxes[box_id], box_id,
+    ))
+    return dict(zip(ordered_boxes, sorted(slots)))
+
+
+def expected_blockers(depths, scores):
+    """
+    Cajas bloqueantes esperadas para los pickings de una columna
+
+    Args:
+        depths: {box_id: y}
+        scores: {box_id: número de pickings}
+
+    Returns:
+        int: suma, para cada caja, de sus pickings por las cajas que tiene delante
+    """
+    ordered = sorted(depths.values())
+    total = 0
+    for box_id, y in depths.items():
+        in_front = sum(1 for other in ordered if other < y)
+        total += scores.get(box_id, 0) * in_front
+    return total
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: planes de consulta de las búsquedas por coordenadas del WMS
+
+Siembra en un esquema temporal de PostgreSQL las columnas de stock_location y
+product_box que usa el módulo, con 10k, 100k y 1M ubicaciones, y registra el
+plan (EXPLAIN ANALYZE) y el tiempo de cada búsqueda con y sin los índices
+declarados en los modelos (_wms_*_idx). El esquema se elimina al terminar.
+
+Uso:
+    pip install psycopg2-binary
+    python benchmarks/bench_coordinate_queries.py --dsn "dbname=bench" [--sizes 10000,100000,1000000]
+
+Cada resultado se imprime como una línea JSON (apto para seguimiento de tendencias).
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import psycopg2
+
+SCHEMA = 'wms_bench'
+
+TABLES = """
+    CREATE TABLE stock_location (
+        id serial PRIMARY KEY,
+        location_id integer,
+        name varchar,
+        usage varchar DEFAULT 'internal',
+        active boolean DEFAULT true,
+        is_box boolean,
+        is_rack boolean,
+        is_dummy boolean,
+        box_id integer,
+        pos_x integer,
+        pos_y integer,
+        pos_z integer,
+        grid_version integer DEFAULT 0
+    );
+    CREATE TABLE product_box (
+        id serial PRIMARY KEY,
+        location_identification varchar,
+        parent_location integer,
+        rack_location integer,
+        pos_x integer,
+        pos_y integer,
+        pos_z integer,
+        state varchar
+    );
+    CREATE INDEX ON product_box (location_identification);
+"""
+
+# Mismas definiciones que los models.Index de stock_location.py y product_box.py
+INDEXES = [
+    "CREATE INDEX ON stock_location (location_id, pos_x, pos_z, pos_y) WHERE is_box",
+    "CREATE INDEX ON stock_location (pos_x, pos_y, pos_z) WHERE is_box",
+    "CREATE INDEX ON stock_location (location_id, id) WHERE is_box AND box_id IS NULL",
+    "CREATE INDEX ON stock_location (box_id) WHERE box_id IS NOT NULL",
+    "CREATE INDEX ON stock_location (id, grid_version) WHERE grid_version > 0",
+    "CREATE INDEX ON product_box (pos_x, pos_z, pos_y) WHERE state = 'inlocation'",
+    "CREATE INDEX ON product_box (parent_location, state)",
+    "CREATE INDEX ON product_box (rack_location) WHERE rack_location IS NOT NULL",
+]
+
+# Racks de 40 x 6 x 12 ubicaciones; zona dummy de 2 columnas por rack
+RACK_X, RACK_Y, RACK_Z = 40, 6, 12
+
+
+def seed(cr, size, density):
+    """Sembrar size ubicaciones de rack (más sus zonas dummy) y cajas con la densidad dada"""
+    slots_per_rack = RACK_X * RACK_Y * RACK_Z
+    racks = max(size // slots_per_rack, 1)
+    cr.execute(f"""
+        INSERT INTO stock_location (id, name, is_rack, grid_version)
+        SELECT r, 'Rack-' || r, true, 1 FROM generate_series(1, {racks}) r;
+        INSERT INTO stock_location (id, name, is_dummy, grid_version)
+        SELECT {racks} + r, 'Dummy-' || r, true, 1 FROM generate_series(1, {racks}) r;
+        SELECT setval('stock_location_id_seq', {2 * racks});
+
+        INSERT INTO stock_location (location_id, name, is_box, is_rack, is_dummy, pos_x, pos_y, pos_z)
+        SELECT 1 + (n / {slots_per_rack}), 'S' || n, true, true, false,
+               1 + (n % {RACK_X}), 1 + (n / {RACK_X}) % {RACK_Y}, 1 + (n / ({RACK_X} * {RACK_Y})) % {RACK_Z}
+          FROM generate_series(0, {racks * slots_per_rack} - 1) n;
+
+        INSERT INTO stock_location (location_id, name, is_box, is_rack, is_dummy, pos_x, pos_y, pos_z)
+        SELECT {racks} + 1 + (n / ({RACK_Y} * {RACK_Z} * 2)), 'D' || n, true, false, true,
+               CASE WHEN n % 2 = 0 THEN 0 ELSE {RACK_X} + 1 END,
+               1 + (n / 2) % {RACK_Y}, 1 + (n / (2 * {RACK_Y})) % {RACK_Z}
+          FROM generate_series(0, {racks * RACK_Y * RACK_Z * 2} - 1) n;
+
+        INSERT INTO product_box (location_identification, parent_location, rack_location,
+                                 pos_x, pos_y, pos_z, state)
+        SELECT 'QBE1' || lpad(l.id::text, 9, '0'), l.id, l.id, l.pos_x, l.pos_y, l.pos_z, 'inlocation'
+          FROM stock_location l
+         WHERE l.is_box AND l.is_rack AND random() < {density};
+
+        UPDATE stock_location l SET box_id = b.id FROM product_box b WHERE b.rack_location = l.id;
+    """)
+    cr.execute("SELECT count(*) FROM stock_location WHERE is_box")
+    return racks, cr.fetchone()[0]
+
+
+def queries(racks):
+    """Búsquedas de los caminos críticos del módulo"""
+    rack = max(racks // 2, 1)
+    dummy_zone = racks + rack
+    return {
+        # ProductBox._calculate_blocking_boxes / _build_put_in_sequence (búsqueda ORM original)
+        'blocker_column_scan': ("""
+            SELECT b.id FROM product_box b
+              JOIN stock_location l ON l.id = b.parent_location
+             WHERE b.pos_y < 6 AND b.pos_x = 20 AND b.pos_z = 6
+               AND l.location_id = %s AND b.state = 'inlocation'
+             ORDER BY b.pos_y
+        """, (rack,)),
+        # StockLocation._wms_grid_build
+        'grid_build': ("""
+            SELECT slot.id, slot.pos_x, slot.pos_y, slot.pos_z, slot.box_id, box.id, box.state
+              FROM stock_location slot
+              LEFT JOIN product_box box ON box.parent_location = slot.id
+             WHERE slot.location_id = %s AND slot.is_box AND slot.active
+        """, (rack,)),
+        # StockLocation._wms_grid_versions
+        'grid_versions': ("SELECT id, grid_version FROM stock_location WHERE grid_version > 0", ()),
+        # Callback put_in: ubicación por coordenadas
+        'coordinate_lookup': ("""
+            SELECT id FROM stock_location
+             WHERE pos_x = 20 AND pos_y = 3 AND pos_z = 6 AND is_box AND is_rack
+             LIMIT 1
+        """, ()),
+        # BoxMovementWizard.action_box_naming / get_next_available_location
+        'free_slot_lookup': ("""
+            SELECT id FROM stock_location
+             WHERE location_id = %s AND is_box AND box_id IS NULL
+             ORDER BY id LIMIT 1
+        """, (rack,)),
+        # Reservas dummy de una caja
+        'dummy_reservation': ("SELECT id FROM stock_location WHERE box_id = %s", (rack,)),
+        # Cajas en una zona dummy (clean-up)
+        'dummy_boxes': ("""
+            SELECT b.id FROM product_box b
+              JOIN stock_location l ON l.id = b.parent_location
+             WHERE l.location_id = %s AND b.state = 'outlocation'
+        """, (dummy_zone,)),
+    }
+
+
+def plan_nodes(plan):
+    """Tipos de nodo del plan (p. ej. 'Index Scan', 'Seq Scan')"""
+    nodes = [plan['Node Type'] + (f" on {plan['Relation Name']}" if 'Relation Name' in plan else '')]
+    for child in plan.get('Plans', []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def measure(cr, sql, params, runs):
+    cr.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+    plan = cr.fetchone()[0][0]
+    timings = []
+    for _run in range(runs):
+        start = time.perf_counter()
+        cr.execute(sql, params)
+        cr.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'plan': plan_nodes(plan['Plan']),
+        'plan_ms': plan['Execution Time'],
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(sorted(timings)[int(0.95 * (len(timings) - 1))], 3),
+    }
+
+
+def run(dsn, sizes, density, runs):
+    conn = psycopg2.connect(dsn)
+    try:
+        for size in sizes:
+            with conn.cursor() as cr:
+                cr.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path = {SCHEMA}")
+                cr.execute(TABLES)
+                racks, slots = seed(cr, size, density)
+                for indexed in (False, True):
+                    if indexed:
+                        for ddl in INDEXES:
+                            cr.execute(ddl)
+                    cr.execute("ANALYZE stock_location; ANALYZE product_box")
+                    for name, (sql, params) in queries(racks).items():
+                        result = measure(cr, sql, params, runs)
+                        result.update({'size': slots, 'query': name, 'indexed': indexed})
+                        print(json.dumps(result), flush=True)
+                cr.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--dsn', required=True, help='DSN de PostgreSQL (ej: "dbname=bench user=odoo")')
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--density', type=float, default=0.8)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    run(args.dsn, [int(size) for size in args.sizes.split(',')], args.density, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: recorrido de la grúa en secuencias de picking
+
+Compara, sobre un rack sembrado con semilla fija, el recorrido total de la
+grúa cuando todas las cajas bloqueantes van a la misma coordenada dummy
+(comportamiento anterior) frente al reparto en ubicaciones dummy libres y
+cercanas (DummyAllocator).
+
+Uso:
+    python benchmarks/bench_dummy_travel.py [--seed 42] [--picks 200] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+TOOLS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'addons', 'warehouse_management_system', 'tools',
+)
+sys.path.insert(0, TOOLS_DIR)
+
+from dummy_allocation import DummyAllocator, sequence_travel  # noqa: E402
+from rack_grid import RackGrid  # noqa: E402
+
+
+def seed_warehouse(rng, size_x, size_y, size_z, density):
+    """Rack de size_x × size_y × size_z y zona dummy en ambos extremos del pasillo"""
+    rack = RackGrid(1, 1)
+    dummy = RackGrid(2, 1)
+    location_id = box_id = 0
+    for x in range(1, size_x + 1):
+        for z in range(1, size_z + 1):
+            for y in range(1, size_y + 1):
+                location_id += 1
+                rack.add_slot(location_id, x, y, z, is_rack=True)
+                if rng.random() < density:
+                    box_id += 1
+                    rack.place_box(box_id, location_id, 'inlocation')
+    for x in (0, size_x + 1):
+        for z in range(1, size_z + 1):
+            for y in range(1, size_y + 1):
+                location_id += 1
+                dummy.add_slot(location_id, x, y, z, is_dummy=True)
+    return rack, dummy
+
+
+def picking_sequence(rack, target, dummy_target):
+    """Secuencia de picking de la caja target; dummy_target(box, source) da el destino"""
+    location_id, _state = rack.box_location(target)
+    x, y, z = rack.coords_of(location_id)
+    sequence = []
+    for depth, _blocker_location, blocker in rack.blockers(x, z, y):
+        source = (x, depth, z)
+        to = dummy_target(blocker, source)
+        sequence.append({
+            'from': dict(zip('xyz', source)),
+            'to': dict(zip('xyz', to)),
+        })
+    sequence.append({'from': {'x': x, 'y': y, 'z': z}, 'to': {'x': 0, 'y': 0, 'z': 0}})
+    return sequence
+
+
+def run(seed, picks, size_x, size_y, size_z, density):
+    rng = random.Random(seed)
+    rack, dummy = seed_warehouse(rng, size_x, size_y, size_z, density)
+    boxes = sorted(box for x, z in rack.columns() for _y, loc in rack.column(x, z)
+                   for box in rack.boxes_at(loc))
+    targets = rng.sample(boxes, min(picks, len(boxes)))
+
+    dummy_slots = [loc for x, z in dummy.columns() for _y, loc in dummy.column(x, z)]
+    legacy_coords = dummy.coords_of(min(dummy_slots))
+
+    before = after = blockers = 0
+    for target in targets:
+        before += sequence_travel(picking_sequence(rack, target, lambda _box, _source: legacy_coords))
+
+        allocator = DummyAllocator((loc, dummy.coords_of(loc), dummy.rack_id) for loc in dummy_slots)
+        sequence = picking_sequence(
+            rack, target, lambda box, source: allocator.allocate(source, box)[1]
+        )
+        after += sequence_travel(sequence)
+        blockers += len(sequence) - 1
+
+    return {
+        'seed': seed,
+        'rack': f'{size_x}x{size_y}x{size_z}',
+        'density': density,
+        'picks': len(targets),
+        'blocker_moves': blockers,
+        'travel_before': before,
+        'travel_after': after,
+        'travel_saved_pct': round(100.0 * (before - after) / before, 1) if before else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--picks', type=int, default=200)
+    parser.add_argument('--size', default='40x6x12', help='X×Y×Z del rack (ej: 40x6x12)')
+    parser.add_argument('--density', type=float, default=0.8)
+    parser.add_argument('--json', action='store_true', help='Salida en JSON')
+    args = parser.parse_args()
+
+    size_x, size_y, size_z = (int(v) for v in args.size.lower().split('x'))
+    result = run(args.seed, args.picks, size_x, size_y, size_z, args.density)
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"Rack {result['rack']} (densidad {result['density']}), {result['picks']} picks, "
+              f"{result['blocker_moves']} movimientos a dummy")
+        print(f"  Recorrido antes (dummy único):    {result['travel_before']}")
+        print(f"  Recorrido después (dummy cercano): {result['travel_after']}")
+        print(f"  Ahorro: {result['travel_saved_pct']}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de carga de extremo a extremo contra el middleware PLC simulado
+
+Modo odoo: pide pickings (api_picking / api_picking_batch) de cajas en su
+ubicación y devuelve al rack (api_putin) las que están fuera, a un ritmo fijo,
+mediante XML-RPC; Odoo encola las operaciones, las envía al simulador y este
+devuelve los callbacks. Modo direct: envía operaciones sintéticas directamente
+al simulador (sin Odoo), útil para medir el modelo de grúa.
+
+Al terminar espera a que se vacíe la cola del simulador y emite un informe
+JSON con operaciones/hora, percentiles de latencia de los callbacks y tasas
+de error (de las peticiones del generador, de los pasos y de los callbacks).
+
+Uso:
+    python simulator/load_driver.py --simulator http://localhost:8000 \\
+        --odoo-url http://localhost:8069 --db wms --user admin --password admin \\
+        [--rate 120] [--duration 300] [--batch 1] [--put-in-share 0.5] [--json]
+    python simulator/load_driver.py --mode direct --simulator http://localhost:8000 \\
+        [--rate 600] [--duration 60] [--depth 5] [--json]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+import xmlrpc.client
+
+from plc_middleware import percentile
+
+
+def http_json(url, payload=None, api_key=None, timeout=30):
+    """GET (sin payload) o POST JSON; devuelve el cuerpo decodificado"""
+    headers = {'Content-Type': 'application/json'}
+    if api_key:
+        headers['Authorization'] = f'Bearer {api_key}'
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers=headers)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b'{}')
+
+
+class OdooClient:
+    """Llamadas XML-RPC a product.box"""
+
+    def __init__(self, url, db, user, password):
+        self.db = db
+        self.password = password
+        common = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/common', allow_none=True)
+        self.uid = common.authenticate(db, user, password, {})
+        if not self.uid:
+            raise SystemExit('Odoo authentication failed')
+        self.models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object', allow_none=True)
+
+    def call(self, method, *args, **kwargs):
+        return self.models.execute_kw(self.db, self.uid, self.password, 'product.box', method, list(args), kwargs)
+
+    def sample(self, state, limit):
+        """Identificadores de cajas en un estado (con ubicación de rack asignada)"""
+        domain = [('state', '=', state), ('rack_location', '!=', False)]
+        records = self.call('search_read', domain, fields=['location_identification'], limit=limit)
+        return [record['location_identification'] for record in records]
+
+
+def synthetic_operation(rng, index, depth):
+    """Picking sintético: depth - 1 cajas bloqueantes a dummy y entrega en puerta"""
+    x, z, y = rng.randint(1, 30), rng.randint(1, 10), depth
+    sequence = []
+    for blocker in range(1, depth):
+        sequence.append({
+            'step': blocker, 'action': 'move_to_dummy', 'box_id': f'SIM{index}-{blocker}',
+            'from': {'x': x, 'y': blocker, 'z': z}, 'to': {'x': 0, 'y': blocker, 'z': z},
+        })
+    sequence.append({
+        'step': depth, 'action': 'deliver', 'box_id': f'SIM{index}',
+        'from': {'x': x, 'y': y, 'z': z}, 'to': {'x': 0, 'y': 0, 'z': 0},
+    })
+    return {
+        'operation_id': f'SIM-{index}',
+        'operation_type': 'picking',
+        'priority': 'normal',
+        'sequence': sequence,
+    }
+
+
+def drive(args, submit):
+    """Lanzar submit() a ritmo constante; devuelve las latencias y errores del generador"""
+    interval = 3600.0 / args.rate
+    latencies, errors = [], 0
+    deadline = time.monotonic() + args.duration
+    next_at = time.monotonic()
+    index = 0
+    while time.monotonic() < deadline:
+        index += 1
+        start = time.perf_counter()
+        try:
+            if not submit(index):
+                errors += 1
+        except (urllib.error.URLError, xmlrpc.client.Error, OSError) as e:
+            errors += 1
+            print(f'request {index} failed: {e}', file=sys.stderr)
+        latencies.append(time.perf_counter() - start)
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.monotonic()))
+    return latencies, errors
+
+
+def wait_idle(args, baseline_received, timeout):
+    """Esperar a que el simulador termine las operaciones recibidas"""
+    deadline = time.monotonic() + timeout
+    stats = http_json(f'{args.simulator}/api/v1/stats')
+    while time.monotonic() < deadline:
+        finished = stats['operations_completed'] + stats['operations_failed']
+        if finished >= stats['operations_received'] and stats['operations_received'] > baseline_received:
+            break
+        time.sleep(1)
+        stats = http_json(f'{args.simulator}/api/v1/stats')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mode', choices=('odoo', 'direct'), default='odoo')
+    parser.add_argument('--simulator', default='http://localhost:8000')
+    parser.add_argument('--api-key', help='API key del simulador (modo direct)')
+    parser.add_argument('--odoo-url', default='http://localhost:8069')
+    parser.add_argument('--db')
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--rate', type=float, default=120, help='Peticiones por hora')
+    parser.add_argument('--duration', type=float, default=300, help='Segundos de carga')
+    parser.add_argument('--batch', type=int, default=1, help='Cajas por picking (modo odoo)')
+    parser.add_argument('--put-in-share', type=float, default=0.5,
+                        help='Fracción de peticiones de put-in cuando hay cajas fuera (modo odoo)')
+    parser.add_argument('--depth', type=int, default=5, help='Pasos por operación sintética (modo direct)')
+    parser.add_argument('--drain-timeout', type=float, default=600)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+    args.simulator = args.simulator.rstrip('/')
+    rng = random.Random(args.seed)
+
+    if args.mode == 'direct':
+        def submit(index):
+            result = http_json(f'{args.simulator}/api/v1/operations',
+                               synthetic_operation(rng, index, args.depth), args.api_key)
+            return result.get('status') == 'accepted'
+    else:
+        if not args.db:
+            parser.error('--db is required in odoo mode')
+        odoo = OdooClient(args.odoo_url.rstrip('/'), args.db, args.user, args.password)
+
+        def submit(index):
+            outside = odoo.sample('outlocation', 50)
+            if outside and rng.random() < args.put_in_share:
+                odoo.call('api_putin', rng.choice(outside))
+                return True
+            inside = odoo.sample('inlocation', 200)
+            if not inside:
+                return False
+            if args.batch > 1:
+                result = odoo.call('api_picking_batch', rng.sample(inside, min(args.batch, len(inside))))
+            else:
+                result = odoo.call('api_picking', rng.choice(inside))
+            return not isinstance(result, dict) or result.get('error', 'OK') == 'OK'
+
+    before = http_json(f'{args.simulator}/api/v1/stats')
+    started = time.monotonic()
+    latencies, errors = drive(args, submit)
+    after = wait_idle(args, before['operations_received'], args.drain_timeout)
+    elapsed = time.monotonic() - started
+
+    completed = after['operations_completed'] - before['operations_completed']
+    failed = after['operations_failed'] - before['operations_failed']
+    steps = (after['steps_completed'] + after['steps_failed']) - (before['steps_completed'] + before['steps_failed'])
+    callbacks = (after['callbacks_sent'] + after['callback_errors']) - (before['callbacks_sent'] + before['callback_errors'])
+    report = {
+        'mode': args.mode,
+        'duration_s': round(elapsed, 1),
+        'requests': len(latencies),
+        'request_errors': errors,
+        'request_error_rate': round(errors / len(latencies), 4) if latencies else 0.0,
+        'request_latency_ms': {
+            f'p{pct}': round(percentile(latencies, pct) * 1000, 1) if latencies else None
+            for pct in (50, 95, 99)
+        },
+        'operations_received': after['operations_received'] - before['operations_received'],
+        'operations_completed': completed,
+        'operations_failed': failed,
+        'operations_per_hour': round(completed * 3600.0 / elapsed, 1) if elapsed else None,
+        'step_failure_rate': round((after['steps_failed'] - before['steps_failed']) / steps, 4) if steps else 0.0,
+        'callback_error_rate': round(
+            (after['callback_errors'] - before['callback_errors']) / callbacks, 4) if callbacks else 0.0,
+        # Percentiles acumulados del simulador desde su arranque
+        'callback_latency_ms': after['callback_latency_ms'],
+        'operation_duration_s': after['operation_duration_s'],
+    }
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f'{key:24} {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Middleware PLC simulado para pruebas de carga de extremo a extremo
+
+Sustituye al middleware real: acepta las operaciones que envía Odoo
+(POST /api/v1/operations y /api/v1/test), simula la grúa ejecutando cada paso
+de la secuencia con velocidad por eje, jitter y tasa de fallos configurables,
+y notifica cada paso a Odoo (/api/wms/operation/complete o, por operación,
+/api/wms/operation/complete_batch). GET /api/v1/stats devuelve las métricas
+acumuladas (operaciones/hora, latencia de callbacks, errores).
+
+Solo usa la biblioteca estándar.
+
+Uso:
+    python simulator/plc_middleware.py --port 8000 --odoo-url http://localhost:8069 \\
+        [--speed 1.0,0.5,0.4] [--handling 4] [--jitter 0.1] [--failure-rate 0.01] \\
+        [--time-scale 60] [--cranes 1] [--callback-mode step|batch|none] [--api-key KEY]
+
+Configurar en Odoo la URL del middleware como http://<host>:8000.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger('plc_simulator')
+
+# Tipo de callback que espera Odoo para cada acción de la secuencia
+STEP_CALLBACK_TYPES = {'move_to_dummy': 'move_to_dummy', 'deliver': 'picking', 'place': 'put_in'}
+
+
+def percentile(values, pct):
+    """Percentil (interpolación al más cercano) de una lista de valores"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))]
+
+
+class CraneModel:
+    """
+    Tiempo de ejecución de un paso: la grúa viaja en vacío hasta el origen y
+    cargada hasta el destino; los ejes se mueven a la vez (manda el más lento)
+    """
+
+    def __init__(self, speed=(1.0, 0.5, 0.4), handling=4.0, jitter=0.1, failure_rate=0.0, rng=None):
+        self.speed = speed
+        self.handling = handling
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = rng or random.Random()
+
+    def travel(self, origin, target):
+        """Segundos de viaje entre dos posiciones (x, y, z)"""
+        return max(abs((b or 0) - (a or 0)) / speed for a, b, speed in zip(origin, target, self.speed))
+
+    def step_duration(self, position, step):
+        """Segundos para ejecutar un paso desde position; devuelve (duración, posición final)"""
+        source = tuple(step.get('from', {}).get(axis) or 0 for axis in 'xyz')
+        target = tuple(step.get('to', {}).get(axis) or 0 for axis in 'xyz')
+        base = self.travel(position, source) + self.travel(source, target) + 2 * self.handling
+        factor = 1.0 + self.rng.uniform(-self.jitter, self.jitter)
+        return max(base * factor, 0.0), target
+
+    def fails(self):
+        return self.rng.random() < self.failure_rate
+
+
+class Stats:
+    """Métricas del simulador (seguras entre hilos)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {
+            'operations_received': 0,
+            'operations_rejected': 0,
+            'operations_completed': 0,
+            'operations_failed': 0,
+            'steps_completed': 0,
+            'steps_failed': 0,
+            'callbacks_sent': 0,
+            'callback_errors': 0,
+        }
+        self.callback_latencies = []
+        self.operation_durations = []
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def add(self, name, value):
+        with self.lock:
+            getattr(self, name).append(value)
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            latencies = list(self.callback_latencies)
+            durations = list(self.operation_durations)
+            counters = dict(self.counters)
+        callbacks = counters['callbacks_sent'] + counters['callback_errors']
+        finished = counters['operations_completed'] + counters['operations_failed']
+        return {
+            **counters,
+            'elapsed_s': round(elapsed, 1),
+            'operations_per_hour': round(counters['operations_completed'] * 3600.0 / elapsed, 1),
+            'callback_latency_ms': {
+                f'p{pct}': round(percentile(latencies, pct) * 1000, 1) if latencies else None
+                for pct in (50, 95, 99)
+            },
+            'operation_duration_s': {
+                f'p{pct}': round(percentile(durations, pct), 2) if durations else None
+                for pct in (50, 95, 99)
+            },
+            'callback_error_rate': round(counters['callback_errors'] / callbacks, 4) if callbacks else 0.0,
+            'operation_failure_rate': round(counters['operations_failed'] / finished, 4) if finished else 0.0,
+        }
+
+
+class Simulator:
+    """Colas de la grúa y envío de callbacks a Odoo"""
+
+    def __init__(self, model, odoo_url=None, callback_mode='step', time_scale=1.0, cranes=1, timeout=30):
+        self.model = model
+        self.odoo_url = (odoo_url or '').rstrip('/')
+        self.callback_mode = callback_mode if self.odoo_url else 'none'
+        self.time_scale = max(time_scale, 1e-6)
+        self.timeout = timeout
+        self.stats = Stats()
+        self.queues = [queue.Queue() for _crane in range(max(cranes, 1))]
+        self._ids = itertools.count(1)
+        for index, crane_queue in enumerate(self.queues):
+            threading.Thread(target=self._crane_loop, args=(index, crane_queue), daemon=True).start()
+
+    def submit(self, operation):
+        """Encolar una operación en la grúa de su rack (o la primera)"""
+        sequence = operation.get('sequence') or []
+        crane = hash(operation.get('rack') or 0) % len(self.queues)
+        self.queues[crane].put((time.time(), operation, sequence))
+        self.stats.incr('operations_received')
+        return next(self._ids)
+
+    def _crane_loop(self, index, crane_queue):
+        position = (0, 0, 0)
+        while True:
+            received, operation, sequence = crane_queue.get()
+            operation_id = operation.get('operation_id')
+            results = []
+            failed = False
+            for step in sequence:
+                duration, target = self.model.step_duration(position, step)
+                time.sleep(duration / self.time_scale)
+                if self.model.fails():
+                    failed = True
+                    self.stats.incr('steps_failed')
+                    results.append(self._callback_payload(operation, step, 'failed'))
+                    break
+                position = target
+                self.stats.incr('steps_completed')
+                results.append(self._callback_payload(operation, step, 'completed'))
+                if self.callback_mode == 'step':
+                    self._post_callbacks([results[-1]])
+            if self.callback_mode == 'batch':
+                self._post_callbacks(results)
+            elif self.callback_mode == 'step' and failed:
+                self._post_callbacks(results[-1:])
+
+            self.stats.incr('operations_failed' if failed else 'operations_completed')
+            self.stats.add('operation_durations', time.time() - received)
+            _logger.info(f"Grúa {index}: operación {operation_id} {'fallida' if failed else 'completada'} "
+                         f"({len(results)}/{len(sequence)} pasos)")
+
+    @staticmethod
+    def _callback_payload(operation, step, status):
+        return {
+            'operation_id': operation.get('operation_id'),
+            'operation_type': STEP_CALLBACK_TYPES.get(step.get('action'), step.get('action')),
+            'step': step.get('step'),
+            'box_id': step.get('box_id'),
+            'status': status,
+            'new_location': step.get('to') or {},
+        }
+
+    def _post_callbacks(self, payloads):
+        if self.callback_mode == 'none' or not payloads:
+            return
+        if len(payloads) == 1 and self.callback_mode == 'step':
+            url, params = self.odoo_url + '/api/wms/operation/complete', payloads[0]
+        else:
+            url, params = self.odoo_url + '/api/wms/operation/complete_batch', {'steps': payloads}
+        body = json.dumps({'jsonrpc': '2.0', 'method': 'call', 'params': params, 'id': None}).encode()
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                result = json.loads(response.read() or b'{}').get('result') or {}
+            self.stats.add('callback_latencies', time.perf_counter() - start)
+            self.stats.incr('callbacks_sent')
+            if not result.get('success', True):
+                _logger.warning(f"Callback rechazado por Odoo: {result}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            self.stats.incr('callback_errors')
+            _logger.warning(f"Callback a Odoo fallido ({url}): {e}")
+
+
+def make_handler(simulator, api_key=None):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, fmt, *args):
+            _logger.debug(fmt % args)
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self):
+            return not api_key or self.headers.get('Authorization') == f'Bearer {api_key}'
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/api/v1/stats':
+                return self._reply(200, simulator.stats.snapshot())
+            self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                data = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._reply(400, {'error': 'invalid JSON'})
+            if not self._authorized():
+                return self._reply(401, {'error': 'unauthorized'})
+
+            path = self.path.rstrip('/')
+            if path == '/api/v1/test':
+                return self._reply(200, {'status': 'ok', 'service': 'PLC simulator'})
+            if path == '/api/v1/operations':
+                if not data.get('operation_id') or not isinstance(data.get('sequence'), list):
+                    simulator.stats.incr('operations_rejected')
+                    return self._reply(422, {'error': 'operation_id and sequence are required'})
+                ticket = simulator.submit(data)
+                return self._reply(200, {'status': 'accepted', 'operation_id': data['operation_id'], 'ticket': ticket})
+            self._reply(404, {'error': 'not found'})
+
+    return Handler
+
+
+def parse_speed(value):
+    speeds = tuple(float(v) for v in value.split(','))
+    if len(speeds) != 3 or min(speeds) <= 0:
+        raise argparse.ArgumentTypeError('speed must be three positive numbers: x,y,z')
+    return speeds
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--odoo-url', help='URL de Odoo para los callbacks (sin ella no se envían)')
+    parser.add_argument('--api-key', help='API key esperada (Authorization: Bearer)')
+    parser.add_argument('--speed', type=parse_speed, default=(1.0, 0.5, 0.4),
+                        help='Posiciones por segundo en X,Y,Z')
+    parser.add_argument('--handling', type=float, default=4.0, help='Segundos para coger o dejar una caja')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Variación relativa de la duración (0-1)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Probabilidad de fallo por paso')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='Aceleración del reloj simulado')
+    parser.add_argument('--cranes', type=int, default=1)
+    parser.add_argument('--callback-mode', choices=('step', 'batch', 'none'), default='step')
+    parser.add_argument('--seed', type=int)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    model = CraneModel(args.speed, args.handling, args.jitter, args.failure_rate, random.Random(args.seed))
+    simulator = Simulator(model, args.odoo_url, args.callback_mode, args.time_scale, args.cranes)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(simulator, args.api_key))
+    _logger.info(f"Simulador PLC escuchando en {args.host}:{args.port} (callbacks: {simulator.callback_mode})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()